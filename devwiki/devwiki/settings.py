@@ -6,6 +6,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 import os
+import sys
 from pathlib import Path
 import environ
 
@@ -29,6 +30,7 @@ DEBUG = env.bool('debug')
 ALLOWED_HOSTS = '*'
 SITE_ID = 1
 CORS_ORIGIN_ALLOW_ALL = True
+CORS_EXPOSE_HEADERS = ['X-DB-Pin']
 
 # Application definition
 INSTALLED_APPS = [
@@ -43,6 +45,7 @@ INSTALLED_APPS = [
     'pkg',
     'pkg.articles',
     'pkg.users',
+    'pkg.jobs',
 
     'django_filters',
     'corsheaders',
@@ -58,6 +61,8 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'users.User'
 
 MIDDLEWARE = [
+    'pkg.profiling.QueryStatsMiddleware',
+    'pkg.routers.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -110,10 +115,99 @@ DATABASES = {
     }
 }
 
+# Read replicas of default database, e.g. db_replica_hosts=10.0.0.2,10.0.0.3, see pkg/routers.py
+# db_replica_names overrides database names of replicas, e.g. files of SQLite replicas
+DB_REPLICA_HOSTS = env.list('db_replica_hosts', default=[])
+DB_REPLICA_NAMES = env.list('db_replica_names', default=[])
+for number in range(max(len(DB_REPLICA_HOSTS), len(DB_REPLICA_NAMES))):
+    DATABASES[f'replica{number + 1}'] = {
+        **DATABASES['default'],
+        'HOST': DB_REPLICA_HOSTS[number] if number < len(DB_REPLICA_HOSTS) else DATABASES['default']['HOST'],
+        'NAME': DB_REPLICA_NAMES[number] if number < len(DB_REPLICA_NAMES) else DATABASES['default']['NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['pkg.routers.PrimaryReplicaRouter']
+# replicas lagging more seconds are skipped, lag is checked every DB_REPLICA_CHECK_INTERVAL seconds
+DB_REPLICA_MAX_LAG = env.float('db_replica_max_lag', default=1.0)
+DB_REPLICA_CHECK_INTERVAL = env.float('db_replica_check_interval', default=5.0)
+# seconds a client reads from the primary after its write, pin is sent back as cookie or header
+DB_PIN_SECONDS = env.int('db_pin_seconds', default=5)
+DB_PIN_COOKIE = 'db_pin'
+DB_PIN_HEADER = 'X-DB-Pin'
+
+# pymemcache scheme of django-environ 0.7 points to pylibmc backend
+environ.Env.CACHE_SCHEMES['pymemcache'] = 'django.core.cache.backends.memcached.PyMemcacheCache'
+# Cache shared by all uwsgi workers, e.g. pymemcache://127.0.0.1:11211, see configs/uwsgi/uwsgi.ini
+CACHES = {
+    'default': env.cache('cache_url', default='locmemcache://'),
+}
+
+# Seconds to keep cached anonymous articles responses, entries are also invalidated by versions
+RESPONSE_CACHE_TIMEOUT = env.int('response_cache_timeout', default=300)
+
+# Article visits counter mode:
+# strict - single atomic UPDATE on every article read
+# buffered - increments are collected in shared cache and flushed with one batched UPDATE
+VISITS_COUNTER_MODE = env.str('visits_counter_mode', default='strict')
+VISITS_FLUSH_THRESHOLD = env.int('visits_flush_threshold', default=100)
+VISITS_FLUSH_INTERVAL = env.int('visits_flush_interval', default=30)
+
+# Articles popularity half-life in hours, run rebalance_popularity after change
+POPULARITY_HALF_LIFE = env.float('popularity_half_life', default=72)
+
+# Raise QueryBudgetExceeded instead of warning when view action exceeds its query budget, on by default in tests
+QUERY_BUDGET_STRICT = env.bool('query_budget_strict', default=sys.argv[1:2] == ['test'])
+
+# Every N-th article revision keeps full body, others are deltas, run compact_revisions after change
+ARTICLE_REVISION_SNAPSHOT_INTERVAL = env.int('article_revision_snapshot_interval', default=20)
+
+# Token authentication snapshots: per-process LRU size and TTL, shared cache TTL in seconds
+AUTH_TOKEN_CACHE_SIZE = env.int('auth_token_cache_size', default=10000)
+AUTH_TOKEN_LOCAL_TTL = env.int('auth_token_local_ttl', default=60)
+AUTH_TOKEN_SHARED_TTL = env.int('auth_token_shared_ttl', default=900)
+
+# Token-bucket throttling of viewset actions, see pkg/throttling.py
+# buckets have to be in cache shared by all workers, e.g. redis or memcached
+THROTTLE_ENABLED = env.bool('throttle_enabled', default=True)
+THROTTLE_CACHE = env.str('throttle_cache', default='default')
+if THROTTLE_ENABLED and not DEBUG and CACHES.get(THROTTLE_CACHE, {}).get('BACKEND', '').endswith(
+        ('LocMemCache', 'DummyCache')):
+    raise ImproperlyConfigured('Throttling needs THROTTLE_CACHE shared by all workers, set cache_url or '
+                               'throttle_cache to memcached, or disable throttle_enabled')
+
+# User image variants rendered after upload, see pkg/users/images.py
+USER_IMAGE_VARIANT_SIZES = (64, 128, 512)
+USER_IMAGE_QUALITY = env.int('user_image_quality', default=82)
+USER_IMAGE_MAX_SIZE = env.int('user_image_max_size', default=10 * 1024 * 1024)
+USER_IMAGE_WORKERS = env.int('user_image_workers', default=2)
+USER_IMAGE_QUEUE = env.int('user_image_queue', default=32)
+
+# Deferred jobs, see pkg/jobs/queue.py, run_jobs workers are required unless JOBS_EAGER,
+# configs/uwsgi/uwsgi.ini attaches one to uwsgi
+# eager jobs run in the web process after commit, for development without workers
+JOBS_EAGER = env.bool('jobs_eager', default=False)
+JOBS_CONCURRENCY = env.int('jobs_concurrency', default=4)
+JOBS_POLL_INTERVAL = env.float('jobs_poll_interval', default=1.0)
+# seconds a claimed job may run before it is given to another worker
+JOBS_LEASE = env.int('jobs_lease', default=300)
+JOBS_MAX_ATTEMPTS = env.int('jobs_max_attempts', default=5)
+# retry delay in seconds, doubled on every attempt
+JOBS_BACKOFF_BASE = env.float('jobs_backoff_base', default=10)
+JOBS_BACKOFF_MAX = env.float('jobs_backoff_max', default=3600)
+JOBS_RETENTION_DAYS = env.int('jobs_retention_days', default=7)
+
+# Postgres text search configuration used by articles search
+SEARCH_CONFIG = env.str('search_config', default='simple')
+
+# Related articles kept per article and weights of tags and co-rating similarity, run compute_related after change
+RELATED_ARTICLES_COUNT = env.int('related_articles_count', default=10)
+RELATED_TAG_WEIGHT = env.float('related_tag_weight', default=0.6)
+RELATED_RATING_WEIGHT = env.float('related_rating_weight', default=0.4)
+
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'pkg.users.authentication.CachedTokenAuthentication',
         'social_core.backends.github.GithubOAuth2',
     ),
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
@@ -121,6 +215,8 @@ REST_FRAMEWORK = {
 
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # nginx passes client address in REMOTE_ADDR, X-Forwarded-For is set by clients and not trusted
+    'NUM_PROXIES': env.int('num_proxies', default=0),
 }
 
 OAUTH2_PROVIDER = {
@@ -144,7 +240,7 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 AUTHENTICATION_BACKENDS = [
-    'social_core.backends.github.GithubOAuth2',
+    'pkg.users.backends.GithubOAuth2',
     'django.contrib.auth.backends.ModelBackend',
 ]
 
@@ -171,6 +267,18 @@ USE_X_FORWARDED_HOST = True
 SOCIAL_AUTH_GITHUB_KEY = env.str('github_client_id')
 SOCIAL_AUTH_GITHUB_SECRET = env.str('github_client_secret')
 SOCIAL_AUTH_GITHUB_SCOPE = [env.str('github_scope'), ]
+# (connect, read) timeouts of requests to OAuth providers
+SOCIAL_AUTH_REQUESTS_TIMEOUT = (env.float('oauth_connect_timeout', default=3.05),
+                                env.float('oauth_read_timeout', default=5))
+# Offline "stub" provider accepting any access token, never enable in production
+SOCIAL_AUTH_STUB_ENABLED = env.bool('oauth_stub_enabled', default=False)
+if SOCIAL_AUTH_STUB_ENABLED:
+    AUTHENTICATION_BACKENDS.insert(0, 'pkg.users.backends.StubOAuth2')
+
+# OAuth token exchanges run on bounded thread pool, see pkg/users/oauth.py
+OAUTH_EXCHANGE_WORKERS = env.int('oauth_exchange_workers', default=4)
+OAUTH_EXCHANGE_QUEUE = env.int('oauth_exchange_queue', default=16)
+OAUTH_EXCHANGE_TIMEOUT = env.float('oauth_exchange_timeout', default=10)
 
 
 # Log configuration
@@ -221,5 +329,10 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False
         },
+        'pkg.profiling': {
+            'handlers': ['request_handler'],
+            'level': 'INFO',
+            'propagate': False
+        },
     }
 }
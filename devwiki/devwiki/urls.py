@@ -12,6 +12,8 @@ urlpatterns = [
         url(r'admin/', admin.site.urls),
         url(r'users/', include('pkg.users.urls')),
         url(r'articles/', include('pkg.articles.urls')),
+        url(r'jobs/', include('pkg.jobs.urls')),
+        url(r'social/', include('social_django.urls', namespace='social')),
 ]
 urlpatterns += doc_urls
 urlpatterns += staticfiles_urlpatterns()
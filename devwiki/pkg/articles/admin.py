@@ -1,15 +1,26 @@
 from django.contrib import admin
 
-from .models import Article, ArticleRating, ArticleVisits, Comment, Tag
+from .models import Archive, Article, ArticleRating, ArticleVisits, Comment, Tag
 
 
 class ArticleAdmin(admin.ModelAdmin):
-    list_display = ['title', 'created_at']
-    list_filter = ['created_at', 'tags', 'rating']
+    list_display = ['title', 'created_at', 'status']
+    list_filter = ['status', 'created_at', 'tags', 'rating']
+
+    def get_queryset(self, request):
+        return Article.all_objects.all()
+
+
+class CommentAdmin(admin.ModelAdmin):
+    list_filter = ['status']
+
+    def get_queryset(self, request):
+        return Comment.all_objects.all()
 
 
 admin.site.register(Article, ArticleAdmin)
 admin.site.register(ArticleRating)
 admin.site.register(ArticleVisits)
-admin.site.register(Comment)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Archive)
 admin.site.register(Tag)
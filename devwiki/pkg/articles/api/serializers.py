@@ -1,96 +1,120 @@
 from rest_framework import serializers
 
-from pkg.articles.models import Article, ArticleRating, Tag, Comment
+from pkg.articles.models import Article, ArticleRating, ArticleRevision, Tag, Comment
+from pkg.articles.caching import bump_version
+from pkg.articles.jobs import index_articles
+from pkg.articles.revisions import record_revision
+from pkg.articles.rendering import plain_text
+from pkg.articles.search import highlight
 from django.template.defaultfilters import slugify
 
+from pkg.jobs.queue import enqueue
+from pkg.serializers import SparseFieldsetsMixin
+
 from pkg.users.api.serializers import UserDetailSerializer
-from django.db.models import Sum
 
 
 class CommentRecursiveSerializer(serializers.Serializer):
     """Recursive serialize comment childrens"""
 
     def to_representation(self, instance):
-        serializer = self.parent.parent.__class__(instance, context=self.context)
-        return serializer.data
+        return self.parent.parent.to_representation(instance)
 
     class Meta:
         model = Comment
         fields = '__all__'
 
 
-class ArticleListSerializer(serializers.ModelSerializer):
-    """Serializer to CRUD articles if not author"""
+class ArticleListSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
+    """Serializer to list articles with excerpt instead of body"""
 
     class Meta:
         model = Article
         fields = ['id', 'slug', 'title', 'created_at', 'updated_at',
-                  'visits', 'body', 'status', 'tags', 'author', 'rating', 'rate_votes']
+                  'visits', 'excerpt', 'reading_time', 'status', 'tags', 'author', 'rating', 'rate_votes']
         read_only_fields = ('created_at', 'updated_at')
+        select_related_fields = ['author', 'visits']
+        prefetch_related_fields = ['tags']
+        field_dependencies = {'rating': ['rate_average']}
+        expandable_fields = {'tags': {'serializer': 'pkg.articles.api.serializers.ArticleTagSerializer', 'many': True}}
 
     author = UserDetailSerializer(read_only=True)
     visits = serializers.SlugRelatedField(slug_field='number', read_only=True)
     rating = serializers.SerializerMethodField(read_only=True)
-    rate_votes = serializers.SerializerMethodField(read_only=True)
+    rate_votes = serializers.IntegerField(read_only=True)
 
     @staticmethod
     def get_rating(instance):
-        amount = ArticleRating.objects.filter(article=instance.id).count()
-        stars_sum = ArticleRating.objects.filter(article=instance.id).aggregate(Sum('star'))['star__sum']
-        if stars_sum:
-            return round(stars_sum / amount, 2)
+        """Average rating from article rating summary"""
+        return round(instance.rate_average, 2)
 
-        return 0
 
-    @staticmethod
-    def get_rate_votes(instance):
-        return ArticleRating.objects.filter(article=instance.id).count()
+class ArticleDetailSerializer(ArticleListSerializer):
+    """Serializer to retrieve article with body and pre-rendered HTML"""
+
+    class Meta(ArticleListSerializer.Meta):
+        fields = ArticleListSerializer.Meta.fields + ['body', 'body_html']
 
 
 class ArticleCreateUpdateSerializer(ArticleListSerializer):
     class Meta:
         model = Article
-        fields = ArticleListSerializer.Meta.fields + ['update_tags']
+        fields = ArticleListSerializer.Meta.fields + ['body', 'body_html', 'update_tags']
 
     update_tags = serializers.ListField(
         child=serializers.CharField(max_length=30, required=False),
         write_only=True, required=False)
     title = serializers.CharField()
-    rating = serializers.IntegerField(max_value=5)
 
     def add_tags(self, tag_names):
-        tags = []
-        request = self.context['request']
-        for name in tag_names:
-            if request.method == 'get':
-                tag = Tag.objects.get(name=name)
-            else:
-                tag = Tag.objects.get_or_create(name=name, author=request.user)
-            tags.append(tag)
-        return tags
+        """Resolve tag names to tags, missing tags are created in bulk"""
+        return Tag.objects.resolve(tag_names, author=self.context['request'].user)
 
     def create(self, validated_data):
+        tag_names = validated_data.pop('update_tags', None)
         instance = super().create(validated_data)
-        if 'update_tags' in validated_data:
-            instance.tags.set(self.add_tags(validated_data.pop('update_tags')))
+        if tag_names:
+            instance.tags.add(*self.add_tags(tag_names))
+        record_revision(instance, self.context['request'].user)
+        enqueue(index_articles, [instance.id])
+        bump_version(instance.slug)
         return instance
 
     def update(self, instance, validated_data):
-        visits = instance.visits
+        tag_names = validated_data.pop('update_tags', None)
+        visits, previous = instance.visits, (instance.title, instance.body)
         instance = super().update(instance, validated_data)
         instance.visits = visits
-        if 'update_tags' in validated_data:
-            instance.tags.set(self.add_tags(validated_data.pop('update_tags')))
+        if tag_names is not None:
+            instance.tags.set(self.add_tags(tag_names))
+        record_revision(instance, self.context['request'].user, previous)
+        enqueue(index_articles, [instance.id])
+        bump_version(instance.slug)
         return instance
 
 
-class ArticleRatingSerializer(serializers.ModelSerializer):
+class ArticleSearchSerializer(ArticleListSerializer):
+    """Serializer for ranked search results with highlighted snippet"""
+
+    class Meta(ArticleListSerializer.Meta):
+        fields = ArticleListSerializer.Meta.fields + ['rank', 'snippet']
+
+    rank = serializers.FloatField(read_only=True)
+    snippet = serializers.SerializerMethodField(read_only=True)
+
+    def get_snippet(self, instance):
+        # snippet of rendered text, markdown syntax is not cut and highlighted
+        return highlight(plain_text(instance.body_html), self.context['query'])
+
+
+class ArticleRatingSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     class Meta:
         model = ArticleRating
         fields = '__all__'
+        expandable_fields = {'user': {'serializer': UserDetailSerializer}}
 
 
-class ArticleCommentSerializer(serializers.ModelSerializer):
+class ArticleCommentSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """Comment serializer with nested childrens"""
 
     class Meta:
@@ -98,14 +122,16 @@ class ArticleCommentSerializer(serializers.ModelSerializer):
         fields = ['id', 'article', 'content', 'parent', 'created_at',
                   'status', 'updated_at', 'children', 'author']
         read_only_fields = ['children', 'created_at', 'updated_at', ]
+        select_related_fields = ['author']
+        field_dependencies = {'children': ['article', 'path', 'parent']}
 
     created_at = serializers.DateTimeField(format="%d, %b %Y - %H:%M", required=False)
     updated_at = serializers.DateTimeField(format="%d, %b %Y - %H:%M", required=False)
-    children = CommentRecursiveSerializer(many=True, required=False)
+    children = CommentRecursiveSerializer(source='replies', many=True, read_only=True)
     author = UserDetailSerializer(read_only=True)
 
 
-class ArticleTagSerializer(serializers.ModelSerializer):
+class ArticleTagSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """
     Tag serializer
 
@@ -113,4 +139,23 @@ class ArticleTagSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Tag
-        fields = ['id', 'name', 'author']
+        fields = ['id', 'name', 'author', 'usage']
+        expandable_fields = {'author': {'serializer': UserDetailSerializer}}
+
+
+class ArticleRevisionSerializer(serializers.ModelSerializer):
+    """Revision serializer without body"""
+    author = UserDetailSerializer(read_only=True)
+
+    class Meta:
+        model = ArticleRevision
+        fields = ['number', 'title', 'author', 'created_at']
+
+
+class ArticleRevisionDetailSerializer(ArticleRevisionSerializer):
+    """Revision serializer with body rebuilt from deltas"""
+    body = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = ArticleRevision
+        fields = ArticleRevisionSerializer.Meta.fields + ['body']
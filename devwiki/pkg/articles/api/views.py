@@ -1,16 +1,59 @@
+import difflib
+
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from rest_framework import viewsets
-from rest_framework import authentication, viewsets
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from pkg.articles.permissions import IsBaned, IsMuted, IsModer, IsOwnerOrReadOnly
 from pkg.articles.models import Article, Tag, Comment, ArticleVisits, ArticleRating
-from .serializers import ArticleListSerializer, ArticleCreateUpdateSerializer, \
-    ArticleCommentSerializer, ArticleTagSerializer, ArticleRatingSerializer
+from pkg.articles.caching import VersionedCacheMixin, bump_version
+from pkg.articles.comments import article_comments_tree, load_subtrees
+from pkg.articles.filters import ArticleFilter
+from pkg.articles.jobs import index_articles, refresh_related, refresh_tags_usage
+from pkg.articles.popularity import PUBLISH_WEIGHT, STAR_WEIGHT, add_activity, event_score
+from pkg.articles.rendering import LIST_DEFERRED_FIELDS
+from pkg.articles.revisions import get_revision
+from pkg.articles.search import search_articles
+from pkg.articles.transfer import TransferStats, export_articles, import_articles
+from pkg.articles.visits import record_visit
+from pkg.jobs.queue import enqueue
+from pkg.pagination import KeysetPaginationMixin
+from pkg.profiling import QueryBudgetMixin
+from pkg.serializers import is_field_requested, sparse_queryset
+from pkg.throttling import TokenBucketThrottle
+from pkg.users.authentication import CachedTokenAuthentication
+from pkg.users.models import UserStats
+from .serializers import ArticleListSerializer, ArticleDetailSerializer, ArticleCreateUpdateSerializer, \
+    ArticleCommentSerializer, ArticleTagSerializer, ArticleRatingSerializer, ArticleSearchSerializer, \
+    ArticleRevisionSerializer, ArticleRevisionDetailSerializer
+
 
+class PublicArticleViewSet(QueryBudgetMixin, viewsets.ModelViewSet):
+    authentication_classes = [CachedTokenAuthentication, ]
+    throttle_classes = [TokenBucketThrottle, ]
+    # token-bucket rates by action, actions not listed are not throttled
+    throttle_rates = {}
+    # columns used by the view itself, loaded even if not requested by ?fields
+    sparse_columns = ()
+    # rows of any status served to moderators, default queryset has POSTED rows only
+    moderator_queryset = None
 
-class PublicArticleViewSet(viewsets.ModelViewSet):
-    authentication_classes = [authentication.TokenAuthentication, ]
+    def get_base_queryset(self):
+        """Moderators get rows of any status"""
+        user = self.request.user
+        if self.moderator_queryset is not None and user.is_authenticated and (user.is_moder or user.is_staff):
+            return self.moderator_queryset.all()
+        return super().get_queryset()
+
+    def get_queryset(self):
+        """Queryset shaped by ?fields and ?expand of read requests"""
+        return sparse_queryset(self.get_base_queryset(), self.get_serializer_class(), self.request,
+                               columns=self.sparse_columns)
 
     def get_permissions(self):
         """
@@ -23,12 +66,15 @@ class PublicArticleViewSet(viewsets.ModelViewSet):
             return [permission() for permission in self.permission_classes]
 
 
-class ArticleViewSet(PublicArticleViewSet):
+class ArticleViewSet(VersionedCacheMixin, KeysetPaginationMixin, PublicArticleViewSet):
     """
     Manage articles in database
     """
-    queryset = Article.objects.all()
+    queryset = Article.objects.select_related('author', 'visits').prefetch_related('tags')
+    moderator_queryset = Article.all_objects.select_related('author', 'visits').prefetch_related('tags')
     lookup_field = 'slug'
+    filterset_class = ArticleFilter
+    sparse_columns = ('author', 'visits')
 
     permission_classes_by_action = {
         'create': [IsAuthenticated],
@@ -37,54 +83,230 @@ class ArticleViewSet(PublicArticleViewSet):
         'partial_update': [IsOwnerOrReadOnly or IsAdminUser],
         'retrieve': [AllowAny],
         'destroy': [IsOwnerOrReadOnly or IsAdminUser],
+        'export': [IsAdminUser],
+        'import_articles': [IsAdminUser],
+    }
+    query_budgets = {
+        'list': 5,
+        'retrieve': 5,
+        'popular': 4,
+        'newest': 4,
+        'search': 4,
+        'article_comments': 4,
+        'revisions': 2,
+        'revision': 2,
+        'diff': 3,
+        'related': 3,
+    }
+    throttle_rates = {
+        'list': '120/min',
+        'retrieve': '240/min',
+        'search': '60/min',
+        'create': '20/min',
+        'update': '30/min',
+        'partial_update': '30/min',
+        'vote': '10/min',
+        'export': '10/h',
+        'import_articles': '5/h',
     }
 
+    def list(self, request, *args, **kwargs):
+        """
+        Endpoint to list articles, anonymous responses are cached
+        """
+        return self.get_cached_response(request, lambda: super(ArticleViewSet, self).list(request, *args, **kwargs))
+
     def retrieve(self, request, *args, **kwargs):
         """
               Endpoint to retrieve and auto increment visits
               If user read article, field visits auto increments by 1
               @return: Response with article and updated visits field
         """
+        return self.get_cached_response(request, self.retrieve_article,
+                                        slug=kwargs[self.lookup_field],
+                                        on_hit=self.record_cached_visit)
+
+    def retrieve_article(self):
+        """Serialize article and count visit"""
         instance = self.get_object()
-        visits = ArticleVisits.objects.get(article__id=instance.id)
-        visits.number += 1
-        visits.save()
-        serializer = ArticleListSerializer(instance, context={'request': request})
-        return Response(serializer.data)
+        if instance.visits:
+            instance.visits.number = record_visit(instance)
+        serializer = ArticleDetailSerializer(instance, context={'request': self.request})
+        response = Response(serializer.data)
+        response.cache_extra = {'id': instance.id, 'visits_id': instance.visits_id,
+                                'visits': instance.visits.number if instance.visits else None,
+                                'author_id': instance.author_id}
+        return response
+
+    @staticmethod
+    def record_cached_visit(data, extra):
+        """
+        Count visit of article served from cache, response data may miss fields not requested
+
+        @return: response data with fresh visits number
+        """
+        if not extra['visits_id']:
+            return data
+        number = record_visit(Article(id=extra.get('id', data.get('id')), author_id=extra.get('author_id'),
+                                      visits=ArticleVisits(id=extra['visits_id'],
+                                                           number=extra.get('visits', data.get('visits')))),
+                              current=False)
+        return {**data, 'visits': number} if 'visits' in data else data
 
     def perform_create(self, serializer):
         """Create a new article"""
-        serializer.save(author=self.request.user, visits=ArticleVisits.objects.create(number=1))
+        serializer.save(author=self.request.user,
+                        visits=ArticleVisits.objects.create(number=1),
+                        popularity=event_score(PUBLISH_WEIGHT))
+        UserStats.objects.refresh([self.request.user.id], ['articles_count', 'tags_count', 'visits_received'])
+
+    def perform_update(self, serializer):
+        """Update article, status change updates author stats and tags usage, new tags are owned by requester"""
+        status = serializer.instance.status
+        updates_tags = 'update_tags' in serializer.validated_data
+        article = serializer.save()
+        if article.status != status:
+            enqueue(refresh_tags_usage, [tag.id for tag in article.tags.all()])
+            enqueue(refresh_related, [article.id])
+            UserStats.objects.refresh([article.author_id])
+        if updates_tags:
+            UserStats.objects.refresh([self.request.user.id], ['tags_count'])
+
+    def perform_destroy(self, instance):
+        """Delete article and invalidate cached responses"""
+        commenters = set(instance.comments.values_list('author_id', flat=True))
+        tags = [tag.id for tag in instance.tags.all()]
+        instance.delete()
+        enqueue(refresh_tags_usage, tags)
+        enqueue(refresh_related, [instance.id])
+        UserStats.objects.refresh([instance.author_id])
+        UserStats.objects.refresh(commenters - {instance.author_id}, ['comments_count'])
+        bump_version(instance.slug)
 
     def get_serializer_class(self):
         if self.action == 'partial_update' or self.action == 'create' or self.action == 'update':
             return ArticleCreateUpdateSerializer
+        if self.action == 'retrieve':
+            return ArticleDetailSerializer
 
         return ArticleListSerializer
 
+    def get_queryset(self):
+        """Listing actions do not load bodies, retrieve always joins visits to count the visit"""
+        queryset = super().get_queryset()
+        if self.action in ('list', 'popular', 'newest', 'related'):
+            return queryset.defer(*LIST_DEFERRED_FIELDS)
+        if self.action == 'retrieve':
+            return queryset.select_related('visits')
+        return queryset
+
     @action(detail=True, methods=['get'])
-    def article_comments(self, request, pk):
+    def article_comments(self, request, slug):
         """
-        Endpoint to get article comments
+        Endpoint to get article comments tree
 
-        @param pk: Article id
-        @return:
+        @param slug: Article slug
+        @return: root comments with nested replies
         """
-        comments = Comment.objects.get(article=pk)
-        serializer = ArticleCommentSerializer(comments, many=True)
+        article = self.get_object()
+        comments = article_comments_tree(article.id)
+        serializer = ArticleCommentSerializer(comments, many=True, context={'request': request})
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def popular(self, request):
-        articles = self.queryset.order_by('visits')
-        serializer = self.get_serializer(articles, many=True)
-        return Response(serializer.data)
+        """
+        Endpoint to get most popular articles by time-decayed visits and rating
+
+        @return: articles page with next/previous cursors
+        """
+        return self.get_cached_response(request, lambda: self.get_keyset_paginated_response(
+            self.filter_queryset(self.get_queryset()), ('-popularity', '-id')))
 
     @action(detail=False, methods=['get'])
     def newest(self, request):
-        articles = self.queryset.order_by('-id')
-        serializer = self.get_serializer(articles, many=True)
-        return Response(serializer.data)
+        """
+        Endpoint to get newest articles
+
+        @return: articles page with next/previous cursors
+        """
+        return self.get_cached_response(request, lambda: self.get_keyset_paginated_response(
+            self.filter_queryset(self.get_queryset()), ('-created_at', '-id')))
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, slug):
+        """
+        Endpoint to get articles related by tags and co-ratings, best first
+
+        @param slug: Article slug
+        @return: related articles precomputed by compute_related
+        """
+        article_id = get_object_or_404(self.get_base_queryset().values_list('id', flat=True), slug=slug)
+        return self.get_cached_response(request, lambda: Response(self.get_serializer(
+            self.get_queryset().filter(related_to__article=article_id).order_by('-related_to__score'),
+            many=True).data))
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Endpoint to full-text search articles by title, body and tags
+
+        @param request: request with search query in q parameter
+        @return: paginated articles ordered by rank with highlighted snippets
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'Search query is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        articles = search_articles(self.get_queryset(), query)
+        page = self.paginate_queryset(articles)
+        serializer = ArticleSearchSerializer(page, many=True, context={'request': request, 'query': query})
+        return self.get_paginated_response(serializer.data)
+
+    @staticmethod
+    def get_batch_size(params):
+        """
+        Batch size of import or export limited to 1..5000, 500 by default
+
+        @param params: query params or request data
+        @return: batch size, None if not a number
+        """
+        try:
+            return min(max(int(params.get('batch_size', 500)), 1), 5000)
+        except (TypeError, ValueError):
+            return None
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Endpoint to stream all articles as NDJSON
+
+        @return: streaming response with one article per line
+        """
+        batch_size = self.get_batch_size(request.query_params)
+        if batch_size is None:
+            return Response({'error': 'Invalid batch_size'}, status=status.HTTP_400_BAD_REQUEST)
+        response = StreamingHttpResponse(export_articles(batch_size), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="articles.ndjson"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_articles(self, request):
+        """
+        Endpoint to import articles from uploaded NDJSON file
+
+        @param request: multipart request with file and optional batch_size
+        @return: import statistics with throughput
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'NDJSON file is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        batch_size = self.get_batch_size(request.data)
+        if batch_size is None:
+            return Response({'error': 'Invalid batch_size'}, status=status.HTTP_400_BAD_REQUEST)
+        stats = import_articles(upload, request.user, batch_size, TransferStats())
+        return Response(stats.as_dict())
 
     @action(detail=True, methods=['post'])
     def vote(self, request, slug):
@@ -96,23 +318,81 @@ class ArticleViewSet(PublicArticleViewSet):
         @return:
         """
         article = self.get_object()
-        rating = ArticleRating.objects.filter(user=self.request.user, article=article)
         star = int(request.data['rating'])
         if 0 <= star <= 5:
-            if rating:
-                rating.update(star=star)
-            else:
-                ArticleRating.objects.create(user=self.request.user, article=article, star=star)
+            _, created = ArticleRating.objects.update_or_create(user=self.request.user, article=article,
+                                                                defaults={'star': star})
+            if created:
+                add_activity({article.id: star * STAR_WEIGHT})
+            ArticleRating.objects.refresh_summary([article.id])
+            UserStats.objects.refresh([article.author_id], ['votes_received', 'stars_received'])
+            enqueue(refresh_related, [article.id])
+            article.refresh_from_db(fields=['rate_votes', 'rate_stars', 'rate_average'])
+            bump_version(article.slug)
 
             serializer = ArticleListSerializer(article)
             return Response(serializer.data)
         else:
             return Response({'error': 'Invalid number, select value from 0 to 5'})
 
+    @action(detail=True, methods=['get'])
+    def revisions(self, request, slug):
+        """
+        Endpoint to get article revisions history, newest first
+
+        @param slug: Article slug
+        @return: revisions page with next/previous cursors
+        """
+        article = get_object_or_404(Article.objects.only('id'), slug=slug)
+        revisions = article.revisions.select_related('author')
+        return self.get_keyset_paginated_response(revisions, ('-number',), ArticleRevisionSerializer)
+
+    @action(detail=True, methods=['get'], url_path=r'revisions/(?P<number>[0-9]+)')
+    def revision(self, request, slug, number):
+        """
+        Endpoint to get article at revision
+
+        @param slug: Article slug
+        @param number: revision number
+        @return: revision with title and body
+        """
+        article = get_object_or_404(Article.objects.only('id'), slug=slug)
+        revision = get_revision(article, int(number))
+        if revision is None:
+            raise NotFound('Revision not found')
+        return Response(ArticleRevisionDetailSerializer(revision).data)
+
+    @action(detail=True, methods=['get'])
+    def diff(self, request, slug):
+        """
+        Endpoint to get unified diff between article revisions
+
+        @param request: request with revisions numbers in from and to parameters
+        @param slug: Article slug
+        @return: unified diff of bodies
+        """
+        try:
+            numbers = int(request.query_params['from']), int(request.query_params['to'])
+        except (KeyError, ValueError):
+            return Response({'error': 'Revisions numbers from and to are required'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        article = get_object_or_404(Article.objects.only('id'), slug=slug)
+        old, new = [get_revision(article, number) for number in numbers]
+        if old is None or new is None:
+            raise NotFound('Revision not found')
+        diff = difflib.unified_diff(old.body.splitlines(keepends=True), new.body.splitlines(keepends=True),
+                                    fromfile=f'{old.title} (revision {old.number})',
+                                    tofile=f'{new.title} (revision {new.number})')
+        return Response({'from': old.number, 'to': new.number, 'diff': ''.join(diff)})
+
 
 class ArticleRatingViewSet(PublicArticleViewSet):
     queryset = ArticleRating.objects.all()
     serializer_class = ArticleRatingSerializer
+    throttle_rates = {
+        'create': '30/min',
+    }
     permission_classes_by_action = {
         'create': [IsAuthenticated],
         'list': [AllowAny],
@@ -124,9 +404,42 @@ class ArticleRatingViewSet(PublicArticleViewSet):
 
     def perform_create(self, serializer):
         """
-        Create a new vote
+        Create a new vote, second vote of the user for the article is rejected
         """
-        serializer.save(user=self.request.user)
+        try:
+            with transaction.atomic():
+                rating = serializer.save(user=self.request.user)
+        except IntegrityError:
+            raise ValidationError({'article': 'Article is already rated by the user, use vote to change rating'})
+        ArticleRating.objects.refresh_summary([rating.article_id])
+        UserStats.objects.refresh([rating.article.author_id], ['votes_received', 'stars_received'])
+        enqueue(refresh_related, [rating.article_id])
+        add_activity({rating.article_id: rating.star * STAR_WEIGHT})
+        bump_version(rating.article.slug)
+
+    def perform_update(self, serializer):
+        """
+        Update vote and rating summary of old and new articles
+        """
+        article_id = serializer.instance.article_id
+        rating = serializer.save()
+        ArticleRating.objects.refresh_summary({article_id, rating.article_id})
+        enqueue(refresh_related, sorted({article_id, rating.article_id}))
+        articles = dict(Article.objects.filter(id__in={article_id, rating.article_id}).values_list('slug', 'author_id'))
+        UserStats.objects.refresh(articles.values(), ['votes_received', 'stars_received'])
+        for slug in articles:
+            bump_version(slug)
+
+    def perform_destroy(self, instance):
+        """
+        Delete vote and update article rating summary
+        """
+        article_id = instance.article_id
+        instance.delete()
+        ArticleRating.objects.refresh_summary([article_id])
+        UserStats.objects.refresh([instance.article.author_id], ['votes_received', 'stars_received'])
+        enqueue(refresh_related, [article_id])
+        bump_version(instance.article.slug)
 
 
 class ArticleCommentViewSet(PublicArticleViewSet):
@@ -134,7 +447,12 @@ class ArticleCommentViewSet(PublicArticleViewSet):
     Manage comments in database
     """
     queryset = Comment.objects.all()
+    moderator_queryset = Comment.all_objects.all()
     serializer_class = ArticleCommentSerializer
+    filterset_fields = ['article']
+    throttle_rates = {
+        'create': '20/min',
+    }
     permission_classes_by_action = {
         'create': [IsAuthenticated],
         'list': [AllowAny],
@@ -143,20 +461,74 @@ class ArticleCommentViewSet(PublicArticleViewSet):
         'retrieve': [AllowAny],
         'destroy': [IsOwnerOrReadOnly or IsAdminUser],
     }
+    query_budgets = {
+        'list': 4,
+        'retrieve': 4,
+    }
 
     def perform_create(self, serializer):
         """
         Create a new comment
         """
-        serializer.save(author=self.request.user)
+        comment = serializer.save(author=self.request.user)
+        UserStats.objects.refresh([self.request.user.id], ['comments_count'])
+        bump_version(comment.article.slug)
+
+    def perform_update(self, serializer):
+        """
+        Update comment and invalidate cached article responses
+        """
+        status = serializer.instance.status
+        comment = serializer.save()
+        if comment.status != status:
+            UserStats.objects.refresh([comment.author_id], ['comments_count'])
+        bump_version(comment.article.slug)
+
+    def perform_destroy(self, instance):
+        """
+        Delete comment and invalidate cached article responses
+        """
+        authors = set(Comment.all_objects.filter(article_id=instance.article_id, path__startswith=instance.path)
+                      .values_list('author_id', flat=True))
+        instance.delete()
+        UserStats.objects.refresh(authors, ['comments_count'])
+        bump_version(instance.article.slug)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Endpoint to list root comments with replies loaded by one query per page
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(self.load_replies(page), many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(self.load_replies(queryset), many=True)
+        return Response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Endpoint to get comment with its replies tree
+        """
+        instance = self.load_replies([self.get_object()])[0]
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+    def load_replies(self, comments):
+        """Load replies trees unless children are excluded by ?fields"""
+        if is_field_requested(self.request, 'children'):
+            return load_subtrees(comments)
+        return comments
 
     def get_queryset(self):
         """
         List of parent components
         """
+        queryset = self.get_base_queryset()
         if self.action == 'list':
-            return self.queryset.filter(parent__isnull=True)
-        return self.queryset
+            queryset = queryset.filter(parent__isnull=True).select_related('author').order_by('path')
+        return sparse_queryset(queryset, self.get_serializer_class(), self.request, columns=self.sparse_columns)
 
 
 class ArticleTagViewSet(PublicArticleViewSet):
@@ -165,6 +537,9 @@ class ArticleTagViewSet(PublicArticleViewSet):
     """
     queryset = Tag.objects.all()
     serializer_class = ArticleTagSerializer
+    throttle_rates = {
+        'create': '20/min',
+    }
     permission_classes_by_action = {
         'create': [IsAuthenticated],
         'list': [AllowAny],
@@ -173,16 +548,54 @@ class ArticleTagViewSet(PublicArticleViewSet):
         'retrieve': [AllowAny],
         'destroy': [IsOwnerOrReadOnly or IsAdminUser],
     }
-    authentication_classes = [authentication.TokenAuthentication, ]
+    query_budgets = {
+        'list': 3,
+        'retrieve': 2,
+        'without_articles': 2,
+        'cloud': 1,
+    }
+    authentication_classes = [CachedTokenAuthentication, ]
 
     def perform_create(self, serializer):
         """
         Create a new tag
         """
         serializer.save(author=self.request.user)
+        UserStats.objects.refresh([self.request.user.id], ['tags_count'])
+
+    def perform_destroy(self, instance):
+        """
+        Delete tag and update author stats
+        """
+        instance.delete()
+        UserStats.objects.refresh([instance.author_id], ['tags_count'])
+
+    def perform_update(self, serializer):
+        """
+        Update tag, search index of tagged articles is updated by job
+        """
+        tag = serializer.save()
+        enqueue(index_articles, list(tag.article_set.values_list('id', flat=True)))
 
     @action(detail=False, methods=['get'])
     def without_articles(self, request):
-        tags = Tag.objects.filter(article__isnull=True)
+        tags = sparse_queryset(Tag.objects.filter(usage=0), self.get_serializer_class(), request)
+        serializer = self.get_serializer(tags, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def cloud(self, request):
+        """
+        Endpoint to get most used tags
+
+        @param request: request with number of tags in limit parameter, 50 by default
+        @return: tags with usage counts ordered by usage
+        """
+        try:
+            limit = min(max(int(request.query_params.get('limit', 50)), 1), 200)
+        except ValueError:
+            return Response({'error': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+        tags = sparse_queryset(Tag.objects.filter(usage__gt=0), self.get_serializer_class(), request)
+        tags = tags.order_by('-usage', '-id')[:limit]
         serializer = self.get_serializer(tags, many=True)
         return Response(serializer.data)
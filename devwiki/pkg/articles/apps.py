@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ArticlesConfig(AppConfig):
     name = 'pkg.articles'
+
+    def ready(self):
+        from pkg.articles import signals  # noqa: F401
@@ -0,0 +1,128 @@
+"""
+Versioned cache of anonymous articles responses
+
+Cached responses are keyed on per-article and per-collection version
+counters, writes bump the counters instead of deleting cache entries.
+Responses carry ETag and Last-Modified, matching If-None-Match and
+If-Modified-Since requests are answered with 304 without serialization.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from pkg.routers import primary
+
+COLLECTION_VERSION_KEY = 'articles:version'
+
+
+def article_version_key(slug):
+    return f'articles:version:{slug}'
+
+
+def get_version(key):
+    """
+    Get version counter, missing counter starts from current time in ms,
+    so responses cached with evicted counter are never reused
+
+    @return: (version, last modified timestamp)
+    """
+    values = cache.get_many([key, f'{key}:modified'])
+    version = values.get(key)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version, values.get(f'{key}:modified')
+
+
+def bump_version(slug=None):
+    """
+    Invalidate cached articles collections and article responses
+
+    @param slug: changed article slug
+    """
+    keys = [COLLECTION_VERSION_KEY]
+    if slug:
+        keys.append(article_version_key(slug))
+
+    modified = time.time()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+    cache.set_many({f'{key}:modified': modified for key in keys}, timeout=None)
+
+
+def not_modified(request, etag, last_modified):
+    """Check conditional request headers against response validators"""
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in etags
+
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return bool(if_modified_since and last_modified and int(last_modified) <= if_modified_since)
+
+
+class VersionedCacheMixin:
+    """Viewset mixin to cache anonymous GET responses and answer conditional requests"""
+
+    def get_cached_response(self, request, build, slug=None, on_hit=None):
+        """
+        Get response from versioned cache or build and cache it
+
+        @param request: request
+        @param build: callable building response on cache miss
+        @param slug: article slug for article response, collection response if None
+        @param on_hit: callable called with cached data and response cache_extra on cache hit,
+            returns data of the response
+        @return: cached, built or 304 response
+        """
+        if request.user.is_authenticated:
+            return build()
+
+        version_key = article_version_key(slug) if slug else COLLECTION_VERSION_KEY
+        version, modified = get_version(version_key)
+        path_hash = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        key = f'articles:response:{version}:{path_hash}'
+
+        entry = cache.get(key)
+        if entry is None:
+            # lagging replica would cache data older than the version for the whole timeout
+            with primary():
+                response = build()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = {
+                'data': response.data,
+                'etag': quote_etag(f'{version}-{path_hash}'),
+                'last_modified': self.get_last_modified(response.data, modified),
+                'extra': getattr(response, 'cache_extra', None),
+            }
+            cache.set(key, entry, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+            data = entry['data']
+        else:
+            data = entry['data'] if on_hit is None else on_hit(entry['data'], entry['extra'])
+
+        if not_modified(request, entry['etag'], entry['last_modified']):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        return response
+
+    @staticmethod
+    def get_last_modified(data, modified):
+        """Last modified timestamp from article updated_at and last version bump"""
+        timestamps = [modified or 0]
+        if isinstance(data, dict) and data.get('updated_at'):
+            timestamps.append(parse_datetime(data['updated_at']).timestamp())
+        return max(timestamps) or time.time()
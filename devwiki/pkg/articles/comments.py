@@ -0,0 +1,64 @@
+"""
+Comments tree engine
+
+Comments keep materialized path of zero padded ids, so whole thread or
+subtree is fetched with one ordered query and nested in memory.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+from pkg.articles.models import Comment
+
+
+def build_comment_tree(comments):
+    """
+    Nest comments ordered by path, replies are stored in tree_children
+
+    @param comments: comments where every parent goes before its replies
+    @return: list of comments without loaded parent
+    """
+    nodes = {}
+    roots = []
+    for comment in comments:
+        comment.tree_children = []
+        nodes[comment.id] = comment
+        parent = nodes.get(comment.parent_id)
+        if parent is None:
+            roots.append(comment)
+        else:
+            parent.tree_children.append(comment)
+    return roots
+
+
+def article_comments_tree(article_id):
+    """
+    Load comments thread of the article with one query, replies of
+    deleted comments are hidden with them
+
+    @param article_id: Article id
+    @return: list of root comments with nested replies
+    """
+    comments = Comment.objects.filter(article=article_id).select_related('author').order_by('path')
+    return [comment for comment in build_comment_tree(comments) if comment.parent_id is None]
+
+
+def load_subtrees(comments):
+    """
+    Load replies of comments with one query
+
+    @param comments: comments with built path
+    @return: list of given comments with nested replies
+    """
+    comments = list(comments)
+    if not comments:
+        return comments
+
+    prefixes = reduce(or_, (Q(path__startswith=comment.path + '/') for comment in comments))
+    replies = Comment.objects.filter(
+        prefixes,
+        article__in={comment.article_id for comment in comments},
+    ).select_related('author').order_by('path')
+    build_comment_tree(comments + list(replies))
+    return comments
@@ -0,0 +1,52 @@
+import django_filters
+from django.db.models import Subquery
+
+from pkg.articles.models import Article, ArticleTag, Tag
+
+AND = 'and'
+OR = 'or'
+
+
+def filter_by_tags(queryset, names, mode=AND):
+    """
+    Filter articles having all (AND) or any (OR) of tags
+
+    AND is nested subqueries on (tag, article) index starting from the
+    rarest tag, every next tag only probes articles left by rarer ones.
+
+    @param queryset: articles queryset
+    @param names: tag names
+    @param mode: AND or OR
+    @return: filtered queryset
+    """
+    names = set(names)
+    tags = list(Tag.objects.filter(name__in=names).order_by('usage', 'id').values_list('id', flat=True))
+    if mode == OR:
+        return queryset.filter(id__in=ArticleTag.objects.filter(tag__in=tags).values('article_id'))
+    if len(tags) < len(names):
+        return queryset.none()
+
+    articles = ArticleTag.objects.filter(tag=tags[0]).values('article_id')
+    for tag in tags[1:]:
+        articles = ArticleTag.objects.filter(tag=tag, article_id__in=Subquery(articles)).values('article_id')
+    return queryset.filter(id__in=articles)
+
+
+class ArticleFilter(django_filters.FilterSet):
+    """Articles filter, ?tags=a,b,c&tags_mode=and|or"""
+    tags = django_filters.CharFilter(method='filter_tags')
+    tags_mode = django_filters.ChoiceFilter(choices=((AND, 'All tags'), (OR, 'Any tag')), method='filter_tags_mode')
+
+    class Meta:
+        model = Article
+        fields = ['tags', 'tags_mode']
+
+    def filter_tags(self, queryset, name, value):
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        if not names:
+            return queryset
+        return filter_by_tags(queryset, names, self.form.cleaned_data.get('tags_mode') or AND)
+
+    def filter_tags_mode(self, queryset, name, value):
+        """Mode is applied by tags filter"""
+        return queryset
@@ -0,0 +1,22 @@
+"""Post-write work on articles deferred to job workers"""
+from pkg.articles import related, search
+from pkg.articles.models import Article, Tag
+from pkg.jobs.queue import job
+
+
+@job
+def index_articles(article_ids):
+    """Update search index of the articles, missing articles are skipped"""
+    search.index_articles(list(Article.all_objects.filter(id__in=article_ids)))
+
+
+@job
+def refresh_tags_usage(tag_ids):
+    Tag.objects.refresh_usage(tag_ids)
+
+
+@job
+def refresh_related(article_ids):
+    """Update related articles of the articles after their tags, ratings or status changed"""
+    for article_id in article_ids:
+        related.refresh_related(article_id)
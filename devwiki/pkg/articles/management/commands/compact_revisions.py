@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from pkg.articles.models import ArticleRevision
+from pkg.articles.revisions import compact
+
+
+class Command(BaseCommand):
+    help = 'Rebuild articles revisions chains so every N-th and the latest revision is a full snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, help='Snapshot interval, ARTICLE_REVISION_SNAPSHOT_INTERVAL by default')
+        parser.add_argument('--article', type=int, action='append', dest='articles', help='Article id')
+
+    def handle(self, *args, **options):
+        articles = options['articles'] or ArticleRevision.objects.values_list('article_id', flat=True).distinct()
+        rewritten = 0
+        for article_id in articles:
+            rewritten += compact(article_id, options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Rewritten {rewritten} revisions'))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from pkg.articles.related import compute_related
+
+
+class Command(BaseCommand):
+    help = 'Rebuild related articles of all posted articles by tags and co-rating similarity'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Articles written per transaction')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = compute_related(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Related articles of {written} articles computed in {time.perf_counter() - started:.1f}s'))
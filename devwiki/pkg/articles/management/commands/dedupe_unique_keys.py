@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+
+from pkg.articles.caching import bump_version
+from pkg.articles.models import Article, ArticleRating
+from pkg.users.models import UserStats
+
+
+class Command(BaseCommand):
+    help = 'Remove duplicate ratings and article slugs, run before migrating to unique constraints'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            ratings = self.dedupe_ratings()
+            slugs = self.dedupe_slugs()
+        self.stdout.write(self.style.SUCCESS(f'Removed {ratings} duplicate ratings, renamed {slugs} slugs'))
+
+    def dedupe_ratings(self):
+        """Keep the latest vote of user for article"""
+        duplicates = ArticleRating.objects.values('user', 'article').annotate(
+            votes=Count('id'), latest=Max('id')).filter(votes__gt=1)
+        removed, articles = 0, set()
+        for duplicate in duplicates:
+            removed += ArticleRating.objects.filter(user=duplicate['user'], article=duplicate['article']) \
+                .exclude(id=duplicate['latest']).delete()[0]
+            articles.add(duplicate['article'])
+        if articles:
+            ArticleRating.objects.refresh_summary(articles)
+            UserStats.objects.refresh(Article.all_objects.filter(id__in=articles).values_list('author_id', flat=True),
+                                      ['votes_received', 'stars_received'])
+        return removed
+
+    def dedupe_slugs(self):
+        """The oldest article keeps the slug, the others get new unique slug from title"""
+        slugs = Article.all_objects.values('slug').annotate(articles=Count('id')).filter(
+            slug__isnull=False, articles__gt=1).values_list('slug', flat=True)
+        field = Article._meta.get_field('slug')
+        renamed = 0
+        for slug in list(slugs):
+            for article in Article.all_objects.filter(slug=slug).order_by('id')[1:]:
+                article.slug = None
+                Article.all_objects.filter(id=article.id).update(slug=field.create_slug(article, False))
+                renamed += 1
+            bump_version(slug)
+        return renamed
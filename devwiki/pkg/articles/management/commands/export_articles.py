@@ -0,0 +1,23 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from pkg.articles.transfer import TransferStats, export_articles
+
+
+class Command(BaseCommand):
+    help = 'Export articles with tags, visits and comments to NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Output file, - for stdout')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        stats = TransferStats()
+        output = sys.stdout if options['path'] == '-' else open(options['path'], 'w', encoding='utf-8')
+        try:
+            output.writelines(export_articles(options['batch_size'], stats))
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        self.stderr.write(self.style.SUCCESS(f'Exported: {stats.as_dict()}'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from pkg.articles.models import ArticleVisits
+from pkg.articles.visits import flush_visits
+
+
+class Command(BaseCommand):
+    help = 'Apply article visits buffered in shared cache to database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        batch, flushed = [], 0
+        for visits_id in ArticleVisits.objects.values_list('id', flat=True).iterator(chunk_size=batch_size):
+            batch.append(visits_id)
+            if len(batch) == batch_size:
+                flushed += sum(flush_visits(batch).values())
+                batch = []
+        if batch:
+            flushed += sum(flush_visits(batch).values())
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} visits'))
@@ -0,0 +1,23 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from pkg.articles.transfer import import_articles
+
+
+class Command(BaseCommand):
+    help = 'Import articles with tags, visits and comments from NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--author', required=True, help='Email of author for rows with unknown author')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            author = get_user_model().objects.get(email=options['author'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User {options["author"]} does not exist')
+
+        with open(options['path'], 'rb') as lines:
+            stats = import_articles(lines, author, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Imported: {stats.as_dict()}'))
@@ -0,0 +1,30 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from pkg.articles.purge import purge_articles, purge_comments
+
+
+class Command(BaseCommand):
+    help = 'Move articles and comments deleted long ago to archive table in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Purge rows deleted more than N days ago')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+        parser.add_argument('--no-archive', action='store_false', dest='archive',
+                            help='Delete rows without copying them to archive')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        for name, purge in (('articles', purge_articles), ('comments', purge_comments)):
+            purged = 0
+            while True:
+                batch = purge(before, options['batch_size'], options['archive'])
+                if not batch:
+                    break
+                purged += batch
+                time.sleep(options['pause'])
+            self.stdout.write(self.style.SUCCESS(f'Purged {purged} {name}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from pkg.articles.popularity import rebalance
+
+
+class Command(BaseCommand):
+    help = 'Recalculate time-decayed popularity of all articles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebalanced = rebalance(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebalanced popularity of {rebalanced} articles'))
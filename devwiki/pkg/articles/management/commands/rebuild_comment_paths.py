@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from pkg.articles.models import Comment
+
+
+class Command(BaseCommand):
+    help = 'Rebuild materialized path and depth of all comments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        paths, batch, updated = {}, [], 0
+        comments = Comment.all_objects.only('id', 'parent_id', 'path', 'depth').order_by('id')
+
+        for comment in comments.iterator(chunk_size=batch_size):
+            parent_path = ''
+            if comment.parent_id:
+                parent_path = paths.get(comment.parent_id) or Comment.all_objects.get(id=comment.parent_id).path
+            comment.path = comment.build_path(parent_path)
+            comment.depth = comment.path.count('/')
+            paths[comment.id] = comment.path
+            batch.append(comment)
+
+            if len(batch) == batch_size:
+                Comment.all_objects.bulk_update(batch, ['path', 'depth'])
+                updated += len(batch)
+                batch = []
+        if batch:
+            Comment.all_objects.bulk_update(batch, ['path', 'depth'])
+            updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt paths of {updated} comments'))
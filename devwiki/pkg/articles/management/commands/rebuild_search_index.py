@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from pkg.articles.models import Article
+from pkg.articles.search import index_article
+
+
+class Command(BaseCommand):
+    help = 'Rebuild full-text search index of all articles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        indexed = 0
+        for article in Article.all_objects.iterator(chunk_size=options['batch_size']):
+            index_article(article)
+            indexed += 1
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} articles'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from pkg.articles.models import ArticleRating
+
+
+class Command(BaseCommand):
+    help = 'Recalculate rating summary (votes, stars sum, average) of all articles'
+
+    def handle(self, *args, **options):
+        updated = ArticleRating.objects.refresh_summary()
+        self.stdout.write(self.style.SUCCESS(f'Rating summary refreshed for {updated} articles'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from pkg.articles.models import Tag
+
+
+class Command(BaseCommand):
+    help = 'Recalculate usage (number of posted articles) of all tags, run once after adding Tag.usage'
+
+    def handle(self, *args, **options):
+        updated = Tag.objects.refresh_usage()
+        self.stdout.write(self.style.SUCCESS(f'Usage refreshed for {updated} tags'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from pkg.articles.models import Article
+from pkg.articles.rendering import RENDERED_FIELDS, render_article
+
+
+class Command(BaseCommand):
+    help = 'Render bodies of articles to HTML, excerpt and reading time, unchanged bodies are skipped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--force', action='store_true', help='Render articles with unchanged body too')
+
+    def handle(self, *args, **options):
+        articles = Article._base_manager.only('id', 'body', 'body_hash').order_by('id')
+        last_id, rendered = 0, 0
+        while True:
+            batch = list(articles.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            changed = [article for article in batch if render_article(article, force=options['force'])]
+            Article._base_manager.bulk_update(changed, RENDERED_FIELDS)
+            rendered += len(changed)
+        self.stdout.write(self.style.SUCCESS(f'Rendered {rendered} articles'))
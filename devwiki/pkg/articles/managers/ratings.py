@@ -0,0 +1,28 @@
+from django.db import models
+from django.db.models import Avg, Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+class ArticleRatingManager(models.Manager):
+    """Rating manager which keeps articles rating summary up to date"""
+
+    def refresh_summary(self, article_ids=None):
+        """
+        Recalculate votes number, stars sum and average rating of articles
+        in a single UPDATE statement
+
+        @param article_ids: list of articles ids, all articles if None
+        @return: number of updated articles
+        """
+        article_model = self.model._meta.get_field('article').related_model
+        ratings = self.filter(article=OuterRef('pk')).order_by().values('article')
+
+        articles = article_model._base_manager.all()
+        if article_ids is not None:
+            articles = articles.filter(id__in=article_ids)
+
+        return articles.update(
+            rate_votes=Coalesce(Subquery(ratings.annotate(votes=Count('id')).values('votes')), Value(0)),
+            rate_stars=Coalesce(Subquery(ratings.annotate(stars=Sum('star')).values('stars')), Value(0)),
+            rate_average=Coalesce(Subquery(ratings.annotate(average=Avg('star')).values('average')), Value(0.0)),
+        )
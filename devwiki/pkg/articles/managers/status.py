@@ -0,0 +1,33 @@
+from django.db import models
+
+from pkg.articles.choices import Status
+
+
+class StatusQuerySet(models.QuerySet):
+    """QuerySet of rows with soft-delete status"""
+
+    def posted(self):
+        return self.filter(status=Status.POSTED)
+
+    def deleted(self, before=None):
+        """
+        Soft-deleted rows
+
+        @param before: only rows deleted before the datetime
+        @return: queryset
+        """
+        queryset = self.filter(status=Status.DELETED)
+        if before is not None:
+            queryset = queryset.filter(deleted_at__lt=before)
+        return queryset
+
+
+class PostedManager(models.Manager.from_queryset(StatusQuerySet)):
+    """Default manager returning POSTED rows only, so queries match partial indexes over POSTED rows"""
+
+    def get_queryset(self):
+        return super().get_queryset().posted()
+
+
+class StatusManager(models.Manager.from_queryset(StatusQuerySet)):
+    """Manager returning rows of any status, for moderators and maintenance"""
@@ -0,0 +1,45 @@
+from django.db import models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from pkg.articles.choices import Status
+
+
+class TagManager(models.Manager):
+    """Tag manager with bulk resolving of tag names and usage counts"""
+
+    def resolve(self, names, author):
+        """
+        Get tags by names, missing tags are created with one bulk INSERT,
+        so any number of names is resolved with at most three queries
+
+        @param names: tag names
+        @param author: author of created tags or dict of authors by tag name
+        @return: list of tags in names order
+        """
+        names = list(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+        if not names:
+            return []
+
+        tags = {tag.name: tag for tag in self.filter(name__in=names)}
+        missing = [name for name in names if name not in tags]
+        if missing:
+            authors = author if isinstance(author, dict) else dict.fromkeys(missing, author)
+            self.bulk_create([self.model(name=name, author=authors[name]) for name in missing],
+                             ignore_conflicts=True)
+            tags.update((tag.name, tag) for tag in self.filter(name__in=missing))
+        return [tags[name] for name in names if name in tags]
+
+    def refresh_usage(self, tag_ids=None):
+        """
+        Recalculate number of POSTED articles of tags in a single UPDATE statement
+
+        @param tag_ids: list of tags ids, all tags if None
+        @return: number of updated tags
+        """
+        relations = self.model.article_set.through.objects.filter(
+            tag=OuterRef('pk'), article__status=Status.POSTED).order_by().values('tag')
+        tags = self.all()
+        if tag_ids is not None:
+            tags = tags.filter(id__in=set(tag_ids))
+        return tags.update(usage=Coalesce(Subquery(relations.annotate(usage=Count('id')).values('usage')), Value(0)))
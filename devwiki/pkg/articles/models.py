@@ -1,14 +1,52 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinLengthValidator
 from django.db import models
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat, Substr
 from django.core.validators import RegexValidator, MaxValueValidator
+from django.utils import timezone
 
 from django.utils.translation import ugettext_lazy as _
 from pkg.articles.choices import Status
+from pkg.articles.rendering import RENDERED_FIELDS, render_article
+from pkg.articles.managers.ratings import ArticleRatingManager
+from pkg.articles.managers.status import PostedManager, StatusManager
+from pkg.articles.managers.tags import TagManager
 from django_extensions.db.fields import AutoSlugField
 
 alphaValidator = RegexValidator(r'[A-Za-zwА-Яа-яІіЄєЇї]+$', 'That field can contain only letters')
 
+POSTED = Q(status=Status.POSTED)
+DELETED = Q(status=Status.DELETED)
+
+
+def track_deletion(instance, kwargs):
+    """
+    Stamp deleted_at of instance being saved when its status changes
+
+    @param instance: Article or Comment
+    @param kwargs: save() keyword arguments, update_fields is extended with deleted_at
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    deleted = instance.status == Status.DELETED
+    if deleted == (instance.deleted_at is not None):
+        return
+    instance.deleted_at = timezone.now() if deleted else None
+    if update_fields is not None:
+        kwargs['update_fields'] = {*update_fields, 'deleted_at'}
+
+
+class UniqueSlugField(AutoSlugField):
+    """AutoSlugField looking for unique slug among rows of any status, not default manager rows only"""
+
+    def get_queryset(self, model_cls, slug_field):
+        return model_cls._base_manager.all()
+
 
 class Article(models.Model):
     title = models.CharField(verbose_name=_("Article's title"),
@@ -23,13 +61,15 @@ class Article(models.Model):
                                verbose_name=_("Article's author"),
                                on_delete=models.DO_NOTHING)
     body = models.TextField(verbose_name=_("Article's body"), validators=[MinLengthValidator(10)])
-    slug = AutoSlugField(populate_from='title',
-                         blank=True,
-                         null=True,
-                         verbose_name=_("Article's slug"))
+    slug = UniqueSlugField(populate_from='title',
+                           unique=True,
+                           blank=True,
+                           null=True,
+                           verbose_name=_("Article's slug"))
     tags = models.ManyToManyField('Tag',
                                   blank=True,
                                   null=True,
+                                  through='ArticleTag',
                                   verbose_name=_("Article's tags"))
     visits = models.OneToOneField('ArticleVisits',
                                   on_delete=models.CASCADE,
@@ -41,15 +81,61 @@ class Article(models.Model):
         default=Status.POSTED,
         verbose_name=_("Article's status (Deleted/Posted)")
     )
+    deleted_at = models.DateTimeField(verbose_name=_("Article's deletion time"), null=True, blank=True,
+                                      editable=False)
+    rate_votes = models.PositiveIntegerField(verbose_name=_("Article's rating votes number"),
+                                             default=0)
+    rate_stars = models.PositiveIntegerField(verbose_name=_("Article's rating stars sum"),
+                                             default=0)
+    rate_average = models.FloatField(verbose_name=_("Article's average rating"),
+                                     default=0)
+    popularity = models.FloatField(verbose_name=_("Article's time-decayed popularity score"),
+                                   default=0,
+                                   editable=False)
+    search_vector = SearchVectorField(verbose_name=_("Article's full-text search vector"),
+                                      null=True,
+                                      editable=False)
+    body_html = models.TextField(verbose_name=_("Article's rendered body"), default='', editable=False)
+    excerpt = models.TextField(verbose_name=_("Article's plain text excerpt"), default='', editable=False)
+    reading_time = models.PositiveSmallIntegerField(verbose_name=_("Article's reading time in minutes"),
+                                                    default=0,
+                                                    editable=False)
+    body_hash = models.CharField(verbose_name=_("Hash of rendered body"), max_length=64, default='',
+                                 editable=False)
+
+    objects = PostedManager()
+    all_objects = StatusManager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='article_search_vector_gin', condition=POSTED),
+            models.Index(fields=['created_at', 'id'], name='article_created_idx', condition=POSTED),
+            models.Index(fields=['author', 'created_at', 'id'], name='article_author_created_idx', condition=POSTED),
+            models.Index(fields=['popularity', 'id'], name='article_popularity_idx', condition=POSTED),
+            models.Index(fields=['deleted_at', 'id'], name='article_deleted_idx', condition=DELETED),
+        ]
 
     def __str__(self):
         """Function to naming model"""
         return self.title
 
+    def save(self, *args, **kwargs):
+        """Save article, body is rendered only when changed"""
+        track_deletion(self, kwargs)
+        update_fields = kwargs.get('update_fields')
+        if (update_fields is None or 'body' in update_fields) and render_article(self) and update_fields:
+            kwargs['update_fields'] = {*update_fields, *RENDERED_FIELDS}
+        super().save(*args, **kwargs)
+
 
 class ArticleVisits(models.Model):
     number = models.IntegerField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['number', 'id'], name='visits_number_idx'),
+        ]
+
     def __str__(self):
         return f"{self.article.title} - {self.number}"
 
@@ -68,9 +154,57 @@ class ArticleRating(models.Model):
                                             validators=[MaxValueValidator(5)],
                                             default=0)
 
+    objects = ArticleRatingManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'article'], name='rating_user_article_unique'),
+        ]
+
     def __str__(self):
         return f"{self.star} - {self.article.title}"
 
+    @property
+    def author(self):
+        return self.user
+
+
+class ArticleRevision(models.Model):
+    """Article title and body at revision, body is full snapshot or reverse delta to next revision"""
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='revisions')
+    number = models.PositiveIntegerField(verbose_name=_("Revision number"))
+    title = models.CharField(verbose_name=_("Article's title at revision"), max_length=255)
+    author = models.ForeignKey(get_user_model(),
+                               verbose_name=_("Revision's author"),
+                               on_delete=models.SET_NULL,
+                               null=True,
+                               blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    is_snapshot = models.BooleanField(verbose_name=_("Data is full body"), default=True)
+    data = models.TextField(verbose_name=_("Article's body or delta to next revision"))
+
+    class Meta:
+        unique_together = ('article', 'number')
+
+    def __str__(self):
+        return f"{self.article_id} - {self.number}"
+
+
+class ArticleSearchTerm(models.Model):
+    """Inverted index entry used for full-text search on databases without tsvector"""
+    term = models.CharField(verbose_name=_("Search term"), max_length=64)
+    article = models.ForeignKey('Article',
+                                verbose_name=_("Search term article"),
+                                on_delete=models.CASCADE,
+                                related_name='search_terms')
+    score = models.FloatField(verbose_name=_("Weighted term frequency"))
+
+    class Meta:
+        unique_together = ['term', 'article']
+
+    def __str__(self):
+        return f"{self.term} - {self.article_id}"
+
 
 class Comment(models.Model):
     article = models.ForeignKey(Article,
@@ -96,21 +230,149 @@ class Comment(models.Model):
         default=Status.POSTED,
         verbose_name=_("Comment's status (Deleted/Posted)")
     )
+    deleted_at = models.DateTimeField(verbose_name=_("Comment's deletion time"), null=True, blank=True,
+                                      editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    path = models.CharField(verbose_name=_("Comment's materialized path"),
+                            max_length=1024,
+                            blank=True,
+                            editable=False)
+    depth = models.PositiveSmallIntegerField(verbose_name=_("Comment's depth in thread"),
+                                             default=0,
+                                             editable=False)
+
+    objects = PostedManager()
+    all_objects = StatusManager()
+
+    class Meta:
+        indexes = [
+            # not partial, subtree writes and purge select replies of any status
+            models.Index(fields=['article', 'path'], name='comment_article_path_idx'),
+            # root comments listing, path of root comment orders it by creation
+            models.Index(fields=['path'], name='comment_root_path_idx', condition=POSTED & Q(parent=None)),
+            models.Index(fields=['article', 'parent', 'path'], name='comment_article_parent_idx', condition=POSTED),
+            models.Index(fields=['author', 'created_at', 'id'], name='comment_author_created_idx', condition=POSTED),
+            models.Index(fields=['deleted_at', 'id'], name='comment_deleted_idx', condition=DELETED),
+        ]
+
+    PATH_STEP = 10
 
     def __str__(self):
         return f'Comment {self.content}'
 
+    def save(self, *args, **kwargs):
+        """Save comment and keep materialized path of it and its replies"""
+        track_deletion(self, kwargs)
+        super().save(*args, **kwargs)
+        old_path = self.path
+        self.path = self.build_path(self.parent.path if self.parent_id else '')
+        if self.path == old_path:
+            return
+
+        old_depth = self.depth
+        self.depth = self.path.count('/')
+        Comment.all_objects.filter(id=self.id).update(path=self.path, depth=self.depth)
+        if old_path:
+            Comment.all_objects.filter(article=self.article_id, path__startswith=old_path + '/').update(
+                path=Concat(Value(self.path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + self.depth - old_depth,
+            )
+
+    def build_path(self, parent_path):
+        """
+        Build materialized path of the comment
+
+        @param parent_path: path of parent comment, empty for root comment
+        @return: path of zero padded ids from thread root to the comment
+        """
+        step = str(self.id).zfill(self.PATH_STEP)
+        return f'{parent_path}/{step}' if parent_path else step
+
     @property
     def owner(self):
         return self.author
 
+    @property
+    def replies(self):
+        """Comment replies, assembled tree children if comment was loaded with tree"""
+        if hasattr(self, 'tree_children'):
+            return self.tree_children
+        return self.children.select_related('author').order_by('path')
+
 
 class Tag(models.Model):
     name = models.CharField(max_length=64,
                             verbose_name=_("Tag's title"),
                             unique=True)
     author = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    usage = models.PositiveIntegerField(verbose_name=_("Number of articles with the tag"),
+                                        default=0,
+                                        editable=False)
+
+    objects = TagManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['author', 'id'], name='tag_author_idx'),
+            models.Index(fields=['usage', 'id'], name='tag_usage_idx'),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class ArticleTag(models.Model):
+    """Articles and tags relation, indexed both ways for tags intersection"""
+    article = models.ForeignKey(Article, on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'articles_article_tags'
+        unique_together = ('article', 'tag')
+        indexes = [
+            models.Index(fields=['tag', 'article'], name='article_tag_tag_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.article_id} - {self.tag_id}"
+
+
+class RelatedArticle(models.Model):
+    """Precomputed neighbor of article, top RELATED_ARTICLES_COUNT by score are kept, see related.py"""
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='neighbors')
+    related = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='related_to')
+    score = models.FloatField(verbose_name=_("Combined similarity"))
+    tag_score = models.FloatField(verbose_name=_("Tags Jaccard similarity"), default=0)
+    rating_score = models.FloatField(verbose_name=_("Co-rating cosine similarity"), default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['article', 'related'], name='related_article_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['article', '-score'], name='related_article_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.article_id} - {self.related_id}: {self.score:.3f}"
+
+
+class Archive(models.Model):
+    """Purged soft-deleted article or comment, kept out of the hot tables"""
+    ARTICLE = 'article'
+    COMMENT = 'comment'
+
+    kind = models.CharField(verbose_name=_("Archived object kind"), max_length=16,
+                            choices=[(ARTICLE, ARTICLE), (COMMENT, COMMENT)])
+    object_id = models.PositiveIntegerField(verbose_name=_("Archived object id"))
+    data = models.JSONField(verbose_name=_("Archived object fields"), encoder=DjangoJSONEncoder)
+    deleted_at = models.DateTimeField(verbose_name=_("Object's deletion time"), null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'object_id'], name='archive_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}"
@@ -0,0 +1,103 @@
+"""
+Time-decayed articles popularity
+
+Score is kept in log space relative to fixed EPOCH:
+
+    popularity = ln(sum(weight * 2 ** ((event_time - EPOCH) / half_life)))
+
+Every visit or vote is added to the score with one UPDATE, older activity
+decays without rewriting rows, because ordering by popularity is the same
+as ordering by activity decayed to current time. Periodic rebalance
+recalculates scores from visits, rating and age of articles.
+"""
+import math
+
+from django.conf import settings
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+from pkg.articles.models import Article
+
+EPOCH = timezone.datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+PUBLISH_WEIGHT = 10
+VISIT_WEIGHT = 1
+STAR_WEIGHT = 2
+
+
+def _half_lives(at):
+    return (at - EPOCH).total_seconds() / 3600 / settings.POPULARITY_HALF_LIFE
+
+
+def event_score(weight, at=None):
+    """
+    Score of single event in popularity log space
+
+    @param weight: event weight
+    @param at: event time, now if None
+    """
+    return math.log(weight) + _half_lives(at or timezone.now()) * math.log(2)
+
+
+def add_activity(weights, field='id', at=None):
+    """
+    Add weighted events to articles popularity with one UPDATE
+
+    @param weights: dict of event weights by article field value
+    @param field: Article field used as key of weights
+    @param at: events time, now if None
+    """
+    weights = {key: weight for key, weight in weights.items() if weight > 0}
+    if not weights:
+        return
+
+    score = Case(
+        *[When(**{field: key}, then=Value(event_score(weight, at))) for key, weight in weights.items()],
+        output_field=FloatField(),
+    )
+    # numerically stable ln(exp(popularity) + exp(score))
+    Article.objects.filter(**{f'{field}__in': weights}).update(
+        popularity=Greatest(F('popularity'), score) + Ln(Value(1.0) + Exp(-Abs(F('popularity') - score)))
+    )
+
+
+def estimate_score(created_at, activity, now):
+    """
+    Score of article with publish event and activity spread evenly over its age
+
+    @param created_at: article created time
+    @param activity: weighted visits and votes
+    @param now: rebalance time
+    """
+    age = max(_half_lives(now) - _half_lives(created_at), 0)
+    score = math.log(PUBLISH_WEIGHT) - age * math.log(2)
+    if activity > 0:
+        decay = (1 - 2 ** -age) / (age * math.log(2)) if age > 1e-9 else 1
+        spread = math.log(activity * decay)
+        score = max(score, spread) + math.log1p(math.exp(-abs(score - spread)))
+    return score + _half_lives(now) * math.log(2)
+
+
+def rebalance(batch_size=1000):
+    """
+    Recalculate popularity of all articles from visits, rating and age
+
+    @param batch_size: number of articles updated by one query
+    @return: number of rebalanced articles
+    """
+    now = timezone.now()
+    batch, rebalanced = [], 0
+    articles = Article.all_objects.values_list('id', 'created_at', 'visits__number', 'rate_stars').order_by()
+
+    for article_id, created_at, visits, stars in articles.iterator(chunk_size=batch_size):
+        activity = (visits or 0) * VISIT_WEIGHT + stars * STAR_WEIGHT
+        batch.append(Article(id=article_id, popularity=estimate_score(created_at, activity, now)))
+        if len(batch) == batch_size:
+            Article.all_objects.bulk_update(batch, ['popularity'])
+            rebalanced += len(batch)
+            batch = []
+    if batch:
+        Article.all_objects.bulk_update(batch, ['popularity'])
+        rebalanced += len(batch)
+    return rebalanced
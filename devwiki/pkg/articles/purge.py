@@ -0,0 +1,98 @@
+"""
+Purge of long soft-deleted articles and comments
+
+Rows DELETED before the cutoff are moved to Archive table and deleted in
+batches, every batch in its own short transaction, so the hot tables keep
+POSTED rows mostly and purge does not block writers for long. Deleted
+article is archived with all its comments, deleted comment with its whole
+replies subtree, because replies of deleted comments are not served.
+Revisions, ratings and search terms of purged articles are dropped.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+
+from pkg.articles.models import Archive, Article, ArticleTag, ArticleVisits, Comment
+from pkg.users.models import UserStats
+
+ARTICLE_ARCHIVED_EXCLUDE = {'search_vector', 'body_html', 'excerpt', 'reading_time', 'body_hash'}
+
+
+def archived_fields(model, exclude=()):
+    return [field.attname for field in model._meta.concrete_fields if field.name not in exclude]
+
+
+def lock_batch(queryset, batch_size):
+    """Ids of the oldest deleted rows, rows locked by concurrent purge are skipped"""
+    return list(queryset.select_for_update(skip_locked=True).order_by('deleted_at', 'id')
+                .values_list('id', flat=True)[:batch_size])
+
+
+def archive_rows(kind, rows):
+    Archive.objects.bulk_create([
+        Archive(kind=kind, object_id=row['id'], data=row, deleted_at=row.get('deleted_at')) for row in rows
+    ])
+
+
+def purge_articles(before, batch_size=500, archive=True):
+    """
+    Purge one batch of articles deleted before the datetime
+
+    @param before: deletion time cutoff
+    @param batch_size: max number of purged articles
+    @param archive: copy rows to Archive before delete
+    @return: number of purged articles
+    """
+    with transaction.atomic():
+        ids = lock_batch(Article.all_objects.deleted(before), batch_size)
+        if not ids:
+            return 0
+
+        articles = list(Article.all_objects.filter(id__in=ids).values(
+            *archived_fields(Article, ARTICLE_ARCHIVED_EXCLUDE)))
+        comments = list(Comment.all_objects.filter(article__in=ids).order_by('article', 'path')
+                        .values(*archived_fields(Comment)))
+        if archive:
+            tags = {}
+            for article_id, name in ArticleTag.objects.filter(article__in=ids).values_list(
+                    'article', 'tag__name'):
+                tags.setdefault(article_id, []).append(name)
+            for article in articles:
+                article['tags'] = tags.get(article['id'], [])
+            archive_rows(Archive.ARTICLE, articles)
+            archive_rows(Archive.COMMENT, comments)
+
+        Article.all_objects.filter(id__in=ids).delete()
+        ArticleVisits.objects.filter(id__in=[article['visits_id'] for article in articles if article['visits_id']]) \
+            .delete()
+        UserStats.objects.refresh({comment['author_id'] for comment in comments}, ['comments_count'])
+        return len(ids)
+
+
+def purge_comments(before, batch_size=500, archive=True):
+    """
+    Purge one batch of comments deleted before the datetime with their replies
+
+    @param before: deletion time cutoff
+    @param batch_size: max number of purged deleted comments, replies are not limited
+    @param archive: copy rows to Archive before delete
+    @return: number of purged deleted comments
+    """
+    with transaction.atomic():
+        ids = lock_batch(Comment.all_objects.deleted(before), batch_size)
+        if not ids:
+            return 0
+
+        roots = Comment.all_objects.filter(id__in=ids).values_list('article_id', 'path')
+        subtrees = reduce(or_, (Q(article=article_id, path=path) | Q(article=article_id, path__startswith=path + '/')
+                                for article_id, path in roots))
+        comments = list(Comment.all_objects.filter(subtrees).order_by('article', 'path')
+                        .values(*archived_fields(Comment)))
+        if archive:
+            archive_rows(Archive.COMMENT, comments)
+
+        Comment.all_objects.filter(id__in=[comment['id'] for comment in comments]).delete()
+        UserStats.objects.refresh({comment['author_id'] for comment in comments}, ['comments_count'])
+        return len(ids)
@@ -0,0 +1,198 @@
+"""
+Related articles
+
+Articles are scored against each other by tags Jaccard similarity and
+item-item cosine similarity of star ratings, shrunk by the number of
+common raters, weighted by RELATED_TAG_WEIGHT and RELATED_RATING_WEIGHT.
+Similarities are sparse products computed over inverted indexes (tag to
+articles, user to ratings), only articles sharing a tag or a rater are
+scored. Top RELATED_ARTICLES_COUNT neighbors of every posted article are
+stored in RelatedArticle.
+
+compute_related rebuilds the table in batches, refresh_related updates
+single articles after their tags or ratings changed and inserts them to
+neighbors lists, the lists are kept exact by the periodic rebuild.
+"""
+import heapq
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from pkg.articles.choices import Status
+from pkg.articles.models import Article, ArticleRating, ArticleTag, RelatedArticle, Tag
+
+# common raters number giving half of the rating similarity
+RATING_SHRINKAGE = 5
+# tags of more articles and users with more ratings say little about similarity and are skipped
+MAX_POSTINGS = 5000
+
+
+class SimilarityIndex:
+    """Sparse tags and ratings vectors of articles with inverted indexes"""
+
+    def __init__(self, tag_rows, rating_rows):
+        """
+        @param tag_rows: (article_id, tag_id) pairs
+        @param rating_rows: (article_id, user_id, star) triples
+        """
+        self.tags = defaultdict(set)
+        self.tag_postings = defaultdict(list)
+        for article_id, tag_id in tag_rows:
+            self.tags[article_id].add(tag_id)
+            self.tag_postings[tag_id].append(article_id)
+
+        self.ratings = defaultdict(dict)
+        self.user_postings = defaultdict(list)
+        for article_id, user_id, star in rating_rows:
+            self.ratings[article_id][user_id] = star
+            self.user_postings[user_id].append((article_id, star))
+        self.norms = {article_id: math.sqrt(sum(star * star for star in stars.values()))
+                      for article_id, stars in self.ratings.items()}
+
+    def tag_similarity(self, article_id):
+        """Jaccard similarity of tags with articles sharing a tag"""
+        tags = self.tags.get(article_id, ())
+        common = defaultdict(int)
+        for tag_id in tags:
+            for other_id in self.tag_postings[tag_id]:
+                common[other_id] += 1
+        return {other_id: count / (len(tags) + len(self.tags[other_id]) - count)
+                for other_id, count in common.items()}
+
+    def rating_similarity(self, article_id):
+        """Cosine similarity of star ratings with articles sharing a rater, shrunk by common raters"""
+        norm = self.norms.get(article_id)
+        if not norm:
+            return {}
+        dots, common = defaultdict(float), defaultdict(int)
+        for user_id, star in self.ratings[article_id].items():
+            postings = self.user_postings[user_id]
+            if len(postings) <= MAX_POSTINGS:
+                for other_id, other_star in postings:
+                    dots[other_id] += star * other_star
+                    common[other_id] += 1
+        return {other_id: dot / (norm * self.norms[other_id]) * common[other_id] / (common[other_id] + RATING_SHRINKAGE)
+                for other_id, dot in dots.items() if dot and self.norms[other_id]}
+
+    def scores(self, article_id):
+        """
+        Similarity of the article with all articles sharing a tag or a rater
+
+        @return: dict of (score, tag score, rating score) by article id
+        """
+        tag_scores = self.tag_similarity(article_id)
+        rating_scores = self.rating_similarity(article_id)
+        scores = {}
+        for other_id in tag_scores.keys() | rating_scores.keys():
+            if other_id == article_id:
+                continue
+            tag_score, rating_score = tag_scores.get(other_id, 0.0), rating_scores.get(other_id, 0.0)
+            score = settings.RELATED_TAG_WEIGHT * tag_score + settings.RELATED_RATING_WEIGHT * rating_score
+            if score > 0:
+                scores[other_id] = (score, tag_score, rating_score)
+        return scores
+
+    def neighbors(self, article_id, scores=None):
+        """Top RELATED_ARTICLES_COUNT neighbors as unsaved RelatedArticle, best first"""
+        scores = self.scores(article_id) if scores is None else scores
+        top = heapq.nlargest(settings.RELATED_ARTICLES_COUNT, scores.items(), key=lambda item: (item[1][0], -item[0]))
+        return [RelatedArticle(article_id=article_id, related_id=other_id, score=score,
+                               tag_score=tag_score, rating_score=rating_score)
+                for other_id, (score, tag_score, rating_score) in top]
+
+
+def selective_tags():
+    """Tags of at most MAX_POSTINGS posted articles by usage, used by full rebuild and single article refresh alike"""
+    return Tag.objects.filter(usage__lte=MAX_POSTINGS).values('id')
+
+
+def posted_tags(**filters):
+    return (ArticleTag.objects.filter(article__status=Status.POSTED, tag__in=selective_tags(), **filters)
+            .values_list('article_id', 'tag_id'))
+
+
+def posted_ratings(**filters):
+    return (ArticleRating.objects.filter(article__status=Status.POSTED, star__gt=0, **filters)
+            .values_list('article_id', 'user_id', 'star'))
+
+
+def compute_related(batch_size=1000):
+    """
+    Rebuild related articles of all posted articles
+
+    @param batch_size: articles written per transaction
+    @return: number of articles with neighbors
+    """
+    index = SimilarityIndex(posted_tags().iterator(), posted_ratings().iterator())
+    # articles without tags and ratings are written too, their old neighbors are deleted
+    article_ids = list(Article.objects.order_by('id').values_list('id', flat=True))
+    RelatedArticle.objects.exclude(article_id__in=Article.objects.values('id')).delete()
+
+    written = 0
+    for start in range(0, len(article_ids), batch_size):
+        batch = article_ids[start:start + batch_size]
+        rows = [row for article_id in batch for row in index.neighbors(article_id)]
+        with transaction.atomic():
+            RelatedArticle.objects.filter(article_id__in=batch).delete()
+            RelatedArticle.objects.bulk_create(rows, batch_size=1000)
+        written += len({row.article_id for row in rows})
+    return written
+
+
+def load_index(article_id):
+    """Index of the article and all articles sharing a tag or a rater with it"""
+    tag_ids = [tag_id for _, tag_id in posted_tags(article=article_id)]
+    user_ids = ArticleRating.objects.filter(article=article_id, star__gt=0).values('user_id')
+    candidates = ({article_id}
+                  | set(ArticleTag.objects.filter(tag__in=tag_ids).values_list('article_id', flat=True))
+                  | set(ArticleRating.objects.filter(user__in=user_ids).values_list('article_id', flat=True)))
+    return SimilarityIndex(posted_tags(article__in=candidates), posted_ratings(article__in=candidates))
+
+
+def refresh_related(article_id):
+    """
+    Recompute neighbors of the article and update its place in neighbors lists of other articles,
+    article which is not posted is removed from all lists
+
+    @param article_id: Article id
+    """
+    limit = settings.RELATED_ARTICLES_COUNT
+    posted = Article.objects.filter(id=article_id).exists()
+    scores = {}
+    if posted:
+        index = load_index(article_id)
+        scores = index.scores(article_id)
+
+    with transaction.atomic():
+        RelatedArticle.objects.filter(article_id=article_id).delete()
+        RelatedArticle.objects.filter(related_id=article_id).delete()
+        if not posted:
+            return
+        RelatedArticle.objects.bulk_create(index.neighbors(article_id, scores))
+
+        # similarity is symmetric, the article is added to lists where it beats the last neighbor
+        lists = dict(RelatedArticle.objects.filter(article_id__in=scores).values('article_id')
+                     .annotate(count=Count('id')).values_list('article_id', 'count'))
+        lowest = {}
+        for other_id, score in RelatedArticle.objects.filter(article_id__in=[
+                other_id for other_id, count in lists.items() if count >= limit]).values_list('article_id', 'score'):
+            lowest[other_id] = min(score, lowest.get(other_id, score))
+        added = [RelatedArticle(article_id=other_id, related_id=article_id, score=score,
+                                tag_score=tag_score, rating_score=rating_score)
+                 for other_id, (score, tag_score, rating_score) in scores.items()
+                 if lists.get(other_id, 0) < limit or score > lowest[other_id]]
+        RelatedArticle.objects.bulk_create(added, batch_size=1000)
+
+        # lists which were full drop their last neighbor
+        overflow = {row.article_id for row in added if lists.get(row.article_id, 0) >= limit}
+        excess = []
+        rows = defaultdict(list)
+        for row_id, other_id, score in RelatedArticle.objects.filter(article_id__in=overflow).values_list(
+                'id', 'article_id', 'score'):
+            rows[other_id].append((score, row_id))
+        for neighbors in rows.values():
+            excess.extend(row_id for _, row_id in sorted(neighbors, reverse=True)[limit:])
+        RelatedArticle.objects.filter(id__in=excess).delete()
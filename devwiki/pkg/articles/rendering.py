@@ -0,0 +1,80 @@
+"""
+Article body render pipeline
+
+Markdown body is rendered to sanitized HTML, plain text excerpt and reading
+time once on write. Rendered fields are stored with hash of the body, so
+saving unchanged body does not render it again.
+"""
+import hashlib
+import html
+import math
+import re
+
+import bleach
+import markdown
+
+MARKDOWN_EXTENSIONS = ['extra', 'sane_lists']
+
+ALLOWED_TAGS = list(bleach.sanitizer.ALLOWED_TAGS) + [
+    'p', 'br', 'hr', 'pre', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'img', 'del',
+    'table', 'thead', 'tbody', 'tr', 'th', 'td', 'dl', 'dt', 'dd', 'sup', 'sub',
+]
+ALLOWED_ATTRIBUTES = {
+    **bleach.sanitizer.ALLOWED_ATTRIBUTES,
+    'a': ['href', 'title', 'rel'],
+    'img': ['src', 'alt', 'title'],
+    'th': ['align'],
+    'td': ['align'],
+}
+ALLOWED_PROTOCOLS = ['http', 'https', 'mailto']
+
+RENDERED_FIELDS = ['body_html', 'excerpt', 'reading_time', 'body_hash']
+LIST_DEFERRED_FIELDS = ['body', 'body_html', 'search_vector']
+
+EXCERPT_LENGTH = 300
+WORDS_PER_MINUTE = 200
+
+_whitespace = re.compile(r'\s+')
+
+
+def body_hash(body):
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def render_html(body):
+    """Render Markdown body to HTML without scripts, styles and unsafe links"""
+    rendered = markdown.markdown(body, extensions=MARKDOWN_EXTENSIONS, output_format='html5')
+    return bleach.clean(rendered, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES,
+                        protocols=ALLOWED_PROTOCOLS, strip=True)
+
+
+def plain_text(body_html):
+    text = bleach.clean(body_html, tags=[], strip=True)
+    return _whitespace.sub(' ', html.unescape(text)).strip()
+
+
+def make_excerpt(text, length=EXCERPT_LENGTH):
+    """Cut text on word boundary"""
+    if len(text) <= length:
+        return text
+    return text[:length].rsplit(' ', 1)[0].rstrip('.,;:!?-') + '…'
+
+
+def render_article(article, force=False):
+    """
+    Render article body to rendered fields if body changed
+
+    @param article: Article, not saved
+    @param force: render even if body hash did not change
+    @return: True if rendered fields changed
+    """
+    digest = body_hash(article.body or '')
+    if digest == article.body_hash and not force:
+        return False
+
+    article.body_html = render_html(article.body or '')
+    text = plain_text(article.body_html)
+    article.excerpt = make_excerpt(text)
+    article.reading_time = max(1, math.ceil(len(text.split()) / WORDS_PER_MINUTE))
+    article.body_hash = digest
+    return True
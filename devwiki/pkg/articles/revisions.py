@@ -0,0 +1,154 @@
+"""
+Article revisions stored as reverse deltas
+
+The latest revision of an article always keeps the full body. When a new
+revision is recorded, previous latest revision is replaced by a line delta
+which rebuilds it from the new body, except every ARTICLE_REVISION_SNAPSHOT_INTERVAL
+revision which stays a full snapshot. Any revision is rebuilt from the nearest
+snapshot after it by applying at most interval - 1 deltas, loaded by one query.
+
+Delta is JSON list of operations on lines of the newer body:
+[start, end] copies lines start:end, list of strings inserts the lines.
+"""
+import difflib
+import json
+
+from django.conf import settings
+from django.db import transaction
+
+from pkg.articles.models import Article, ArticleRevision
+
+
+def make_delta(base, target):
+    """
+    Build delta rebuilding target text from base text
+
+    @param base: newer body
+    @param target: older body
+    @return: JSON delta
+    """
+    base_lines, target_lines = base.splitlines(keepends=True), target.splitlines(keepends=True)
+    operations = []
+    matcher = difflib.SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            operations.append([i1, i2])
+        elif tag in ('replace', 'insert'):
+            operations.append([''.join(target_lines[j1:j2])])
+    return json.dumps(operations, separators=(',', ':'))
+
+
+def apply_delta(base, delta):
+    """Rebuild older body from newer body and delta"""
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for operation in json.loads(delta):
+        if len(operation) == 2:
+            parts.extend(base_lines[operation[0]:operation[1]])
+        else:
+            parts.append(operation[0])
+    return ''.join(parts)
+
+
+def is_checkpoint(number, interval=None):
+    return number % (interval or settings.ARTICLE_REVISION_SNAPSHOT_INTERVAL) == 0
+
+
+def record_revision(article, author=None, previous=None):
+    """
+    Record current title and body of article as new revision
+
+    @param article: saved Article
+    @param author: user who made the change
+    @param previous: (title, body) before the change, recorded first for article without revisions
+    @return: new or unchanged latest revision
+    """
+    with transaction.atomic():
+        Article.all_objects.select_for_update().filter(id=article.id).values_list('id').first()
+        head = article.revisions.order_by('-number').first()
+        if head is None and previous is not None and previous != (article.title, article.body):
+            head = ArticleRevision.objects.create(article=article, number=1, title=previous[0],
+                                                  data=previous[1], is_snapshot=True)
+        if head is not None and (head.title, head.data) == (article.title, article.body):
+            return head
+
+        if head is not None and not is_checkpoint(head.number):
+            head.data = make_delta(article.body, head.data)
+            head.is_snapshot = False
+            head.save(update_fields=['data', 'is_snapshot'])
+        return ArticleRevision.objects.create(article=article, number=head.number + 1 if head else 1,
+                                              title=article.title, author=author,
+                                              data=article.body, is_snapshot=True)
+
+
+def rebuild(chain):
+    """
+    Rebuild body of the first revision of chain
+
+    @param chain: revisions from requested one up to the snapshot, in ascending order
+    @return: body text
+    """
+    body = chain[-1].data
+    for revision in reversed(chain[:-1]):
+        body = apply_delta(body, revision.data)
+    return body
+
+
+def get_revision(article, number):
+    """
+    Get revision with rebuilt body
+
+    @param article: Article
+    @param number: revision number
+    @return: ArticleRevision with body attribute or None
+    """
+    revisions = list(article.revisions.select_related('author').filter(number__gte=number)
+                     .order_by('number')[:settings.ARTICLE_REVISION_SNAPSHOT_INTERVAL])
+    if not revisions or revisions[0].number != number:
+        return None
+
+    for position, revision in enumerate(revisions):
+        if revision.is_snapshot:
+            revisions[0].body = rebuild(revisions[:position + 1])
+            return revisions[0]
+    raise ValueError(f'Revision {number} of article {article.id} has no snapshot in chain, run compact_revisions')
+
+
+def compact(article_id, interval=None):
+    """
+    Rebuild revisions chain of article, every interval revision and the latest
+    one become snapshots, the others become deltas
+
+    @param article_id: Article id
+    @param interval: snapshot interval, ARTICLE_REVISION_SNAPSHOT_INTERVAL if None
+    @return: number of rewritten revisions
+    """
+    with transaction.atomic():
+        Article.all_objects.select_for_update().filter(id=article_id).values_list('id').first()
+        revisions = list(ArticleRevision.objects.filter(article_id=article_id).order_by('number'))
+        if not revisions:
+            return 0
+
+        bodies, start = [None] * len(revisions), 0
+        for position, revision in enumerate(revisions):
+            if revision.is_snapshot:
+                body = bodies[position] = revision.data
+                for previous in range(position - 1, start - 1, -1):
+                    body = bodies[previous] = apply_delta(body, revisions[previous].data)
+                start = position + 1
+        chain = revisions[start:]
+        if chain:
+            raise ValueError(f'Latest revision of article {article_id} is not a snapshot')
+
+        changed = []
+        for position, revision in enumerate(revisions):
+            latest = position == len(revisions) - 1
+            if latest or is_checkpoint(revision.number, interval):
+                data, is_snapshot = bodies[position], True
+            else:
+                data, is_snapshot = make_delta(bodies[position + 1], bodies[position]), False
+            if (revision.data, revision.is_snapshot) != (data, is_snapshot):
+                revision.data, revision.is_snapshot = data, is_snapshot
+                changed.append(revision)
+        ArticleRevision.objects.bulk_update(changed, ['data', 'is_snapshot'])
+        return len(changed)
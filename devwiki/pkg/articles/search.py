@@ -0,0 +1,133 @@
+"""
+Articles full-text search
+
+On Postgres articles are indexed in tsvector column with GIN index, title,
+tags and body are weighted as A, B and C. On other databases the
+ArticleSearchTerm inverted index with the same weights is used. Snippets
+of both are cut from plain text of rendered body by highlight.
+"""
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils.html import escape
+
+from pkg.articles.choices import Status
+from pkg.articles.models import Article, ArticleSearchTerm, ArticleTag
+
+WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2}
+
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_STOP = '</mark>'
+SNIPPET_WORDS = 30
+
+TERM_RE = re.compile(r'\w+')
+
+
+def is_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def tokenize(text):
+    """Split text to lowercase search terms"""
+    return [term[:64] for term in TERM_RE.findall(text.lower()) if len(term) > 1]
+
+
+def index_article(article):
+    """
+    Update search index of the article, not posted articles are removed from index
+
+    @param article: Article instance
+    """
+    index_articles([article])
+
+
+def index_articles(articles):
+    """
+    Update search index of articles with constant number of queries, not posted articles are removed from index
+
+    @param articles: Article instances
+    """
+    posted = [article for article in articles if article.status == Status.POSTED]
+    removed = [article.id for article in articles if article.status != Status.POSTED]
+
+    if is_postgres():
+        tags = (ArticleTag.objects.filter(article=OuterRef('pk')).order_by().values('article')
+                .annotate(names=StringAgg('tag__name', ' ')).values('names'))
+        Article.all_objects.filter(id__in=[article.id for article in posted]).update(
+            search_vector=(SearchVector('title', weight='A', config=settings.SEARCH_CONFIG)
+                           + SearchVector(Coalesce(Subquery(tags), Value('')), weight='B',
+                                          config=settings.SEARCH_CONFIG)
+                           + SearchVector('body', weight='C', config=settings.SEARCH_CONFIG)))
+        if removed:
+            Article.all_objects.filter(id__in=removed).update(search_vector=None)
+        return
+
+    tags = defaultdict(list)
+    for article_id, name in ArticleTag.objects.filter(article__in=posted).values_list('article_id', 'tag__name'):
+        tags[article_id].append(name)
+    terms = []
+    for article in posted:
+        scores = Counter()
+        for weight, text in (('A', article.title), ('B', ' '.join(tags[article.id])), ('C', article.body)):
+            for term in tokenize(text):
+                scores[term] += WEIGHTS[weight]
+        terms.extend(ArticleSearchTerm(term=term, article_id=article.id, score=score)
+                     for term, score in scores.items())
+
+    with transaction.atomic():
+        ArticleSearchTerm.objects.filter(article__in=[article.id for article in articles]).delete()
+        ArticleSearchTerm.objects.bulk_create(terms, batch_size=1000)
+
+
+def search_articles(queryset, query):
+    """
+    Filter and rank articles by search query
+
+    @param queryset: articles queryset
+    @param query: search query
+    @return: articles ordered by rank
+    """
+    queryset = queryset.filter(status=Status.POSTED)
+
+    if is_postgres():
+        search_query = SearchQuery(query, search_type='websearch', config=settings.SEARCH_CONFIG)
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query),
+        ).order_by('-rank', '-id')
+
+    terms = set(tokenize(query))
+    if not terms:
+        return queryset.none()
+    return queryset.filter(search_terms__term__in=terms).annotate(
+        rank=Sum('search_terms__score'),
+        matched_terms=Count('search_terms'),
+    ).filter(matched_terms=len(terms)).order_by('-rank', '-id')
+
+
+def highlight(text, query, words=SNIPPET_WORDS):
+    """
+    Build escaped snippet of text around the first query term match
+
+    @param text: plain text to highlight, e.g. of rendered body
+    @param query: search query
+    @param words: snippet length in words
+    @return: snippet with matched terms wrapped in HIGHLIGHT_START/HIGHLIGHT_STOP
+    """
+    terms = set(tokenize(query))
+    tokens = text.split()
+    start = next((i for i, token in enumerate(tokens) if terms.intersection(tokenize(token))), 0)
+    start = max(start - words // 3, 0)
+
+    snippet = []
+    for token in tokens[start:start + words]:
+        token = escape(token)
+        if terms.intersection(tokenize(token)):
+            token = f'{HIGHLIGHT_START}{token}{HIGHLIGHT_STOP}'
+        snippet.append(token)
+    return ' '.join(snippet)
@@ -0,0 +1,25 @@
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from pkg.articles.jobs import refresh_related, refresh_tags_usage
+from pkg.articles.models import Article
+from pkg.jobs.queue import enqueue
+
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Refresh tags usage and related articles by jobs on article tags add, remove and clear"""
+    if action == 'pre_clear':
+        instance._cleared = ((list(instance.tags.values_list('id', flat=True)), [instance.id]) if not reverse
+                             else ([instance.id], list(instance.article_set.values_list('id', flat=True))))
+        return
+    if action == 'post_clear':
+        tag_ids, article_ids = instance.__dict__.pop('_cleared', ([], []))
+    elif action in ('post_add', 'post_remove') and pk_set:
+        tag_ids, article_ids = (list(pk_set), [instance.id]) if not reverse else ([instance.id], list(pk_set))
+    else:
+        return
+    if tag_ids:
+        enqueue(refresh_tags_usage, tag_ids)
+    if article_ids:
+        enqueue(refresh_related, article_ids)
@@ -0,0 +1,346 @@
+"""
+Streaming NDJSON import and export of articles
+
+Every line is one article with its tags, visits and comments. Rows are
+processed in batches with bulk queries, one transaction per batch, so
+memory use does not depend on file size. Rows with fields of invalid types
+are rejected before the batch. Batch failing on unique title or slug is
+retried row by row, rows which still fail are counted as errors.
+"""
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Prefetch
+from django.utils.dateparse import parse_datetime
+
+from pkg.articles.caching import bump_version
+from pkg.articles.choices import Status
+from pkg.articles.models import Article, ArticleTag, ArticleVisits, Comment, Tag, track_deletion
+from pkg.articles.popularity import PUBLISH_WEIGHT, event_score
+from pkg.articles.rendering import RENDERED_FIELDS, render_article
+from pkg.articles.search import index_articles
+from pkg.users.models import UserStats
+
+
+# rejected lines listed in import statistics
+MAX_ERROR_LINES = 100
+
+
+class TransferStats:
+    """Counters and throughput of import or export"""
+
+    def __init__(self):
+        self.articles = 0
+        self.comments = 0
+        self.errors = 0
+        self.error_lines = []
+        self.started = time.monotonic()
+
+    def add_error(self, line_number, reason):
+        """Count rejected line, first MAX_ERROR_LINES are kept with the reason"""
+        self.errors += 1
+        if len(self.error_lines) < MAX_ERROR_LINES:
+            self.error_lines.append({'line': line_number, 'error': reason})
+
+    def as_dict(self):
+        seconds = time.monotonic() - self.started
+        return {
+            'articles': self.articles,
+            'comments': self.comments,
+            'errors': self.errors,
+            'error_lines': self.error_lines,
+            'seconds': round(seconds, 3),
+            'articles_per_second': round(self.articles / seconds, 1) if seconds else 0,
+        }
+
+
+def serialize_article(article):
+    """Build NDJSON row of article with prefetched tags and comments"""
+    return {
+        'title': article.title,
+        'slug': article.slug,
+        'body': article.body,
+        'status': article.status,
+        'author': article.author.email,
+        'created_at': article.created_at,
+        'visits': article.visits.number if article.visits else 0,
+        'tags': [tag.name for tag in article.tags.all()],
+        'comments': [{
+            'id': comment.id,
+            'parent': comment.parent_id,
+            'author': comment.author.email,
+            'content': comment.content,
+            'status': comment.status,
+        } for comment in article.comments.all()],
+    }
+
+
+def export_articles(batch_size=500, stats=None):
+    """
+    Generate NDJSON lines of all articles, articles are loaded by id keyset batches
+
+    @param batch_size: number of articles loaded by one query
+    @param stats: TransferStats to count exported rows
+    @return: generator of lines
+    """
+    comments = Comment.all_objects.select_related('author').order_by('path')
+    articles = Article.all_objects.select_related('author', 'visits').prefetch_related(
+        'tags', Prefetch('comments', queryset=comments)).order_by('id')
+
+    last_id = 0
+    while True:
+        batch = list(articles.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        for article in batch:
+            if stats is not None:
+                stats.articles += 1
+                stats.comments += len(article.comments.all())
+            yield json.dumps(serialize_article(article), cls=DjangoJSONEncoder) + '\n'
+        last_id = batch[-1].id
+
+
+def import_articles(lines, default_author, batch_size=500, stats=None):
+    """
+    Import NDJSON lines, existing articles are matched by title and updated,
+    their tags and comments are replaced by the ones of the row
+
+    @param lines: iterable of str or bytes lines
+    @param default_author: author of rows with unknown author email
+    @param batch_size: number of rows imported in one transaction
+    @param stats: TransferStats to count imported rows
+    @return: TransferStats
+    """
+    stats = stats or TransferStats()
+    batch = []
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+            validate_row(row)
+        except ValueError as error:
+            stats.add_error(line_number, str(error) or 'invalid row')
+            continue
+
+        batch.append((line_number, row))
+        if len(batch) == batch_size:
+            import_batch(batch, default_author, stats)
+            batch = []
+    if batch:
+        import_batch(batch, default_author, stats)
+    return stats
+
+
+def check_type(row, field, types, required=False, nullable=False):
+    """
+    Check type of row field, booleans are not accepted as numbers
+
+    @raise ValueError: field has other type
+    """
+    if field not in row:
+        if required:
+            raise ValueError(f'{field} is required')
+        return
+    value = row[field]
+    if value is None and nullable:
+        return
+    if not isinstance(value, types) or isinstance(value, bool):
+        raise ValueError(f'{field} has invalid type')
+
+
+def validate_row(row):
+    """
+    Check types and values of NDJSON row fields before import
+
+    @param row: decoded JSON line
+    @raise ValueError: describing the first invalid field
+    """
+    if not isinstance(row, dict):
+        raise ValueError('row is not an object')
+    for field in ('title', 'body'):
+        check_type(row, field, str, required=True)
+        if not row[field].strip():
+            raise ValueError(f'{field} is empty')
+    if len(row['title']) > Article._meta.get_field('title').max_length:
+        raise ValueError('title is too long')
+    for field in ('slug', 'author', 'created_at'):
+        check_type(row, field, str, nullable=True)
+    if row.get('created_at') and parse_datetime(row['created_at']) is None:
+        raise ValueError('created_at is not a datetime')
+    check_type(row, 'visits', int)
+    if row.get('visits', 0) < 0:
+        raise ValueError('visits is negative')
+    check_type(row, 'status', int)
+    if row.get('status', Status.POSTED) not in Status.values:
+        raise ValueError('status is invalid')
+
+    check_type(row, 'tags', list)
+    max_length = Tag._meta.get_field('name').max_length
+    if not all(isinstance(name, str) and 0 < len(name) <= max_length for name in row.get('tags', [])):
+        raise ValueError('tags has invalid name')
+
+    check_type(row, 'comments', list)
+    for comment in row.get('comments', []):
+        if not isinstance(comment, dict):
+            raise ValueError('comments has invalid comment')
+        check_type(comment, 'content', str)
+        check_type(comment, 'author', str, nullable=True)
+        check_type(comment, 'id', (int, str), nullable=True)
+        check_type(comment, 'parent', (int, str), nullable=True)
+        check_type(comment, 'status', int)
+        if comment.get('status', Status.POSTED) not in Status.values:
+            raise ValueError('comments has invalid status')
+
+
+def insert(model, objects):
+    """Bulk insert objects, row by row on databases not returning ids from bulk insert"""
+    if connection.features.can_return_rows_from_bulk_insert:
+        return model.objects.bulk_create(objects)
+    for instance in objects:
+        instance.save(force_insert=True)
+    return objects
+
+
+def import_batch(rows, default_author, stats):
+    """
+    Import batch of rows in one transaction, rows of failed batch are imported one by one
+
+    @param rows: (line number, row) pairs
+    """
+    try:
+        articles, comments = write_batch([row for _, row in rows], default_author)
+    except DatabaseError:
+        # rows repeat a title or a slug of each other or of existing articles
+        articles = comments = 0
+        for line_number, row in rows:
+            try:
+                imported = write_batch([row], default_author)
+            except DatabaseError as error:
+                stats.add_error(line_number, str(error))
+                continue
+            articles += imported[0]
+            comments += imported[1]
+    bump_version()
+    stats.articles += articles
+    stats.comments += comments
+
+
+@transaction.atomic
+def write_batch(rows, default_author):
+    """
+    Write batch of rows with constant number of bulk queries
+
+    @return: number of imported articles and comments
+    """
+    emails = {row.get('author') for row in rows}
+    emails.update(comment.get('author') for row in rows for comment in row.get('comments', []))
+    authors = {user.email: user for user in get_user_model().objects.filter(email__in=emails)}
+
+    existing = {article.title: article for article in
+                Article.all_objects.filter(title__in=[row['title'] for row in rows]).select_related('visits')}
+    created, updated = [], []
+    for row in rows:
+        article = existing.get(row['title'])
+        if article is None:
+            article = Article(title=row['title'],
+                              slug=row.get('slug') or None,
+                              author=authors.get(row.get('author'), default_author),
+                              popularity=event_score(PUBLISH_WEIGHT))
+            article.visits = ArticleVisits(number=row.get('visits', 1))
+            created.append((article, row))
+        else:
+            updated.append((article, row))
+        article.body = row['body']
+        article.status = row.get('status', Status.POSTED)
+        track_deletion(article, {})
+        render_article(article)
+
+    insert(ArticleVisits, [article.visits for article, _ in created])
+    for article, _ in created:
+        article.visits_id = article.visits.id
+    insert(Article, [article for article, _ in created])
+    Article.all_objects.bulk_update([article for article, _ in updated],
+                                    ['body', 'status', 'deleted_at', *RENDERED_FIELDS])
+
+    visits = []
+    for article, row in updated:
+        if article.visits and 'visits' in row:
+            article.visits.number = row['visits']
+            visits.append(article.visits)
+    ArticleVisits.objects.bulk_update(visits, ['number'])
+
+    restored = []
+    for article, row in created:
+        if row.get('created_at'):
+            article.created_at = parse_datetime(row['created_at'])
+            restored.append(article)
+    Article.all_objects.bulk_update(restored, ['created_at'])
+
+    import_tags(created + updated, authors, default_author)
+    replaced = Comment.all_objects.filter(article__in=[article for article, row in updated if 'comments' in row])
+    user_ids = set(replaced.values_list('author_id', flat=True))
+    replaced.delete()
+    comments = import_comments(created + updated, authors, default_author)
+
+    index_articles([article for article, _ in created + updated])
+    UserStats.objects.refresh(user_ids | {default_author.id, *(user.id for user in authors.values())})
+    return len(rows), comments
+
+
+def import_tags(articles, authors, default_author):
+    """Replace tags of imported articles with one batched write to through table"""
+    tag_authors = {}
+    for article, row in articles:
+        for name in row.get('tags', []):
+            tag_authors.setdefault(name, authors.get(row.get('author'), default_author))
+    tags = {tag.name: tag for tag in Tag.objects.resolve(list(tag_authors), tag_authors)}
+
+    replaced = ArticleTag.objects.filter(article__in=[article for article, row in articles if 'tags' in row])
+    tag_ids = set(replaced.values_list('tag_id', flat=True))
+    replaced.delete()
+    ArticleTag.objects.bulk_create([
+        ArticleTag(article_id=article.id, tag_id=tags[name].id)
+        for article, row in articles for name in set(row.get('tags', [])) if name in tags
+    ], ignore_conflicts=True)
+    Tag.objects.refresh_usage(tag_ids | {tag.id for tag in tags.values()})
+
+
+def import_comments(articles, authors, default_author):
+    """
+    Create comments of imported articles level by level, parents go before replies
+
+    @param articles: (article, row) pairs
+    @return: number of created comments
+    """
+    comments = {}
+    level = [(article, row) for article, article_row in articles
+             for row in article_row.get('comments', []) if not row.get('parent')]
+    while level:
+        objects = []
+        for article, row in level:
+            # comment ids of rows are unique within an article
+            parent = comments.get((article.id, row.get('parent')))
+            comment = Comment(article=article,
+                              parent=parent,
+                              author=authors.get(row.get('author'), default_author),
+                              content=row.get('content', ''),
+                              status=row.get('status', Status.POSTED))
+            track_deletion(comment, {})
+            comments[(article.id, row.get('id'))] = comment
+            objects.append(comment)
+        insert(Comment, objects)
+
+        for comment in objects:
+            comment.path = comment.build_path(comment.parent.path if comment.parent else '')
+            comment.depth = comment.path.count('/')
+        Comment.all_objects.bulk_update(objects, ['path', 'depth'])
+
+        parent_ids = {(article.id, row.get('id')) for article, row in level}
+        level = [(article, row) for article, article_row in articles
+                 for row in article_row.get('comments', []) if (article.id, row.get('parent')) in parent_ids]
+    return len(comments)
@@ -0,0 +1,138 @@
+"""
+Article visits counter
+
+In strict mode every read is counted with a single atomic UPDATE.
+In buffered mode increments are collected in the shared cache and applied
+to database by one batched UPDATE when the worker counted
+VISITS_FLUSH_THRESHOLD visits or VISITS_FLUSH_INTERVAL seconds passed.
+The flush runs as job, the request only queues ids of counted articles.
+Increments left by idle or restarted workers are applied by flush_visits
+command, scheduled by uwsgi cron in configs/uwsgi/uwsgi.ini.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, F, IntegerField, Value, When
+
+from pkg.articles.models import Article, ArticleVisits
+from pkg.articles.popularity import VISIT_WEIGHT, add_activity
+from pkg.jobs.queue import enqueue, job
+from pkg.users.models import UserStats
+
+STRICT = 'strict'
+BUFFERED = 'buffered'
+
+TOTAL_TIMEOUT = 60 * 60
+
+_lock = threading.Lock()
+_dirty = set()
+_counted = 0
+_flushed_at = time.monotonic()
+
+
+def _pending_key(visits_id):
+    return f'visits:pending:{visits_id}'
+
+
+def _total_key(visits_id):
+    return f'visits:total:{visits_id}'
+
+
+def _incr(key, delta=1, default=0, timeout=None):
+    """Atomic increment of cache key, key is created if missing"""
+    cache.add(key, default, timeout=timeout)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, default + delta, timeout=timeout)
+        return default + delta
+
+
+def record_visit(article, current=True):
+    """
+    Count article visit and add it to article popularity
+
+    @param article: Article instance with visits
+    @param current: visits number of article was read by this request, stale number is reloaded when needed
+    @return: near real-time visits number
+    """
+    visits = article.visits
+    if settings.VISITS_COUNTER_MODE != BUFFERED:
+        ArticleVisits.objects.filter(id=visits.id).update(number=F('number') + 1)
+        add_activity({article.id: VISIT_WEIGHT})
+        UserStats.objects.add_visits({article.author_id: 1})
+        if not current:
+            return ArticleVisits.objects.values_list('number', flat=True).get(id=visits.id)
+        return visits.number + 1
+
+    global _counted
+    pending = _incr(_pending_key(visits.id))
+    if not current and cache.get(_total_key(visits.id)) is None:
+        visits.number = ArticleVisits.objects.values_list('number', flat=True).get(id=visits.id)
+    if cache.add(_total_key(visits.id), visits.number + pending, timeout=TOTAL_TIMEOUT):
+        number = visits.number + pending
+    else:
+        number = _incr(_total_key(visits.id), default=visits.number + pending - 1, timeout=TOTAL_TIMEOUT)
+
+    with _lock:
+        _dirty.add(visits.id)
+        _counted += 1
+        flush_due = (_counted >= settings.VISITS_FLUSH_THRESHOLD
+                     or time.monotonic() - _flushed_at >= settings.VISITS_FLUSH_INTERVAL)
+    if flush_due:
+        visits_ids = take_dirty()
+        if visits_ids:
+            enqueue(flush_visits, sorted(visits_ids))
+    return number
+
+
+def take_dirty():
+    """Ids of ArticleVisits counted by this worker since last flush, counters are reset"""
+    global _counted, _flushed_at
+    with _lock:
+        visits_ids = set(_dirty)
+        _dirty.clear()
+        _counted = 0
+        _flushed_at = time.monotonic()
+    return visits_ids
+
+
+@job
+def flush_visits(visits_ids=None):
+    """
+    Apply buffered visits to database with one batched UPDATE
+
+    @param visits_ids: ArticleVisits ids to flush, ids counted by this worker if None
+    @return: dict of flushed increments by ArticleVisits id
+    """
+    if visits_ids is None:
+        visits_ids = take_dirty()
+
+    keys = {_pending_key(visits_id): visits_id for visits_id in visits_ids}
+    increments = {}
+    for key, value in cache.get_many(keys).items():
+        if value:
+            cache.decr(key, value)
+            increments[keys[key]] = value
+    if not increments:
+        return increments
+
+    try:
+        ArticleVisits.objects.filter(id__in=increments).update(number=F('number') + Case(
+            *[When(id=visits_id, then=Value(value)) for visits_id, value in increments.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+    except Exception:
+        for visits_id, value in increments.items():
+            _incr(_pending_key(visits_id), value)
+        raise
+
+    add_activity({visits_id: value * VISIT_WEIGHT for visits_id, value in increments.items()}, field='visits_id')
+    received = {}
+    for visits_id, author_id in Article.all_objects.filter(visits_id__in=increments).values_list('visits_id', 'author_id'):
+        received[author_id] = received.get(author_id, 0) + increments[visits_id]
+    UserStats.objects.add_visits(received)
+    return increments
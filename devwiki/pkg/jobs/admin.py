@@ -0,0 +1,12 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'state', 'attempts', 'run_at', 'finished_at']
+    list_filter = ['state', 'name']
+    readonly_fields = ['locked_by', 'locked_until', 'created_at', 'started_at', 'finished_at', 'last_error']
+
+
+admin.site.register(Job, JobAdmin)
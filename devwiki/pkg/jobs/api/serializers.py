@@ -0,0 +1,9 @@
+from rest_framework import serializers
+
+from pkg.jobs.models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = '__all__'
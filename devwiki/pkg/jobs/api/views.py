@@ -0,0 +1,31 @@
+from rest_framework import permissions, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .serializers import JobSerializer
+from pkg.jobs.models import Job
+from pkg.profiling import QueryBudgetMixin
+
+
+class JobViewSet(QueryBudgetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Inspect queued, running and failed jobs
+    """
+    queryset = Job.objects.order_by('-id')
+    serializer_class = JobSerializer
+    permission_classes = [permissions.IsAdminUser]
+    filterset_fields = ['state', 'name']
+    query_budgets = {
+        'list': 2,
+        'retrieve': 1,
+        'stats': 3,
+    }
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """
+        Endpoint to get queue depth and latency
+
+        @return: jobs number by state, due jobs and age of the oldest one, wait and run time of recent jobs
+        """
+        return Response(Job.objects.metrics())
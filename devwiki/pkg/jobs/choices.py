@@ -0,0 +1,8 @@
+from django.db import models
+
+
+class JobState(models.IntegerChoices):
+    QUEUED = 1
+    RUNNING = 2
+    DONE = 3
+    FAILED = 4
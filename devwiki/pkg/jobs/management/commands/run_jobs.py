@@ -0,0 +1,23 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from pkg.jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = 'Run queued jobs on thread pool until stopped by SIGTERM or SIGINT'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, help='Threads running jobs, JOBS_CONCURRENCY by default')
+        parser.add_argument('--poll-interval', type=float, help='Seconds between polls of idle worker')
+        parser.add_argument('--burst', action='store_true', help='Exit when there are no due jobs')
+
+    def handle(self, *args, **options):
+        worker = Worker(concurrency=options['concurrency'], poll_interval=options['poll_interval'])
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: worker.stop())
+
+        self.stdout.write(f'Worker {worker.name} started with {worker.concurrency} threads')
+        worker.run(burst=options['burst'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {worker.processed} jobs, {worker.failed} failed'))
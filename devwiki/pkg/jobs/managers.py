@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.db import connections, models, transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min, Subquery
+from django.utils import timezone
+
+from pkg.jobs.choices import JobState
+
+
+class JobQuerySet(models.QuerySet):
+
+    def due(self, now=None):
+        """Queued jobs which may run now, oldest first"""
+        return self.filter(state=JobState.QUEUED, run_at__lte=now or timezone.now()).order_by('run_at', 'id')
+
+    def claim(self, worker, limit, lease):
+        """
+        Lock due jobs for the worker
+
+        On databases with SKIP LOCKED due rows are locked by SELECT ... FOR UPDATE
+        SKIP LOCKED, so concurrent workers claim disjoint batches without waiting.
+        SQLite locks the whole database on write, there jobs are claimed by single
+        UPDATE of the due jobs subquery, which waits for other writers instead of
+        failing on lock upgrade of SELECT and UPDATE transaction.
+
+        @param worker: worker name stored in locked_by
+        @param limit: max number of jobs
+        @param lease: timedelta, running job is requeued if not finished within lease
+        @return: list of claimed jobs
+        """
+        now = timezone.now()
+        claim = dict(state=JobState.RUNNING, locked_by=worker, locked_until=now + lease,
+                     started_at=now, attempts=F('attempts') + 1)
+        due = self.due(now).values('id')[:limit]
+        if not connections[self.db].features.has_select_for_update_skip_locked:
+            self.filter(id__in=Subquery(due)).update(**claim)
+            return list(self.filter(state=JobState.RUNNING, locked_by=worker, started_at=now).order_by('run_at', 'id'))
+
+        with transaction.atomic(using=self.db):
+            ids = [row['id'] for row in due.select_for_update(skip_locked=True)]
+            if not ids:
+                return []
+            self.filter(id__in=ids).update(**claim)
+        return list(self.filter(id__in=ids).order_by('run_at', 'id'))
+
+    def requeue_expired(self):
+        """
+        Release jobs of workers which died or overran the lease, jobs without attempts left fail
+
+        @return: number of released jobs
+        """
+        now = timezone.now()
+        expired = self.filter(state=JobState.RUNNING, locked_until__lt=now)
+        failed = expired.filter(attempts__gte=F('max_attempts')).update(
+            state=JobState.FAILED, finished_at=now, locked_until=None, last_error='Lease expired')
+        return failed + expired.update(state=JobState.QUEUED, run_at=now, locked_by='', locked_until=None)
+
+    def purge(self, before):
+        """
+        Delete jobs done before the datetime, failed jobs are kept for inspection
+
+        @return: number of deleted jobs
+        """
+        return self.filter(state=JobState.DONE, finished_at__lt=before).delete()[0]
+
+    def metrics(self, window=timedelta(minutes=15)):
+        """
+        Queue depth and latency
+
+        @param window: period of finished jobs latency is measured on
+        @return: jobs number by state, due jobs number and age of the oldest one in seconds,
+            average and max wait from run_at to start and run time in seconds of jobs done within window
+        """
+        now = timezone.now()
+        depth = dict(self.order_by().values_list('state').annotate(Count('id')))
+        due = self.due(now).aggregate(count=Count('id'), oldest=Min('run_at'))
+        done = self.filter(state=JobState.DONE, finished_at__gte=now - window).annotate(
+            wait=ExpressionWrapper(F('started_at') - F('run_at'), output_field=DurationField()),
+            run=ExpressionWrapper(F('finished_at') - F('started_at'), output_field=DurationField()),
+        ).aggregate(count=Count('id'), wait_avg=Avg('wait'), wait_max=Max('wait'), run_avg=Avg('run'), run_max=Max('run'))
+
+        def seconds(value):
+            return round(value.total_seconds(), 3) if value is not None else None
+
+        return {
+            'depth': {state.label.lower(): depth.get(state.value, 0) for state in JobState},
+            'due': due['count'],
+            'oldest_due_age': seconds(now - due['oldest']) if due['oldest'] else None,
+            'done_in_window': done['count'],
+            'wait_avg': seconds(done['wait_avg']),
+            'wait_max': seconds(done['wait_max']),
+            'run_avg': seconds(done['run_avg']),
+            'run_max': seconds(done['run_max']),
+        }
+
+
+class JobManager(models.Manager.from_queryset(JobQuerySet)):
+    pass
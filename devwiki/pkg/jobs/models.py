@@ -0,0 +1,36 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+from pkg.jobs.choices import JobState
+from pkg.jobs.managers import JobManager
+
+
+class Job(models.Model):
+    """Deferred call of registered job function, claimed and run by run_jobs workers"""
+    name = models.CharField(verbose_name=_("Job function"), max_length=150)
+    args = models.JSONField(verbose_name=_("Positional arguments"), default=list, encoder=DjangoJSONEncoder)
+    kwargs = models.JSONField(verbose_name=_("Keyword arguments"), default=dict, encoder=DjangoJSONEncoder)
+    state = models.PositiveSmallIntegerField(choices=JobState.choices, default=JobState.QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=1)
+    last_error = models.TextField(blank=True)
+    run_at = models.DateTimeField(verbose_name=_("Run not before"), default=timezone.now)
+    locked_by = models.CharField(verbose_name=_("Worker running the job"), max_length=100, blank=True)
+    locked_until = models.DateTimeField(verbose_name=_("Lease end of running job"), null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = JobManager()
+
+    class Meta:
+        indexes = [
+            # workers poll only due queued jobs
+            models.Index(fields=['run_at', 'id'], name='job_queued_idx', condition=models.Q(state=JobState.QUEUED)),
+            models.Index(fields=['state', 'finished_at'], name='job_state_finished_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id}"
@@ -0,0 +1,106 @@
+"""
+Database-backed job queue
+
+Functions decorated with @job can be deferred with enqueue(), the call is
+stored as Job row in the current transaction, so it is queued only if the
+work it follows is committed. run_jobs workers claim due jobs and run them
+on a thread pool, failed jobs are retried with exponential backoff until
+max_attempts. With JOBS_EAGER jobs run in process after commit, without a worker.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from pkg.jobs.choices import JobState
+from pkg.jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def job(func=None, *, max_attempts=None):
+    """
+    Register function as job, arguments of the call have to be JSON serializable
+
+    @param max_attempts: attempts before the job fails, JOBS_MAX_ATTEMPTS by default
+    """
+    def register(func):
+        func.job_name = f'{func.__module__}.{func.__qualname__}'
+        func.max_attempts = max_attempts or settings.JOBS_MAX_ATTEMPTS
+        registry[func.job_name] = func
+        return func
+
+    return register(func) if func is not None else register
+
+
+def get_job_function(name):
+    """Registered job function by name, its module is imported if not loaded yet"""
+    if name not in registry:
+        try:
+            import_module(name.rsplit('.', 1)[0])
+        except ImportError:
+            pass
+    try:
+        return registry[name]
+    except KeyError:
+        raise LookupError(f'Job {name} is not registered') from None
+
+
+def enqueue(func, *args, **kwargs):
+    """
+    Defer call of job function
+
+    @param func: function registered by @job
+    @return: queued Job, None with JOBS_EAGER
+    """
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: run_eager(func, args, kwargs))
+        return None
+    return Job.objects.create(name=func.job_name, args=list(args), kwargs=kwargs, max_attempts=func.max_attempts)
+
+
+def run_eager(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Job %s failed', func.job_name)
+
+
+def backoff(attempts):
+    """Delay before next attempt, doubled on every attempt up to JOBS_BACKOFF_MAX with jitter"""
+    delay = min(settings.JOBS_BACKOFF_BASE * 2 ** (attempts - 1), settings.JOBS_BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def run_job(job):
+    """
+    Run claimed job and store the result, failed job is queued again after backoff
+
+    @param job: Job claimed by the worker
+    @return: True if the job succeeded
+    """
+    claimed = Job.objects.filter(id=job.id, state=JobState.RUNNING, locked_by=job.locked_by)
+    try:
+        get_job_function(job.name)(*job.args, **job.kwargs)
+    except Exception:
+        logger.exception('Job %s failed, attempt %s of %s', job, job.attempts, job.max_attempts)
+        now = timezone.now()
+        error = traceback.format_exc(limit=10)
+        if job.attempts >= job.max_attempts:
+            claimed.update(state=JobState.FAILED, last_error=error, finished_at=now, locked_until=None)
+        else:
+            claimed.update(state=JobState.QUEUED, last_error=error, run_at=now + backoff(job.attempts),
+                           locked_by='', locked_until=None)
+        return False
+    else:
+        claimed.update(state=JobState.DONE, finished_at=timezone.now(), locked_until=None)
+        return True
+    finally:
+        close_old_connections()
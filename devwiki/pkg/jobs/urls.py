@@ -0,0 +1,7 @@
+from django.conf.urls import url
+
+from django.urls import include
+
+urlpatterns = [
+        url(r'api/', include('pkg.jobs.api.urls')),
+]
@@ -0,0 +1,89 @@
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+from pkg.jobs.models import Job
+from pkg.jobs.queue import run_job
+
+logger = logging.getLogger(__name__)
+
+# how often the worker releases expired leases and purges old done jobs, seconds
+MAINTENANCE_INTERVAL = 60
+
+
+class Worker:
+    """
+    Claims due jobs and runs them on thread pool, a new batch is claimed
+    as soon as a thread is free. Run several worker processes to use more
+    cores, SKIP LOCKED keeps their batches disjoint.
+    """
+
+    def __init__(self, concurrency=None, poll_interval=None, lease=None):
+        self.concurrency = concurrency or settings.JOBS_CONCURRENCY
+        self.poll_interval = poll_interval if poll_interval is not None else settings.JOBS_POLL_INTERVAL
+        self.lease = timedelta(seconds=lease or settings.JOBS_LEASE)
+        self.name = f'{socket.gethostname()}:{os.getpid()}'[:100]
+        self.stopping = threading.Event()
+        self.processed = self.failed = 0
+        self._maintained_at = None
+
+    def stop(self):
+        """Stop claiming jobs, running jobs are finished"""
+        self.stopping.set()
+
+    def maintain(self):
+        now = timezone.now()
+        if self._maintained_at and (now - self._maintained_at).total_seconds() < MAINTENANCE_INTERVAL:
+            return
+        self._maintained_at = now
+        released = Job.objects.requeue_expired()
+        if released:
+            logger.warning('Released %s jobs with expired lease', released)
+        Job.objects.purge(now - timedelta(days=settings.JOBS_RETENTION_DAYS))
+
+    def run(self, burst=False):
+        """
+        Run jobs until stopped
+
+        @param burst: stop when there are no due jobs
+        """
+        running = set()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='jobs') as executor:
+            while not self.stopping.is_set():
+                free = self.concurrency - len(running)
+                try:
+                    self.maintain()
+                    jobs = Job.objects.claim(self.name, free, self.lease) if free else []
+                except DatabaseError:
+                    logger.exception('Jobs were not claimed')
+                    jobs = []
+                finally:
+                    close_old_connections()
+                running.update(executor.submit(run_job, job) for job in jobs)
+
+                if not running:
+                    if burst:
+                        break
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                # with free threads poll again after interval, otherwise wait for a thread
+                done, running = wait(running, timeout=self.poll_interval if len(running) < self.concurrency else None,
+                                     return_when=FIRST_COMPLETED)
+                self.count(done)
+            self.count(wait(running).done)
+
+    def count(self, futures):
+        for future in futures:
+            self.processed += 1
+            if future.exception() is not None:
+                logger.error('Job result was not stored', exc_info=future.exception())
+                self.failed += 1
+            elif not future.result():
+                self.failed += 1
@@ -0,0 +1,214 @@
+import json
+import platform
+import statistics
+import time
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from pkg.articles.caching import bump_version
+from pkg.articles.jobs import refresh_related
+from pkg.articles.models import Article, ArticleRating, Comment, Tag
+from pkg.jobs.queue import enqueue
+from pkg.profiling import RequestStats
+from pkg.users.models import UserStats
+
+Scenario = namedtuple('Scenario', ['name', 'method', 'url', 'data', 'anonymous'], defaults=[None, False])
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of sorted values"""
+    index = max(int(round(percent / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark REST endpoints in-process, report latency percentiles and query counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--output', help='Write results as JSON to the file')
+        parser.add_argument('--baseline', help='Compare with results JSON, fail on regression')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed p95 latency growth relative to baseline')
+        parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                            help='Ignore p95 latency growth smaller than this')
+
+    # one client repeats every request, throttling is measured by benchmark_throttle
+    @override_settings(THROTTLE_ENABLED=False)
+    def handle(self, *args, **options):
+        article, comment, tag = self.prepare()
+        cache.clear()
+        results = {}
+        try:
+            for scenario in self.scenarios(article, comment, tag):
+                results[scenario.name] = self.run(scenario, options['iterations'], options['warmup'])
+                self.report(scenario.name, results[scenario.name])
+        finally:
+            self.cleanup(article)
+
+        report = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'iterations': options['iterations'],
+                'articles': Article.objects.count(),
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['tolerance'], options['min_delta_ms'])
+
+    def prepare(self):
+        """
+        Create benchmark user and API clients
+
+        @return: most commented article, its first root comment and first tag
+        """
+        article = Article.objects.annotate(comments_count=Count('comments')).order_by('-comments_count', 'id').first()
+        if article is None:
+            raise CommandError('No articles, run seed_dataset first')
+        comment = Comment.objects.filter(article=article, parent=None).order_by('id').first()
+        tag = Tag.objects.order_by('id').first()
+        self.user, _ = get_user_model().objects.get_or_create(email='benchmark@devwiki.local',
+                                                              defaults={'nickname': 'benchmark'})
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.clients = {False: APIClient(), True: APIClient()}
+        self.clients[False].credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.created_articles, self.created_comments = [], []
+        return article, comment, tag
+
+    def cleanup(self, article):
+        """Revert votes of the benchmark user, created articles and comments are removed by destroy scenarios"""
+        ratings = ArticleRating.objects.filter(user=self.user)
+        article_ids = set(ratings.values_list('article_id', flat=True))
+        authors = set(Article.all_objects.filter(id__in=article_ids).values_list('author_id', flat=True))
+        ratings.delete()
+        # popularity is a decayed sum, votes are not subtracted from it
+        Article.all_objects.filter(id=article.id).update(popularity=article.popularity)
+        if article_ids:
+            ArticleRating.objects.refresh_summary(article_ids)
+            UserStats.objects.refresh(authors, ['votes_received', 'stars_received'])
+            enqueue(refresh_related, list(article_ids))
+        bump_version(article.slug)
+
+    def scenarios(self, article, comment, tag):
+        """Read and write requests of every endpoint, writes clean up after themselves"""
+        author = article.author_id
+        return [
+            Scenario('articles.list', 'get', '/articles/api/articles/'),
+            Scenario('articles.list.anonymous', 'get', '/articles/api/articles/', anonymous=True),
+            Scenario('articles.retrieve', 'get', f'/articles/api/articles/{article.slug}/'),
+            Scenario('articles.retrieve.anonymous', 'get', f'/articles/api/articles/{article.slug}/', anonymous=True),
+            Scenario('articles.popular', 'get', '/articles/api/articles/popular/'),
+            Scenario('articles.newest', 'get', '/articles/api/articles/newest/'),
+            Scenario('articles.search', 'get', '/articles/api/articles/search/?q=python+cache'),
+            Scenario('articles.article_comments', 'get', f'/articles/api/articles/{article.slug}/article_comments/'),
+            Scenario('articles.related', 'get', f'/articles/api/articles/{article.slug}/related/'),
+            Scenario('articles.vote', 'post', f'/articles/api/articles/{article.slug}/vote/',
+                     lambda i: {'rating': i % 5 + 1}),
+            Scenario('articles.create', 'post', '/articles/api/articles/', self.new_article),
+            Scenario('articles.partial_update', 'patch', lambda i: f'/articles/api/articles/{self.created_articles[i]}/',
+                     lambda i: {'body': f'Benchmark article body updated {i}'}),
+            Scenario('articles.destroy', 'delete', lambda i: f'/articles/api/articles/{self.created_articles[i]}/'),
+            Scenario('comments.list', 'get', '/articles/api/comments/'),
+            Scenario('comments.list.article', 'get', f'/articles/api/comments/?article={article.id}'),
+            Scenario('comments.retrieve', 'get', f'/articles/api/comments/{comment.id}/' if comment else None),
+            Scenario('comments.create', 'post', '/articles/api/comments/', self.new_comment(article)),
+            Scenario('comments.destroy', 'delete', lambda i: f'/articles/api/comments/{self.created_comments[i]}/'),
+            Scenario('tags.list', 'get', '/articles/api/tags/'),
+            Scenario('tags.retrieve', 'get', f'/articles/api/tags/{tag.id}/' if tag else None),
+            Scenario('tags.without_articles', 'get', '/articles/api/tags/without_articles/'),
+            Scenario('tags.cloud', 'get', '/articles/api/tags/cloud/'),
+            Scenario('users.my_profile', 'get', '/users/api/my_profile/'),
+            Scenario('users.user_profile', 'get', f'/users/api/{author}/user_profile/'),
+            Scenario('users.user_articles', 'get', f'/users/api/{author}/user_articles/'),
+            Scenario('users.user_comments', 'get', f'/users/api/{author}/user_comments/'),
+            Scenario('users.user_tags', 'get', f'/users/api/{author}/user_tags/'),
+            Scenario('users.user_activity', 'get', f'/users/api/{author}/user_activity/'),
+        ]
+
+    def new_article(self, i):
+        return {'title': f'Benchmark article {time.time_ns()}', 'body': f'Benchmark article body {i}',
+                'update_tags': ['benchmark']}
+
+    def new_comment(self, article):
+        return lambda i: {'article': article.id, 'content': f'Benchmark comment {i}'}
+
+    def run(self, scenario, iterations, warmup):
+        """Run scenario, warmup requests are not measured but still create objects for later scenarios"""
+        if scenario.url is None:
+            return None
+
+        client = self.clients[scenario.anonymous]
+        timings, queries, errors = [], [], 0
+        for i in range(warmup + iterations):
+            url = scenario.url(i) if callable(scenario.url) else scenario.url
+            data = scenario.data(i) if callable(scenario.data) else scenario.data
+            stats = RequestStats()
+            started = time.perf_counter()
+            with stats.track():
+                response = getattr(client, scenario.method)(url, data, format='json')
+            elapsed = time.perf_counter() - started
+
+            if response.status_code >= 400:
+                errors += 1
+            elif scenario.name == 'articles.create':
+                self.created_articles.append(response.data['slug'])
+            elif scenario.name == 'comments.create':
+                self.created_comments.append(response.data['id'])
+            if i >= warmup:
+                timings.append(elapsed * 1000)
+                queries.append(stats.queries)
+
+        timings.sort()
+        return {
+            'p50': round(percentile(timings, 50), 3),
+            'p95': round(percentile(timings, 95), 3),
+            'p99': round(percentile(timings, 99), 3),
+            'mean': round(statistics.mean(timings), 3),
+            'queries': max(queries),
+            'errors': errors,
+        }
+
+    def report(self, name, result):
+        if result is None:
+            self.stdout.write(f'{name:<32} skipped, no data')
+            return
+        line = (f'{name:<32} p50={result["p50"]:>8.2f}ms p95={result["p95"]:>8.2f}ms '
+                f'p99={result["p99"]:>8.2f}ms queries={result["queries"]}')
+        if result['errors']:
+            line = self.style.WARNING(f'{line} errors={result["errors"]}')
+        self.stdout.write(line)
+
+    def compare(self, results, path, tolerance, min_delta):
+        """Fail when p95 latency or query count of any endpoint regressed against baseline"""
+        with open(path) as file:
+            baseline = json.load(file)['results']
+
+        regressions = []
+        for name, result in results.items():
+            base = baseline.get(name)
+            if not result or not base:
+                continue
+            if result['queries'] > base['queries']:
+                regressions.append(f'{name}: queries {base["queries"]} -> {result["queries"]}')
+            if result['p95'] > base['p95'] * (1 + tolerance) and result['p95'] - base['p95'] > min_delta:
+                regressions.append(f'{name}: p95 {base["p95"]:.2f}ms -> {result["p95"]:.2f}ms')
+
+        if regressions:
+            raise CommandError('Performance regressions:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {path}'))
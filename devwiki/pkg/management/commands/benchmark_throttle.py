@@ -0,0 +1,95 @@
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from pkg.management.commands.benchmark_api import percentile
+from pkg.throttling import TokenBucketThrottle
+
+
+class BenchmarkView(APIView):
+    authentication_classes = []
+    permission_classes = []
+    throttle_classes = []
+    throttle_rates = {'get': '1000000/s'}
+
+    def get(self, request):
+        return Response()
+
+
+class ThrottledBenchmarkView(BenchmarkView):
+    throttle_classes = [TokenBucketThrottle, ]
+
+
+class Command(BaseCommand):
+    help = 'Measure overhead of token-bucket throttle on THROTTLE_CACHE and check burst under concurrency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5000)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--burst', type=int, default=50)
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        iterations = options['iterations']
+        self.stdout.write(f'Throttle cache: {caches[settings.THROTTLE_CACHE].__class__.__name__}')
+
+        plain, throttled = BenchmarkView.as_view(), ThrottledBenchmarkView.as_view()
+        results = {
+            'view': self.measure(lambda: plain(factory.get('/')), iterations),
+            'view.throttled': self.measure(lambda: throttled(factory.get('/')), iterations),
+        }
+        throttle, view = TokenBucketThrottle(), ThrottledBenchmarkView()
+        request = view.initialize_request(factory.get('/'))
+        request.user = AnonymousUser()
+        results['allow'] = self.measure(lambda: throttle.allow_request(request, view), iterations)
+        throttle.consume('throttle:benchmark:rejected', 60 * 1000, 1)
+        results['reject'] = self.measure(lambda: throttle.consume('throttle:benchmark:rejected', 60 * 1000, 1),
+                                         iterations)
+        for name, timings in results.items():
+            self.report(name, timings)
+        overhead = statistics.median(results['view.throttled']) - statistics.median(results['view'])
+        self.stdout.write(self.style.SUCCESS(f'Throttle adds {overhead:.1f} us per request (p50)'))
+
+        self.check_burst(options['threads'], options['burst'])
+
+    @staticmethod
+    def measure(call, iterations):
+        """Microseconds of every call"""
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - started) * 1e6)
+        return sorted(timings)
+
+    def report(self, name, timings):
+        self.stdout.write(f'{name:<16} p50 {percentile(timings, 50):8.1f} us  p95 {percentile(timings, 95):8.1f} us  '
+                          f'p99 {percentile(timings, 99):8.1f} us')
+
+    def check_burst(self, threads, burst):
+        """Concurrent requests of one client to empty bucket which refills once a minute, burst of them is allowed"""
+        key = f'throttle:benchmark:burst:{time.time_ns()}'
+        allowed = []
+        barrier = threading.Barrier(threads)
+
+        def client():
+            throttle = TokenBucketThrottle()
+            barrier.wait()
+            allowed.append(sum(throttle.consume(key, 60 * 1000, burst) for _ in range(burst)))
+
+        workers = [threading.Thread(target=client) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        total = sum(allowed)
+        style = self.style.SUCCESS if burst <= total <= burst + threads else self.style.ERROR
+        self.stdout.write(style(f'{threads} threads sent {threads * burst} requests, {total} allowed of burst {burst}'))
@@ -0,0 +1,85 @@
+import json
+
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from pkg.management.commands.benchmark_api import Command as BenchmarkCommand
+
+
+def plan_nodes(plan):
+    """Walk EXPLAIN JSON plan nodes depth first"""
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+class Command(BenchmarkCommand):
+    help = ('EXPLAIN queries of read endpoints against seeded PostgreSQL database, '
+            'fail if any of them scans a large table sequentially')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=10000,
+                            help='Tables with less estimated rows may be scanned sequentially')
+        parser.add_argument('--skip', action='append', default=[], help='Scenario name to skip')
+        parser.add_argument('--no-analyze', action='store_false', dest='analyze',
+                            help='Do not refresh planner statistics first')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print plan of every query')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Query plans are checked on PostgreSQL only')
+        if options['analyze']:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        article, comment, tag = self.prepare()
+        rows = self.table_rows()
+        violations = []
+        for scenario in self.read_scenarios(article, comment, tag, options['skip']):
+            for sql in self.capture(scenario):
+                plan = self.explain(sql)
+                scans = self.sequential_scans(plan, rows, options['min_rows'])
+                if options['verbose_plans'] or scans:
+                    self.stdout.write(f'{scenario.name}: {sql[:200]}')
+                if options['verbose_plans']:
+                    self.stdout.write(json.dumps(plan, indent=2))
+                violations.extend(f'{scenario.name}: sequential scan of {table} ({int(rows[table])} rows)'
+                                  for table in scans)
+
+        if violations:
+            raise CommandError('Sequential scans of large tables:\n' + '\n'.join(violations))
+        self.stdout.write(self.style.SUCCESS('No sequential scans of large tables'))
+
+    def read_scenarios(self, article, comment, tag, skip=()):
+        """GET scenarios of benchmark_api except skipped ones"""
+        return [scenario for scenario in self.scenarios(article, comment, tag)
+                if scenario.method == 'get' and scenario.url is not None and scenario.name not in skip]
+
+    def capture(self, scenario):
+        """SELECT statements of one request of the scenario"""
+        url = scenario.url(0) if callable(scenario.url) else scenario.url
+        with CaptureQueriesContext(connection) as queries:
+            response = self.clients[scenario.anonymous].get(url, scenario.data, format='json')
+        if response.status_code >= 400:
+            raise CommandError(f'{scenario.name}: {url} responded {response.status_code}')
+        return [query['sql'] for query in queries.captured_queries if query['sql'].lstrip().upper().startswith('SELECT')]
+
+    @staticmethod
+    def explain(sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            return cursor.fetchone()[0][0]['Plan']
+
+    @staticmethod
+    def sequential_scans(plan, rows, min_rows):
+        """Tables with at least min_rows estimated rows scanned sequentially in the plan"""
+        return [node['Relation Name'] for node in plan_nodes(plan)
+                if node['Node Type'] == 'Seq Scan' and rows.get(node['Relation Name'], 0) >= min_rows]
+
+    @staticmethod
+    def table_rows():
+        """Planner row estimates of tables"""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'")
+            return dict(cursor.fetchall())
@@ -0,0 +1,139 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from pkg.articles.models import Article, ArticleRating, ArticleTag, ArticleVisits, Comment, Tag
+from pkg.articles.popularity import STAR_WEIGHT, VISIT_WEIGHT, estimate_score
+from pkg.articles.rendering import render_article
+from pkg.users.models import UserStats
+
+SIZES = {
+    '1k': 1000,
+    '100k': 100000,
+    '1m': 1000000,
+}
+
+WORDS = ('python django article wiki developer code query index cache database server request response '
+         'serializer model view test deploy async thread process memory latency throughput search tag '
+         'comment rating visit token user profile api rest json stream batch worker queue').split()
+
+
+class Command(BaseCommand):
+    help = 'Generate deterministic dataset of users, articles, tags, comment threads, ratings and visits'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=SIZES, default='1k', help='Number of articles')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        articles = SIZES[options['size']]
+        started = time.monotonic()
+
+        users = self.create_users(max(articles // 10, 10))
+        tags = self.create_tags(max(articles // 20, 20), users)
+        for offset in range(0, articles, self.batch_size):
+            self.create_articles(offset, min(self.batch_size, articles - offset), users, tags)
+            self.stdout.write(f'{offset + min(self.batch_size, articles - offset)}/{articles} articles')
+
+        self.reset_sequences()
+        UserStats.objects.refresh(user.id for user in users)
+        Tag.objects.refresh_usage(tag.id for tag in tags)
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {articles} articles in {time.monotonic() - started:.1f}s (seed {options["seed"]}), '
+            f'run rebuild_search_index and compute_related to index them'))
+
+    def next_ids(self, model, count):
+        start = (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        return range(start, start + count)
+
+    def create_users(self, count):
+        users = [get_user_model()(id=user_id, email=f'seed{user_id}@devwiki.local', nickname=f'seed{user_id}',
+                                  password='!')
+                 for user_id in self.next_ids(get_user_model(), count)]
+        get_user_model().objects.bulk_create(users, batch_size=self.batch_size)
+        return users
+
+    def create_tags(self, count, users):
+        tags = [Tag(id=tag_id, name=f'seedtag{tag_id}', author=self.random.choice(users))
+                for tag_id in self.next_ids(Tag, count)]
+        Tag.objects.bulk_create(tags, batch_size=self.batch_size)
+        return tags
+
+    def text(self, minimum, maximum):
+        return ' '.join(self.random.choice(WORDS) for _ in range(self.random.randint(minimum, maximum)))
+
+    @transaction.atomic
+    def create_articles(self, offset, count, users, tags):
+        """Create batch of articles with visits, tags, ratings and comment threads"""
+        article_ids = self.next_ids(Article, count)
+        visits = [ArticleVisits(id=visits_id, number=int(self.random.paretovariate(1.2)) * 10)
+                  for visits_id in self.next_ids(ArticleVisits, count)]
+        ArticleVisits.objects.bulk_create(visits)
+
+        articles, article_tags, ratings = [], [], []
+        for article_id, article_visits in zip(article_ids, visits):
+            article = Article(id=article_id,
+                              title=f'Seed article {article_id}',
+                              slug=f'seed-article-{article_id}',
+                              body=self.text(50, 500),
+                              author=self.random.choice(users),
+                              visits=article_visits,
+                              created_at=self.now - timezone.timedelta(minutes=self.random.randint(0, 2 * 365 * 24 * 60)))
+
+            for tag in {tags[min(int(self.random.paretovariate(1)) - 1, len(tags) - 1)] for _ in range(self.random.randint(1, 5))}:
+                article_tags.append(ArticleTag(article_id=article_id, tag_id=tag.id))
+
+            for user in self.random.sample(users, min(self.random.randint(0, 6), len(users))):
+                ratings.append(ArticleRating(user=user, article_id=article_id, star=self.random.randint(1, 5)))
+                article.rate_votes += 1
+                article.rate_stars += ratings[-1].star
+            article.rate_average = article.rate_stars / article.rate_votes if article.rate_votes else 0
+            render_article(article)
+            article.popularity = estimate_score(article.created_at,
+                                                article_visits.number * VISIT_WEIGHT + article.rate_stars * STAR_WEIGHT,
+                                                self.now)
+            articles.append(article)
+
+        created = [article.created_at for article in articles]
+        Article.objects.bulk_create(articles)
+        # created_at is auto_now_add, spread articles over time after insert
+        for article, created_at in zip(articles, created):
+            article.created_at = created_at
+        Article.objects.bulk_update(articles, ['created_at'])
+        ArticleTag.objects.bulk_create(article_tags, batch_size=self.batch_size)
+        ArticleRating.objects.bulk_create(ratings, batch_size=self.batch_size)
+        Comment.objects.bulk_create(self.build_comments(articles, users), batch_size=self.batch_size)
+
+    def build_comments(self, articles, users):
+        """Build comment threads with materialized paths, some threads go deep"""
+        comments = []
+        comment_ids = iter(self.next_ids(Comment, sum(1 for _ in articles) * 20))
+        for article in articles:
+            thread = []
+            for _ in range(min(int(self.random.expovariate(1 / 5)), 20)):
+                parent = self.random.choice(thread) if thread and self.random.random() < 0.6 else None
+                comment = Comment(id=next(comment_ids), article_id=article.id, parent=parent,
+                                  author=self.random.choice(users), content=self.text(5, 60))
+                comment.path = comment.build_path(parent.path if parent else '')
+                comment.depth = comment.path.count('/')
+                if comment.depth >= 50:
+                    continue
+                thread.append(comment)
+            comments.extend(thread)
+        return comments
+
+    def reset_sequences(self):
+        models = [get_user_model(), Tag, ArticleVisits, Article, ArticleTag, Comment]
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
@@ -0,0 +1,202 @@
+import base64
+import binascii
+import datetime
+import json
+from collections import OrderedDict
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from pkg.serializers import sparse_queryset
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """JSON encoder keeping microseconds of datetimes, DjangoJSONEncoder cuts them to milliseconds"""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on unique composite ordering, e.g. ('-created_at', '-id')
+
+    Page is selected with WHERE on the last seen key instead of OFFSET,
+    so page fetch cost does not depend on page depth.
+    """
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering, url=None):
+        self.ordering = ordering
+        self.url = url
+        self.page = []
+        self.has_next = False
+        self.has_previous = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        ordering = self.ordering
+        backwards = bool(cursor and cursor['backwards'])
+        if backwards:
+            ordering = [self.reverse_field(field) for field in ordering]
+
+        queryset = queryset.order_by(*ordering)
+        if cursor:
+            key = self.parse_key(queryset.model, cursor['key'])
+            queryset = queryset.filter(self.keyset_filter(ordering, key))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if backwards:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        return self.page
+
+    def get_paginated_data(self, data):
+        return OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ])
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], backwards=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], backwards=True)
+
+    @staticmethod
+    def reverse_field(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def keyset_filter(ordering, key):
+        """
+        Build WHERE for rows going after key in ordering
+
+        @param ordering: list of ordering fields
+        @param key: values of ordering fields of the last seen row
+        @return: Q for (f1 > v1) OR (f1 = v1 AND f2 > v2) ...
+        """
+        conditions = []
+        for position, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition = {f.lstrip('-'): value for f, value in zip(ordering[:position], key)}
+            condition[f'{name}__{lookup}'] = key[position]
+            conditions.append(Q(**condition))
+        return reduce(or_, conditions)
+
+    def parse_key(self, model, key):
+        """
+        Convert cursor key values to python values of ordering fields
+
+        @param model: model of paginated queryset
+        @param key: values of ordering fields decoded from JSON
+        @return: list of field values
+        """
+        values = []
+        for field, value in zip(self.ordering, key):
+            try:
+                values.append(self.get_field(model, field).to_python(value))
+            except (FieldDoesNotExist, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        return values
+
+    @staticmethod
+    def get_field(model, field):
+        names = field.lstrip('-').split('__')
+        for name in names[:-1]:
+            model = model._meta.get_field(name).related_model
+        return model._meta.get_field(names[-1])
+
+    def get_key(self, instance):
+        key = []
+        for field in self.ordering:
+            value = instance
+            for attr in field.lstrip('-').split('__'):
+                value = getattr(value, attr)
+            key.append(value)
+        return key
+
+    def encode_cursor(self, instance, backwards):
+        payload = json.dumps({'key': self.get_key(instance), 'backwards': backwards}, cls=CursorEncoder)
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+        url = self.url or self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            if len(cursor['key']) != len(self.ordering):
+                raise ValueError
+            return {'key': cursor['key'], 'backwards': bool(cursor.get('backwards'))}
+        except (binascii.Error, UnicodeDecodeError, TypeError, KeyError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class KeysetPaginationMixin:
+    """Viewset mixin to serve listing actions with keyset pagination"""
+
+    def get_keyset_page(self, queryset, ordering, serializer_class=None, loader=None, url=None):
+        """
+        Paginate queryset by keyset ordering and serialize page
+
+        @param queryset: queryset to paginate
+        @param ordering: unique composite ordering, e.g. ('-created_at', '-id')
+        @param serializer_class: serializer class, view serializer if None
+        @param loader: callable to load page related data before serialization
+        @param url: base url of next/previous links, current url if None
+        @return: page results and next/previous cursors
+        """
+        serializer_class = serializer_class or self.get_serializer_class()
+        queryset = sparse_queryset(queryset, serializer_class, self.request,
+                                   columns=[field.lstrip('-').split('__')[0] for field in ordering])
+        paginator = KeysetPagination(ordering, url=url)
+        page = paginator.paginate_queryset(queryset, self.request, view=self)
+        if loader is not None:
+            page = loader(page)
+        serializer = serializer_class(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_data(serializer.data)
+
+    def get_keyset_paginated_response(self, queryset, ordering, serializer_class=None, loader=None):
+        """Response with keyset page of queryset, see get_keyset_page"""
+        return Response(self.get_keyset_page(queryset, ordering, serializer_class, loader))
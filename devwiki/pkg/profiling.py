@@ -0,0 +1,140 @@
+"""
+Per-request SQL queries, DB time, serialization time and response size
+
+QueryStatsMiddleware counts queries of every request, reports them in
+X-DB-* response headers for staff users or in DEBUG and logs them.
+QueryBudgetMixin lets viewset actions declare maximum number of queries,
+exceeded budget raises QueryBudgetExceeded when QUERY_BUDGET_STRICT is on
+(tests) and is logged as warning otherwise.
+"""
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """View action executed more queries than its budget"""
+
+
+class RequestStats:
+    """Counters of one request, used as database execute wrapper"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.render_time = 0.0
+        self.view = None
+        self.started = time.perf_counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+    @contextmanager
+    def track(self):
+        """Count queries of all database connections inside the block"""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def as_headers(self, size):
+        return {
+            'X-DB-Queries': str(self.queries),
+            'X-DB-Time-Ms': f'{self.db_time * 1000:.2f}',
+            'X-Serialize-Time-Ms': f'{self.serialize_time * 1000:.2f}',
+            'X-Render-Time-Ms': f'{self.render_time * 1000:.2f}',
+            'X-Response-Size': str(size),
+        }
+
+
+class QueryStatsMiddleware:
+    """Measure queries and timings of every request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        request.query_stats = stats
+        with stats.track():
+            response = self.get_response(request)
+
+        size = len(response.content) if not response.streaming else 0
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            for header, value in stats.as_headers(size).items():
+                response[header] = value
+
+        logger.info('%s %s %s queries=%d db=%.2fms serialize=%.2fms render=%.2fms total=%.2fms size=%d',
+                    request.method, request.path, stats.view or '-', stats.queries, stats.db_time * 1000,
+                    stats.serialize_time * 1000, stats.render_time * 1000,
+                    (time.perf_counter() - stats.started) * 1000, size)
+        return response
+
+
+class QueryBudgetMixin:
+    """
+    Viewset mixin checking number of queries per action
+
+    query_budgets = {'list': 4, 'retrieve': 5}
+    """
+    query_budgets = {}
+
+    def dispatch(self, request, *args, **kwargs):
+        if getattr(request, 'query_stats', None) is not None:
+            return super().dispatch(request, *args, **kwargs)
+
+        request.query_stats = RequestStats()
+        with request.query_stats.track():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        stats = request.query_stats
+        self._view_started, self._view_db_time = time.perf_counter(), stats.db_time
+        super().initial(request, *args, **kwargs)
+
+    def perform_authentication(self, request):
+        """Authentication is cached apart from the view, its queries are not part of the budget"""
+        queries = request.query_stats.queries
+        super().perform_authentication(request)
+        self._auth_queries = request.query_stats.queries - queries
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        stats = getattr(request, 'query_stats', None)
+        if stats is None:
+            return response
+
+        stats.view = f'{self.__class__.__name__}.{getattr(self, "action", None) or request.method.lower()}'
+        if hasattr(self, '_view_started'):
+            view_time = time.perf_counter() - self._view_started
+            stats.serialize_time = view_time - (stats.db_time - self._view_db_time)
+        if hasattr(response, 'render') and not response.is_rendered:
+            started = time.perf_counter()
+            response.render()
+            stats.render_time = time.perf_counter() - started
+
+        self.check_query_budget(stats)
+        return response
+
+    def check_query_budget(self, stats):
+        budget = self.query_budgets.get(getattr(self, 'action', None))
+        queries = stats.queries - getattr(self, '_auth_queries', 0)
+        if budget is None or queries <= budget:
+            return
+
+        message = f'{stats.view} executed {queries} queries, budget is {budget}'
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
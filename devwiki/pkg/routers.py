@@ -0,0 +1,176 @@
+"""
+Primary and read replicas routing
+
+Reads go to replicas only inside requests of safe methods, everything else
+(management commands, job workers, unsafe requests) uses the primary.
+Any write statement in a request pins the rest of the request to the
+primary, as do open transactions. Unsafe request which wrote returns a signed pin in
+DB_PIN_COOKIE cookie and DB_PIN_HEADER header, requests echoing it read from
+the primary for DB_PIN_SECONDS, so the client reads its own writes while
+replicas catch up.
+
+Replicas lagging over DB_REPLICA_MAX_LAG seconds or failing the lag check
+are skipped, the check runs at most every DB_REPLICA_CHECK_INTERVAL
+seconds per process. With no replica available reads go to the primary.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core import signing
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = 'default'
+
+# replica reads are allowed in the current context
+_replica_reads = ContextVar('replica_reads', default=False)
+# context wrote to the primary
+_wrote = ContextVar('wrote', default=False)
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+LAG_QUERIES = {
+    'postgresql': 'SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)',
+}
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES if alias != PRIMARY]
+
+
+class ReplicaHealth:
+    """Per-process cache of replicas lag"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked_at = {}
+        self.lag = {}
+
+    def measure(self, alias):
+        """
+        Replication lag of replica in seconds, raw cursor keeps the check out of request query stats
+
+        @return: lag, 0 on databases without lag query, None if the replica failed
+        """
+        connection = connections[alias]
+        try:
+            connection.ensure_connection()
+            cursor = connection.connection.cursor()
+            try:
+                cursor.execute(LAG_QUERIES.get(connection.vendor, 'SELECT 0'))
+                return float(cursor.fetchone()[0])
+            finally:
+                cursor.close()
+        except (DatabaseError, connection.Database.Error) as error:
+            logger.warning('Replica %s is not available: %s', alias, error)
+            connection.close()
+            return None
+
+    def is_available(self, alias):
+        now = time.monotonic()
+        with self.lock:
+            due = now - self.checked_at.get(alias, float('-inf')) >= settings.DB_REPLICA_CHECK_INTERVAL
+            if due:
+                self.checked_at[alias] = now
+        if due:
+            lag = self.measure(alias)
+            self.lag[alias] = lag
+            if lag is not None and lag > settings.DB_REPLICA_MAX_LAG:
+                logger.warning('Replica %s lags %.1fs, reads go to other databases', alias, lag)
+        lag = self.lag.get(alias)
+        return lag is not None and lag <= settings.DB_REPLICA_MAX_LAG
+
+    def available(self):
+        return [alias for alias in replicas() if self.is_available(alias)]
+
+
+health = ReplicaHealth()
+
+
+class PrimaryReplicaRouter:
+    """
+    Route reads of replica-enabled contexts to a random healthy replica, writes to the primary
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or _wrote.get() or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # related objects are read from the database of the instance
+            return instance._state.db
+        available = health.available()
+        return random.choice(available) if available else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        # Django routes also relation assignments as writes, statements are checked by detect_write
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get schema by replication
+        return db == PRIMARY
+
+
+@contextmanager
+def primary():
+    """Read from the primary inside the block"""
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+signer = signing.TimestampSigner(salt='pkg.routers.pin')
+
+
+def is_pinned(request):
+    """Request carries valid pin of a recent write"""
+    value = request.headers.get(settings.DB_PIN_HEADER) or request.COOKIES.get(settings.DB_PIN_COOKIE)
+    if not value:
+        return False
+    try:
+        signer.unsign(value, max_age=settings.DB_PIN_SECONDS)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def detect_write(execute, sql, params, many, context):
+    """Primary execute wrapper marking the context as written"""
+    if not _wrote.get() and sql.lstrip()[:6].upper() in WRITE_STATEMENTS:
+        _wrote.set(True)
+    return execute(sql, params, many, context)
+
+
+class ReplicaRoutingMiddleware:
+    """Enable replica reads for safe requests without recent writes, pin the client after a write"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        safe = request.method in ('GET', 'HEAD', 'OPTIONS')
+        replica_reads = _replica_reads.set(safe and bool(replicas()) and not is_pinned(request))
+        wrote = _wrote.set(False)
+        try:
+            with connections[PRIMARY].execute_wrapper(detect_write):
+                response = self.get_response(request)
+            if not safe and _wrote.get():
+                pin = signer.sign('1')
+                response[settings.DB_PIN_HEADER] = pin
+                response.set_cookie(settings.DB_PIN_COOKIE, pin, max_age=settings.DB_PIN_SECONDS,
+                                    httponly=True, samesite='Lax')
+            return response
+        finally:
+            _replica_reads.reset(replica_reads)
+            _wrote.reset(wrote)
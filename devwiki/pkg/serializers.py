@@ -0,0 +1,129 @@
+"""
+Sparse fieldsets and expansion of serialized objects
+
+?fields=id,slug,title returns only listed fields, ?expand=author renders
+fields listed in Meta.expandable_fields as nested objects instead of ids.
+Both apply to read requests only. sparse_queryset adjusts select_related,
+prefetch_related and loaded columns of queryset to the requested shape,
+so relations of skipped fields are not joined or prefetched.
+
+Serializer Meta options:
+    expandable_fields = {'author': {'serializer': UserDetailSerializer}}
+    select_related_fields = ['author']    nested by default, joined when requested
+    prefetch_related_fields = ['tags']    nested by default, prefetched when requested
+    field_dependencies = {'rating': ['rate_average']}    columns of computed fields
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_list_param(request, name):
+    """Set of comma separated values of query parameter, None if missing or not read request"""
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return {item.strip() for item in value.split(',') if item.strip()}
+
+
+def requested_fields(request):
+    return parse_list_param(request, FIELDS_PARAM)
+
+
+def is_field_requested(request, name):
+    fields = requested_fields(request)
+    return fields is None or name in fields
+
+
+class SparseFieldsetsMixin:
+    """ModelSerializer mixin handling ?fields= and ?expand= of the root serializer"""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.is_root():
+            return fields
+
+        request = self.context.get('request')
+        expand = parse_list_param(request, EXPAND_PARAM) or set()
+        for name, options in getattr(self.Meta, 'expandable_fields', {}).items():
+            if name in expand and name in fields:
+                serializer = options['serializer']
+                if isinstance(serializer, str):
+                    serializer = import_string(serializer)
+                fields[name] = serializer(many=options.get('many', False), read_only=True)
+
+        requested = requested_fields(request)
+        if requested:
+            fields = type(fields)((name, field) for name, field in fields.items() if name in requested)
+        return fields
+
+    def is_root(self):
+        parent = self.parent
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+
+def declared_fields(meta, model):
+    if meta.fields == serializers.ALL_FIELDS:
+        return {field.name for field in model._meta.get_fields() if field.concrete}
+    return set(meta.fields)
+
+
+def sparse_queryset(queryset, serializer_class, request, columns=()):
+    """
+    Adjust queryset relations and columns to fields requested from serializer
+
+    @param queryset: queryset of serialized objects
+    @param serializer_class: serializer class with SparseFieldsetsMixin
+    @param request: request with fields and expand parameters
+    @param columns: columns used by view itself, always loaded
+    @return: queryset
+    """
+    fields = requested_fields(request)
+    expand = parse_list_param(request, EXPAND_PARAM) or set()
+    meta = getattr(serializer_class, 'Meta', None)
+    if (fields is None and not expand) or not issubclass(serializer_class, SparseFieldsetsMixin):
+        return queryset
+
+    expandable = getattr(meta, 'expandable_fields', {})
+    if fields is not None:
+        queryset = queryset.select_related(None).prefetch_related(None)
+        select = [name for name in getattr(meta, 'select_related_fields', []) if name in fields]
+        prefetch = [name for name in getattr(meta, 'prefetch_related_fields', []) if name in fields]
+    else:
+        fields, select, prefetch = declared_fields(meta, queryset.model), [], []
+    for name, options in expandable.items():
+        if name in expand and name in fields:
+            (prefetch if options.get('many') else select).append(name)
+
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if requested_fields(request) is not None:
+        queryset = only_requested(queryset, fields, meta, columns)
+    return queryset
+
+
+def only_requested(queryset, fields, meta, columns=()):
+    """Load only columns of requested fields, all columns if any field is not known"""
+    dependencies = getattr(meta, 'field_dependencies', {})
+    columns = {queryset.model._meta.pk.name, *columns}
+    for name in fields & declared_fields(meta, queryset.model):
+        if name in dependencies:
+            columns.update(dependencies[name])
+            continue
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return queryset
+        if not field.concrete and not field.many_to_many:
+            return queryset
+        if not field.many_to_many:
+            columns.add(name)
+    return queryset.only(*columns)
@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from pkg.users import authentication
+from pkg.users.authentication import CachedTokenAuthentication
+
+
+class CachedTokenInvalidationTest(TestCase):
+    """Cached token snapshots are rejected after queryset updates and deletes, not only after save"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(email='token@example.com')
+        cls.key = Token.objects.create(user=cls.user).key
+
+    def setUp(self):
+        cache.clear()
+        authentication.local_cache.items.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.key}')
+        self.assertEqual(self.get_profile(), 200)
+
+    def get_profile(self):
+        return self.client.get('/users/api/my_profile/').status_code
+
+    def get_cached_user(self):
+        return CachedTokenAuthentication().authenticate_credentials(self.key)[0]
+
+    def test_queryset_ban_is_visible_on_next_request(self):
+        self.assertFalse(self.get_cached_user().is_banned)
+        get_user_model().objects.filter(id=self.user.id).update(is_banned=True)
+        self.assertTrue(self.get_cached_user().is_banned)
+
+    def test_admin_ban_action(self):
+        admin = get_user_model().objects.create(email='admin@example.com', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        response = self.client.post('/admin/users/user/', {'action': 'ban', '_selected_action': [self.user.id]})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(self.get_cached_user().is_banned)
+
+    def test_queryset_deactivation_rejects_token(self):
+        get_user_model().objects.filter(email=self.user.email).update(is_active=False)
+        self.assertEqual(self.get_profile(), 401)
+
+    def test_bulk_token_delete_rejects_token(self):
+        Token.objects.filter(user=self.user).delete()
+        self.assertEqual(self.get_profile(), 401)
@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from pkg.articles.models import Article, ArticleVisits
+
+
+class CachedArticleVisitsTest(TestCase):
+    """Anonymous article responses served from cache carry the current visits number"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create(email='cache@example.com')
+        cls.article = Article.objects.create(title='Cached', body='Cached article body', author=user,
+                                             visits=ArticleVisits.objects.create(number=1))
+
+    def setUp(self):
+        cache.clear()
+        self.url = f'/articles/api/articles/{self.article.slug}/'
+
+    def get_visits(self):
+        response = APIClient().get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['visits']
+
+    def test_strict_visits_grow_on_cache_hits(self):
+        self.assertEqual([self.get_visits() for _ in range(3)], [2, 3, 4])
+        self.assertEqual(ArticleVisits.objects.get(id=self.article.visits_id).number, 4)
+
+    @override_settings(VISITS_COUNTER_MODE='buffered', VISITS_FLUSH_THRESHOLD=1000)
+    def test_buffered_visits_grow_on_cache_hits(self):
+        self.assertEqual([self.get_visits() for _ in range(3)], [2, 3, 4])
+
+    def test_sparse_response_without_visits(self):
+        self.url += '?fields=title'
+        for _ in range(2):
+            response = APIClient().get(self.url)
+            self.assertEqual(response.json(), {'title': 'Cached'})
+        self.assertEqual(ArticleVisits.objects.get(id=self.article.visits_id).number, 3)
@@ -0,0 +1,53 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from pkg.articles.models import Article, ArticleVisits
+
+
+class KeysetPaginationTest(TestCase):
+    """Paging over rows with created_at in the same millisecond"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create(email='author@example.com')
+        created_at = timezone.now().replace(microsecond=500000)
+        cls.ids = []
+        for number in range(4):
+            article = Article.objects.create(title=f'Cursor {number}', body='body', author=user,
+                                             visits=ArticleVisits.objects.create(number=0))
+            # all rows share the millisecond, newest first is CURS3, CURS2, ...
+            Article.objects.filter(id=article.id).update(
+                created_at=created_at + datetime.timedelta(microseconds=number * 100))
+            cls.ids.insert(0, article.id)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get_page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [article['id'] for article in data['results']], data['next'], data['previous']
+
+    def test_forward(self):
+        seen, url = [], '/articles/api/articles/newest/?page_size=1'
+        while url:
+            page, url, _ = self.get_page(url)
+            seen.extend(page)
+        self.assertEqual(seen, self.ids)
+
+    def test_backward(self):
+        first, url, _ = self.get_page('/articles/api/articles/newest/?page_size=2')
+        second, _, previous = self.get_page(url)
+        self.assertEqual(second, self.ids[2:])
+        page, _, _ = self.get_page(previous)
+        self.assertEqual(page, first)
+        self.assertEqual(page, self.ids[:2])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/articles/api/articles/newest/?cursor=zzz')
+        self.assertEqual(response.status_code, 404)
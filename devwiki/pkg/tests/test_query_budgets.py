@@ -0,0 +1,103 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from pkg.articles.api.views import ArticleViewSet
+from pkg.articles.models import Article, ArticleRating, ArticleVisits, Comment, Tag
+from pkg.articles.revisions import record_revision
+from pkg.jobs.models import Job
+from pkg.profiling import QueryBudgetExceeded
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTest(TestCase):
+    """Budgeted actions stay within their query budgets on a dataset with every relation filled"""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [get_user_model().objects.create(email=f'budget{i}@example.com', is_staff=i == 0) for i in range(3)]
+        cls.user = users[0]
+        cls.token = Token.objects.create(user=cls.user).key
+        tags = [Tag.objects.create(name=f'budget{i}', author=users[i % 3]) for i in range(4)]
+
+        cls.articles = []
+        for i in range(4):
+            article = Article.objects.create(title=f'Budget article {i}', body=f'Budget article {i} cache body',
+                                             author=users[i % 3], visits=ArticleVisits.objects.create(number=i))
+            article.tags.set(tags[i:i + 2])
+            record_revision(article, users[0])
+            article.body += ' edited'
+            article.save()
+            record_revision(article, users[0])
+            for user in users:
+                ArticleRating.objects.create(article=article, user=user, star=5)
+            root = Comment.objects.create(article=article, content='Root comment', author=users[1])
+            Comment.objects.create(article=article, content='Reply comment', author=users[2], parent=root)
+            cls.articles.append(article)
+        cls.job = Job.objects.create(name='pkg.articles.jobs.index_articles', args=[[cls.articles[0].id]])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def assertWithinBudget(self, *urls, anonymous=False):
+        client = APIClient() if anonymous else self.client
+        for url in urls:
+            with self.subTest(url=url, anonymous=anonymous):
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200, response.content)
+
+    def test_article_actions(self):
+        slug = self.articles[0].slug
+        urls = [
+            '/articles/api/articles/',
+            f'/articles/api/articles/{slug}/',
+            '/articles/api/articles/popular/',
+            '/articles/api/articles/newest/',
+            '/articles/api/articles/search/?q=cache',
+            f'/articles/api/articles/{slug}/article_comments/',
+            f'/articles/api/articles/{slug}/revisions/',
+            f'/articles/api/articles/{slug}/revisions/1/',
+            f'/articles/api/articles/{slug}/diff/?from=1&to=2',
+            f'/articles/api/articles/{slug}/related/',
+        ]
+        self.assertWithinBudget(*urls)
+        cache.clear()
+        self.assertWithinBudget(*urls, anonymous=True)
+
+    def test_comment_and_tag_actions(self):
+        comment = Comment.objects.filter(parent=None).first()
+        tag = Tag.objects.first()
+        self.assertWithinBudget(
+            '/articles/api/comments/',
+            f'/articles/api/comments/{comment.id}/',
+            '/articles/api/tags/',
+            f'/articles/api/tags/{tag.id}/',
+            '/articles/api/tags/without_articles/',
+            '/articles/api/tags/cloud/',
+        )
+
+    def test_user_actions(self):
+        pk = self.articles[1].author_id
+        self.assertWithinBudget(
+            '/users/api/my_profile/',
+            '/users/api/auth_cache/',
+            f'/users/api/{pk}/user_profile/',
+            f'/users/api/{pk}/user_articles/',
+            f'/users/api/{pk}/user_comments/',
+            f'/users/api/{pk}/user_tags/',
+            f'/users/api/{pk}/user_activity/',
+        )
+        self.assertEqual(self.client.post('/users/api/logout/').status_code, 204)
+
+    def test_job_actions(self):
+        self.assertWithinBudget('/jobs/api/jobs/', f'/jobs/api/jobs/{self.job.id}/', '/jobs/api/jobs/stats/')
+
+    def test_overrun_raises(self):
+        with mock.patch.dict(ArticleViewSet.query_budgets, {'list': 0}), self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/articles/api/articles/')
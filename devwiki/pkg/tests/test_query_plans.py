@@ -0,0 +1,51 @@
+import unittest
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from pkg.management.commands.check_query_plans import Command, plan_nodes
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'EXPLAIN JSON plans are checked on PostgreSQL only')
+@override_settings(THROTTLE_ENABLED=False)
+class QueryPlanTest(TestCase):
+    """
+    Read endpoints of check_query_plans on a small seeded dataset, sequential scans
+    are disabled so the planner takes an index whenever one can serve the query
+    and every remaining sequential scan is a missing index
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for command in ('seed_dataset', 'rebuild_search_index', 'compute_related'):
+            call_command(command, stdout=StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        self.command = Command(stdout=StringIO())
+        self.article, self.comment, self.tag = self.command.prepare()
+
+    def test_read_endpoints_use_indexes(self):
+        rows = self.command.table_rows()
+        scenarios = self.command.read_scenarios(self.article, self.comment, self.tag)
+        self.assertTrue(scenarios)
+        for scenario in scenarios:
+            with self.subTest(scenario=scenario.name):
+                statements = self.command.capture(scenario)
+                self.assertTrue(statements)
+                for sql in statements:
+                    plan = self.command.explain(sql)
+                    self.assertIn('Node Type', plan)
+                    self.assertEqual(self.command.sequential_scans(plan, rows, 0), [], f'{sql}\n{plan}')
+
+    def test_search_uses_gin_index(self):
+        scenario = next(scenario for scenario in self.command.read_scenarios(self.article, self.comment, self.tag)
+                        if scenario.name == 'articles.search')
+        indexes = {node.get('Index Name') for sql in self.command.capture(scenario)
+                   for node in plan_nodes(self.command.explain(sql))}
+        self.assertIn('article_search_vector_gin', indexes)
@@ -0,0 +1,34 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from pkg.articles import related
+from pkg.articles.models import Article, ArticleVisits, RelatedArticle, Tag
+
+
+@mock.patch.object(related, 'MAX_POSTINGS', 2)
+class RelatedTagSelectionTest(TestCase):
+    """Full rebuild and single article refresh skip the same common tags"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create(email='related@example.com')
+        common, rare = Tag.objects.create(name='common', author=user), Tag.objects.create(name='rare', author=user)
+        cls.articles = [Article.objects.create(title=f'Related {i}', body='Related article body', author=user,
+                                               visits=ArticleVisits.objects.create(number=0)) for i in range(4)]
+        for i, article in enumerate(cls.articles):
+            article.tags.set([common, rare] if i < 2 else [common])
+        Tag.objects.refresh_usage()
+
+    def get_neighbors(self):
+        return list(RelatedArticle.objects.filter(article=self.articles[0]).order_by('-score')
+                    .values_list('related_id', 'tag_score'))
+
+    def test_refresh_matches_rebuild(self):
+        related.compute_related()
+        rebuilt = self.get_neighbors()
+        RelatedArticle.objects.all().delete()
+        related.refresh_related(self.articles[0].id)
+        self.assertEqual(self.get_neighbors(), rebuilt)
+        self.assertEqual(rebuilt, [(self.articles[1].id, 1.0)])
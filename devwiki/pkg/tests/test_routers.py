@@ -0,0 +1,94 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from pkg import routers
+from pkg.articles.models import Article, ArticleVisits, Tag
+
+REPLICA = 'replica1'
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'replica is a copy of SQLite primary')
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    Reads of a second SQLite database standing for a replica, the replica is
+    a copy of the primary taken before the last write, so it lags by one tag
+    """
+
+    def setUp(self):
+        self.user = user = get_user_model().objects.create(email='replica@example.com')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        Tag.objects.create(name='replicated', author=user)
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'replica.sqlite3')
+        self.addCleanup(os.rmdir, directory)
+        self.addCleanup(os.remove, path)
+        # replication is a copy of the primary
+        with sqlite3.connect(path) as replica:
+            connections['default'].connection.backup(replica)
+        replica.close()
+        Tag.objects.create(name='primary', author=user)
+
+        databases = {**settings.DATABASES, REPLICA: {**settings.DATABASES['default'], 'NAME': path, 'TEST': {}}}
+        override = override_settings(DATABASES=databases, DB_REPLICA_CHECK_INTERVAL=0)
+        override.enable()
+        self.addCleanup(override.disable)
+        connections.databases[REPLICA] = databases[REPLICA]
+        connections.ensure_defaults(REPLICA)
+        self.addCleanup(self.remove_replica)
+
+        routers.health.checked_at.clear()
+        routers.health.lag.clear()
+        cache.clear()
+
+    def remove_replica(self):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+
+    def get_tags(self, **headers):
+        response = self.client.get('/articles/api/tags/', **headers)
+        self.assertEqual(response.status_code, 200)
+        return sorted(tag['name'] for tag in response.json()['results'])
+
+    def test_safe_request_reads_replica(self):
+        self.assertEqual(self.get_tags(), ['replicated'])
+
+    def test_write_pins_client_to_primary(self):
+        response = self.client.post('/articles/api/tags/', {'name': 'written', 'author': self.user.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        pin = response[settings.DB_PIN_HEADER]
+
+        self.assertEqual(self.get_tags(), ['primary', 'replicated', 'written'])
+        self.client.cookies.clear()
+        self.assertEqual(self.get_tags(), ['replicated'])
+        self.assertEqual(self.get_tags(HTTP_X_DB_PIN=pin), ['primary', 'replicated', 'written'])
+        self.assertEqual(self.get_tags(HTTP_X_DB_PIN='1:forged'), ['replicated'])
+
+    def test_lagging_replica_is_skipped(self):
+        with mock.patch.object(routers.health, 'measure', return_value=settings.DB_REPLICA_MAX_LAG + 1), \
+                self.assertLogs('pkg.routers', 'WARNING'):
+            self.assertEqual(self.get_tags(), ['primary', 'replicated'])
+        self.assertEqual(self.get_tags(), ['replicated'])
+
+    def test_failed_replica_is_skipped(self):
+        with mock.patch.object(routers.health, 'measure', return_value=None):
+            self.assertEqual(self.get_tags(), ['primary', 'replicated'])
+
+    def test_response_cache_is_filled_from_primary(self):
+        Article.objects.create(title='Cached', body='Cached article body', author=self.user,
+                               visits=ArticleVisits.objects.create(number=0))
+        response = APIClient().get('/articles/api/articles/newest/')
+        self.assertEqual([article['title'] for article in response.json()['results']], ['Cached'])
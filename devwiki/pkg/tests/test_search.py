@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from pkg.articles.models import Article, ArticleVisits
+from pkg.articles.search import index_article
+
+
+class SearchSnippetTest(TestCase):
+    """Snippets are cut from rendered text, not from markdown source"""
+
+    def test_snippet_without_markdown(self):
+        user = get_user_model().objects.create(email='search@example.com')
+        article = Article.objects.create(title='Caching', author=user, visits=ArticleVisits.objects.create(number=0),
+                                         body='Use **redis** as [cache](https://example.com) for `sessions`')
+        index_article(article)
+
+        response = APIClient().get('/articles/api/articles/search/?q=cache')
+        self.assertEqual(response.status_code, 200)
+        snippet = response.json()['results'][0]['snippet']
+        self.assertEqual(snippet, 'Use redis as <mark>cache</mark> for sessions')
@@ -0,0 +1,72 @@
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from pkg.articles.models import Article, Comment
+from pkg.articles.transfer import import_articles
+
+BODY = 'Imported article body'
+
+MALFORMED = [
+    '[1]',
+    '5',
+    'not json',
+    {'title': 'No body'},
+    {'title': 'Body', 'body': ['not', 'text']},
+    {'title': 'Visits', 'body': BODY, 'visits': 'many'},
+    {'title': 'Visits', 'body': BODY, 'visits': True},
+    {'title': 'Created', 'body': BODY, 'created_at': 20210101},
+    {'title': 'Created', 'body': BODY, 'created_at': '2021-13-01T00:00:00'},
+    {'title': 'Status', 'body': BODY, 'status': 7},
+    {'title': 'Tags', 'body': BODY, 'tags': 'python'},
+    {'title': 'Tags', 'body': BODY, 'tags': [1]},
+    {'title': 'Comments', 'body': BODY, 'comments': {'content': 'x'}},
+    {'title': 'Comments', 'body': BODY, 'comments': [{'content': 5}]},
+]
+
+
+def ndjson(rows):
+    return [row if isinstance(row, str) else json.dumps(row) for row in rows]
+
+
+class ImportValidationTest(TestCase):
+    """Rows with fields of invalid types are rejected with their line numbers"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(email='import@example.com', is_staff=True)
+
+    def test_malformed_rows_are_counted(self):
+        valid = {'title': 'Valid', 'body': BODY, 'visits': 3, 'tags': ['python'],
+                 'comments': [{'id': 1, 'content': 'root'}, {'id': 2, 'parent': 1, 'content': 'reply'}]}
+        stats = import_articles(ndjson(MALFORMED + [valid]), self.user, batch_size=2)
+
+        self.assertEqual(stats.articles, 1)
+        self.assertEqual(stats.comments, 2)
+        self.assertEqual(stats.errors, len(MALFORMED))
+        self.assertEqual([error['line'] for error in stats.error_lines], list(range(1, len(MALFORMED) + 1)))
+        self.assertEqual(list(Article.objects.values_list('title', flat=True)), ['Valid'])
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_duplicate_titles_in_batch(self):
+        rows = [{'title': 'Same', 'body': BODY}, {'title': 'Same', 'body': BODY + ' updated'}]
+        stats = import_articles(ndjson(rows), self.user)
+        self.assertEqual((stats.articles, stats.errors), (2, 0))
+        self.assertEqual(Article.objects.get(title='Same').body, BODY + ' updated')
+
+    def test_endpoint_rejects_malformed_rows(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        upload = io.BytesIO('\n'.join(ndjson(MALFORMED)).encode())
+        upload.name = 'articles.ndjson'
+        response = client.post('/articles/api/articles/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['errors'], len(MALFORMED))
+
+    def test_invalid_batch_size(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/articles/api/articles/export/?batch_size=abc').status_code, 400)
@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from pkg.articles.models import Article, ArticleVisits, Tag
+from pkg.users.models import UserStats
+
+
+class ArticleUpdateStatsTest(TestCase):
+    """Tags created by article update are counted in requester stats"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(email='stats@example.com')
+        cls.key = Token.objects.create(user=cls.user).key
+        cls.article = Article.objects.create(title='Stats', body='Stats article body', author=cls.user,
+                                             visits=ArticleVisits.objects.create(number=0))
+        Tag.objects.create(name='existing', author=cls.user)
+        UserStats.objects.refresh([cls.user.id])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.key}')
+
+    def get_tags_count(self):
+        return UserStats.objects.get(user=self.user).tags_count
+
+    def test_update_creating_tags_refreshes_tags_count(self):
+        self.assertEqual(self.get_tags_count(), 1)
+        response = self.client.patch(f'/articles/api/articles/{self.article.slug}/',
+                                     {'update_tags': ['existing', 'created', 'another']}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.get_tags_count(), 3)
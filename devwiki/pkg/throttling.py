@@ -0,0 +1,108 @@
+"""
+Token-bucket throttling shared by all worker processes
+
+Buckets are kept in THROTTLE_CACHE as theoretical arrival time (GCRA) in
+milliseconds: every request moves it by the token interval with one atomic
+incr, request is allowed while the arrival time is within the burst window
+ahead of now. Idle bucket is full, its arrival time is moved to now, so idle
+time is never credited over the burst. Missing key is a full bucket, keys
+expire after the burst window of inactivity. No database writes are done.
+
+Viewsets declare rates per action in throttle_rates as 'number/period' with
+period s, min, h or d, burst equals the number, or as (rate, burst) tuple.
+Buckets are per action and user, anonymous requests are keyed by client IP
+(REMOTE_ADDR, X-Forwarded-For is trusted only behind NUM_PROXIES proxies).
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate):
+    """
+    Token interval and burst of rate
+
+    @param rate: 'number/period' or (rate, burst) tuple
+    @return: milliseconds per token, burst size
+    """
+    rate, burst = rate if isinstance(rate, (tuple, list)) else (rate, None)
+    number, period = rate.split('/')
+    number = int(number)
+    interval = max(PERIODS[period] * 1000 // number, 1)
+    return interval, burst or number
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle requests of view actions listed in view throttle_rates
+    """
+    cache_format = 'throttle:{scope}:{ident}'
+
+    def __init__(self):
+        self.cache = caches[settings.THROTTLE_CACHE]
+        self.retry_after = None
+
+    def get_scope(self, request, view):
+        action = getattr(view, 'action', None) or request.method.lower()
+        return f'{view.__class__.__name__}.{action}', action
+
+    def get_cache_key(self, request, view, scope):
+        user = request.user
+        ident = f'u{user.pk}' if user and user.is_authenticated else self.get_ident(request)
+        return self.cache_format.format(scope=scope, ident=ident)
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED:
+            return True
+        scope, action = self.get_scope(request, view)
+        rate = getattr(view, 'throttle_rates', {}).get(action)
+        if rate is None:
+            return True
+        interval, burst = parse_rate(rate)
+        return self.consume(self.get_cache_key(request, view, scope), interval, burst)
+
+    def consume(self, key, interval, burst):
+        """
+        Take one token from the bucket
+
+        @param key: bucket cache key
+        @param interval: milliseconds per token
+        @param burst: bucket capacity
+        @return: True if a token was taken, otherwise retry_after is set
+        """
+        now = now_ms()
+        window = interval * burst
+        timeout = math.ceil(window / 1000) + 1
+        try:
+            arrival = self.cache.incr(key, interval)
+        except ValueError:
+            arrival = None
+        if arrival is None or arrival < now + interval:
+            # new or idle bucket is full, concurrent requests of idle client may be not counted
+            arrival = now + interval
+            self.cache.set(key, arrival, timeout)
+        elif arrival - now > window // 2:
+            # key expiry is not moved by incr, keep busy bucket until it refills
+            self.cache.touch(key, timeout)
+
+        if arrival - now <= window:
+            return True
+        # rejected request does not take a token
+        try:
+            self.cache.decr(key, interval)
+        except ValueError:
+            pass
+        self.retry_after = (arrival - window - now) / 1000
+        return False
+
+    def wait(self):
+        return self.retry_after
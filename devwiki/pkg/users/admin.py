@@ -1,4 +1,26 @@
 from .models import User
 from django.contrib import admin
 
-admin.site.register(User)
+
+@admin.register(User)
+class UserAdmin(admin.ModelAdmin):
+    list_display = ('email', 'nickname', 'is_active', 'is_moder', 'is_banned', 'is_muted')
+    list_filter = ('is_banned', 'is_muted', 'is_moder')
+    search_fields = ('email', 'nickname')
+    actions = ('ban', 'unban', 'mute', 'unmute')
+
+    @admin.action(description='Ban selected users')
+    def ban(self, request, queryset):
+        queryset.update(is_banned=True)
+
+    @admin.action(description='Unban selected users')
+    def unban(self, request, queryset):
+        queryset.update(is_banned=False)
+
+    @admin.action(description='Mute selected users')
+    def mute(self, request, queryset):
+        queryset.update(is_muted=True)
+
+    @admin.action(description='Unmute selected users')
+    def unmute(self, request, queryset):
+        queryset.update(is_muted=False)
@@ -0,0 +1,43 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+
+from pkg.users.oauth import ExchangeBusy, submit_exchange
+
+
+async def github_login(request):
+    """
+    Endpoint to login user via github served by ASGI without blocking the event loop,
+    provider is called on bounded executor
+
+    @param request: POST with JSON provider and access_token
+    @return: token, private profile and user data
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        future = submit_exchange(data, request)
+    except ExchangeBusy:
+        return JsonResponse({'error': 'Too many concurrent logins, try again later'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    try:
+        result = await asyncio.wait_for(asyncio.wrap_future(future), settings.OAUTH_EXCHANGE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return JsonResponse({'error': 'Auth provider did not respond in time'},
+                            status=status.HTTP_504_GATEWAY_TIMEOUT)
+    except ValidationError as error:
+        return JsonResponse(error.detail, status=status.HTTP_400_BAD_REQUEST, safe=False)
+    return JsonResponse(result)
+
+
+# token authenticated API endpoint, csrf_exempt decorator does not support async views
+github_login.csrf_exempt = True
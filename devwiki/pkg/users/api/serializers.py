@@ -1,13 +1,18 @@
 import requests
+from django.conf import settings
 from django.contrib.auth import get_user_model, authenticate
+from django.core.files.storage import default_storage
 from django.contrib.auth.hashers import make_password
 from django.urls import reverse
 from rest_framework import serializers
 from django.utils.translation import ugettext_lazy as _
 from rest_framework.authtoken.models import Token
-from social_core.exceptions import MissingBackend
+from social_core.exceptions import AuthException, MissingBackend
 from social_django.utils import load_strategy, load_backend
 
+from pkg.serializers import SparseFieldsetsMixin
+from pkg.users.models import UserStats
+
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     """Serializer to register new user with token"""
@@ -62,24 +67,47 @@ class UserDetailSerializer(serializers.ModelSerializer):
         fields = ['id', 'email', 'is_staff']
 
 
-class PublicProfileSerializer(serializers.ModelSerializer):
+class PublicProfileSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """Serializer for public users profile"""
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = get_user_model()
-        fields = ['id', 'email', 'nickname', 'image', 'is_active', 'is_staff', 'is_moder']
+        fields = ['id', 'email', 'nickname', 'image', 'image_variants', 'is_active', 'is_staff', 'is_moder']
+
+    def get_image_variants(self, obj):
+        """Resized image URLs by size and format, empty until variants are rendered"""
+        request = self.context.get('request')
+        return {
+            size: {extension: request.build_absolute_uri(default_storage.url(name)) if request
+                   else default_storage.url(name) for extension, name in formats.items()}
+            for size, formats in (obj.image_variants or {}).items()
+        }
 
 
 class PrivateProfileSerializer(PublicProfileSerializer):
     """Serializer for user profile"""
 
-    class Meta:
-        model = get_user_model()
+    class Meta(PublicProfileSerializer.Meta):
         fields = PublicProfileSerializer.Meta.fields+['is_muted', 'is_superuser', 'is_banned', 'password']
         extra_kwargs = {
             'password': {'write_only': True}
         }
 
 
+class UserStatsSerializer(serializers.ModelSerializer):
+    """Serializer for user activity aggregates"""
+    rating_average = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UserStats
+        fields = ['articles_count', 'comments_count', 'tags_count', 'visits_received', 'votes_received',
+                  'rating_average']
+
+    def get_rating_average(self, obj):
+        return round(obj.rating_average, 2)
+
+
 class ProfileUpdateSerializer(serializers.ModelSerializer):
     """
     Serializer for update user profile
@@ -89,6 +117,12 @@ class ProfileUpdateSerializer(serializers.ModelSerializer):
         model = get_user_model()
         fields = ['id', 'email', 'image', 'nickname']
 
+    def validate_image(self, image):
+        if image and image.size > settings.USER_IMAGE_MAX_SIZE:
+            raise serializers.ValidationError(
+                _('Image is larger than %(size)d MB') % {'size': settings.USER_IMAGE_MAX_SIZE // (1024 * 1024)})
+        return image
+
 
 class TokenSerializer(serializers.ModelSerializer):
     """Serializer to authentication token"""
@@ -128,6 +162,8 @@ class SocialAuthSerializer(serializers.Serializer):
             self.user = backend.do_auth(access_token=access_token)
         except requests.HTTPError as e:
             raise serializers.ValidationError(e.response.text)
+        except AuthException as e:
+            raise serializers.ValidationError(str(e))
 
         return super(SocialAuthSerializer, self).validate(attrs)
 
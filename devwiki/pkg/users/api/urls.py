@@ -1,5 +1,6 @@
 from django.urls import path, include
 
+from .async_views import github_login
 from .views import ManageUserView, UserLoginAPIView
 from rest_framework.routers import DefaultRouter
 
@@ -9,6 +10,7 @@ router.register(r'', ManageUserView, basename='manage-profile')
 
 urlpatterns = [
     path('login/', UserLoginAPIView.as_view(), name='login'),
+    path('oauth/github/', github_login, name='github-login-async'),
 
     path('oauth/', include('rest_social_auth.urls_token')),
     path('oauth/', include('rest_social_auth.urls_session')),
@@ -1,15 +1,30 @@
+from concurrent.futures import TimeoutError
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from rest_framework import authentication, permissions, status, viewsets
+from rest_framework import permissions, status, viewsets
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework.settings import api_settings
 from rest_framework.authtoken.models import Token
 
 from .serializers import UserRegistrationSerializer, UserLoginSerializer, UserDetailSerializer, \
-    PublicProfileSerializer, PrivateProfileSerializer, SocialAuthSerializer
+    PublicProfileSerializer, PrivateProfileSerializer, UserStatsSerializer, ProfileUpdateSerializer
 from pkg.articles.models import Article, Comment, Tag
 from pkg.articles.api.serializers import ArticleListSerializer, ArticleCommentSerializer, ArticleTagSerializer
+from pkg.articles.comments import load_subtrees
+from pkg.articles.rendering import LIST_DEFERRED_FIELDS
+from pkg.pagination import KeysetPaginationMixin
+from pkg.profiling import QueryBudgetMixin
+from pkg.serializers import is_field_requested
+from pkg.throttling import TokenBucketThrottle
+from pkg.users.authentication import CachedTokenAuthentication, stats as auth_cache_stats
+from pkg.users.models import UserStats
+from pkg.users.images import schedule_variants
+from pkg.users.oauth import ExchangeBusy, submit_exchange
 
 
 class UserLoginAPIView(ObtainAuthToken):
@@ -19,6 +34,11 @@ class UserLoginAPIView(ObtainAuthToken):
     """
     serializer_class = UserLoginSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    throttle_classes = [TokenBucketThrottle, ]
+    # password hashing is slow by design, attempts are limited per client IP
+    throttle_rates = {
+        'post': ('10/min', 5),
+    }
 
     def post(self, request, *args, **kwargs):
         """
@@ -36,26 +56,72 @@ class UserLoginAPIView(ObtainAuthToken):
                          })
 
 
-class ManageUserView(viewsets.ModelViewSet):
+class ManageUserView(QueryBudgetMixin, KeysetPaginationMixin, viewsets.ModelViewSet):
     """
     Endpoint to user profile system
 
     """
     serializer_class = UserDetailSerializer
     queryset = get_user_model().objects.all()
-
-    authentication_classes = [authentication.TokenAuthentication, ]
+    query_budgets = {
+        'my_profile': 3,
+        'logout': 2,
+        'auth_cache': 0,
+        'user_profile': 2,
+        'user_articles': 3,
+        'user_comments': 3,
+        'user_tags': 2,
+        'user_activity': 6,
+    }
+    throttle_classes = [TokenBucketThrottle, ]
+    throttle_rates = {
+        'register': '10/h',
+        'my_profile': '60/min',
+        'github_login': ('10/min', 5),
+    }
+
+    authentication_classes = [CachedTokenAuthentication, ]
 
     @action(detail=False, methods=['get', 'patch'], permission_classes=[permissions.IsAuthenticated])
     def my_profile(self, request):
         """
-        Endpoint to get authenticated private user profile
+        Endpoint to get authenticated private user profile, PATCH updates email, nickname and image
 
         @return: user profile
         """
-        serializer = PrivateProfileSerializer(self.request.user)
+        # request.user is cached snapshot without profile fields
+        user = get_user_model().objects.get(id=request.user.id)
+        if request.method == 'PATCH':
+            update = ProfileUpdateSerializer(user, data=request.data, partial=True)
+            update.is_valid(raise_exception=True)
+            if 'image' in update.validated_data:
+                # variants of the new image are rendered in background
+                previous = user.image_variants
+                user = update.save(image_variants={})
+                schedule_variants(user, previous)
+            else:
+                user = update.save()
+        serializer = PrivateProfileSerializer(user, context={'request': request})
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def logout(self, request):
+        """
+        Endpoint to logout user, deleted token is invalidated in auth cache
+
+        """
+        request.auth.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def auth_cache(self, request):
+        """
+        Endpoint to get token authentication cache counters of this process
+
+        @return: hits, misses and invalidations
+        """
+        return Response(auth_cache_stats.as_dict())
+
     @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def user_profile(self, request, pk):
         """
@@ -65,7 +131,7 @@ class ManageUserView(viewsets.ModelViewSet):
         @return: User profile
         """
         profile = get_user_model().objects.get(id=pk)
-        serializer = PublicProfileSerializer(profile)
+        serializer = PublicProfileSerializer(profile, context={'request': request})
         return Response(serializer.data)
 
     @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
@@ -76,9 +142,9 @@ class ManageUserView(viewsets.ModelViewSet):
         @param pk: User id
         @return: User articles
         """
-        articles = Article.objects.filter(author=pk)
-        serializer = ArticleListSerializer(articles, many=True)
-        return Response(serializer.data)
+        articles = Article.objects.filter(author=pk).select_related('author', 'visits').prefetch_related('tags') \
+            .defer(*LIST_DEFERRED_FIELDS)
+        return self.get_keyset_paginated_response(articles, ('-created_at', '-id'), ArticleListSerializer)
 
     @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def user_comments(self, request, pk):
@@ -88,9 +154,10 @@ class ManageUserView(viewsets.ModelViewSet):
         @param pk: User id
         @return: User comments
         """
-        comments = Comment.objects.filter(author=pk)
-        serializer = ArticleCommentSerializer(comments, many=True)
-        return Response(serializer.data)
+        comments = Comment.objects.filter(author=pk).select_related('author')
+        loader = load_subtrees if is_field_requested(request, 'children') else None
+        return self.get_keyset_paginated_response(comments, ('-created_at', '-id'), ArticleCommentSerializer,
+                                                  loader=loader)
 
     @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def user_tags(self, request, pk):
@@ -101,8 +168,37 @@ class ManageUserView(viewsets.ModelViewSet):
         @return:
         """
         tags = Tag.objects.filter(author=pk)
-        serializer = ArticleTagSerializer(tags, many=True)
-        return Response(serializer.data)
+        return self.get_keyset_paginated_response(tags, ('-id',), ArticleTagSerializer)
+
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def user_activity(self, request, pk):
+        """
+        Endpoint to get user profile, activity stats and first page of user articles, comments and tags
+
+        @param pk: User id
+        @return: profile, stats and collections pages with links to next pages
+        """
+        user = get_object_or_404(get_user_model().objects.select_related('stats'), id=pk)
+        try:
+            stats = user.stats
+        except UserStats.DoesNotExist:
+            stats = UserStats(user=user)
+
+        articles = Article.objects.filter(author=pk).select_related('author', 'visits').prefetch_related('tags') \
+            .defer(*LIST_DEFERRED_FIELDS)
+        comments = Comment.objects.filter(author=pk).select_related('author')
+        tags = Tag.objects.filter(author=pk)
+        return Response({
+            'profile': PublicProfileSerializer(user).data,
+            'stats': UserStatsSerializer(stats).data,
+            'articles': self.get_keyset_page(articles, ('-created_at', '-id'), ArticleListSerializer,
+                                             url=reverse('manage-profile-user-articles', args=[pk], request=request)),
+            'comments': self.get_keyset_page(comments, ('-created_at', '-id'), ArticleCommentSerializer,
+                                             loader=load_subtrees if is_field_requested(request, 'children') else None,
+                                             url=reverse('manage-profile-user-comments', args=[pk], request=request)),
+            'tags': self.get_keyset_page(tags, ('-id',), ArticleTagSerializer,
+                                         url=reverse('manage-profile-user-tags', args=[pk], request=request)),
+        })
 
     @action(detail=False, methods=['post', ])
     def register(self, request):
@@ -130,18 +226,18 @@ class ManageUserView(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def github_login(self, request):
         """
-        Endpoint to login user via github
+        Endpoint to login user via github, provider is called on bounded executor,
+        async deployments should use github_login of pkg.users.api.async_views
 
         @return: user data
         """
-        token = SocialAuthSerializer(data=request.data)
-        token.is_valid(raise_exception=True)
-        profile = PrivateProfileSerializer(token.user)
-        user = UserDetailSerializer(token.user)
-        self.perform_create(token)
-        headers = self.get_success_headers(token.data)
-        return Response(
-            {'token': token.data['auth_token'],
-             'profile': profile.data,
-             'user': user.data
-             }, status=status.HTTP_200_OK, headers=headers)
+        try:
+            future = submit_exchange(request.data, request._request)
+        except ExchangeBusy:
+            return Response({'error': 'Too many concurrent logins, try again later'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        try:
+            data = future.result(timeout=settings.OAUTH_EXCHANGE_TIMEOUT)
+        except TimeoutError:
+            return Response({'error': 'Auth provider did not respond in time'}, status=status.HTTP_504_GATEWAY_TIMEOUT)
+        return Response(data, status=status.HTTP_200_OK)
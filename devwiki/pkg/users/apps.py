@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class UsersConfig(AppConfig):
     name = 'pkg.users'
+
+    def ready(self):
+        from pkg.users import signals  # noqa: F401
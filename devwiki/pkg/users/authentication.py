@@ -0,0 +1,174 @@
+"""
+Token authentication with cached token to user snapshots
+
+Snapshot of user id, email and permission flags is kept in per-process
+LRU with short TTL and in shared cache. Every snapshot carries per-user
+version counter, saving or queryset update of the user or deleting the token
+bumps the counter, so stale snapshots in every process are rejected on next request.
+Local hit costs one cache read of the version, miss costs two queries.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from pkg.routers import primary
+
+SNAPSHOT_FIELDS = ('id', 'email', 'is_active', 'is_staff', 'is_superuser', 'is_moder', 'is_banned', 'is_muted')
+
+
+def token_key(key):
+    return f'auth:token:{key}'
+
+
+def user_version_key(user_id):
+    return f'auth:user:{user_id}:version'
+
+
+def get_user_version(user_id):
+    """Get user version counter, missing counter starts from current time in ms"""
+    key = user_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def invalidate_user(user_id, token=None):
+    """
+    Reject cached snapshots of the user in every process
+
+    @param user_id: User id
+    @param token: deleted token key, dropped from cache tiers
+    """
+    try:
+        cache.incr(user_version_key(user_id))
+    except ValueError:
+        pass
+    if token:
+        cache.delete(token_key(token))
+        local_cache.pop(token)
+    stats.incr('invalidations')
+
+
+class AuthCacheStats:
+    """Thread safe hit and miss counters of this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(['local_hits', 'shared_hits', 'misses', 'invalidations'], 0)
+
+    def incr(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def as_dict(self):
+        with self.lock:
+            counters = dict(self.counters)
+        lookups = counters['local_hits'] + counters['shared_hits'] + counters['misses']
+        counters['hit_ratio'] = round((lookups - counters['misses']) / lookups, 4) if lookups else None
+        counters['local_size'] = len(local_cache)
+        return counters
+
+
+class LocalSnapshotCache:
+    """Per-process LRU of token snapshots with TTL"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            expires, snapshot = item
+            if expires < time.monotonic():
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+            return snapshot
+
+    def set(self, key, snapshot):
+        with self.lock:
+            self.items[key] = (time.monotonic() + self.ttl, snapshot)
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def __len__(self):
+        return len(self.items)
+
+
+local_cache = LocalSnapshotCache(settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_LOCAL_TTL)
+stats = AuthCacheStats()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication returning user snapshot from cache
+
+    request.user is unsaved User instance with SNAPSHOT_FIELDS only,
+    views needing other fields have to load the user from database.
+    """
+
+    def authenticate_credentials(self, key):
+        snapshot = self.get_snapshot(key)
+        if snapshot is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not snapshot['is_active']:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        user = get_user_model()(**{field: snapshot[field] for field in SNAPSHOT_FIELDS})
+        user._state.adding = False
+        return user, Token(key=key, user=user)
+
+    def get_snapshot(self, key):
+        snapshot = local_cache.get(key)
+        if snapshot is not None and snapshot['version'] == get_user_version(snapshot['id']):
+            stats.incr('local_hits')
+            return snapshot
+
+        snapshot = cache.get(token_key(key))
+        if snapshot is not None and snapshot['version'] == get_user_version(snapshot['id']):
+            stats.incr('shared_hits')
+            local_cache.set(key, snapshot)
+            return snapshot
+
+        stats.incr('misses')
+        return self.load_snapshot(key)
+
+    def load_snapshot(self, key):
+        """
+        Load snapshot from database, version is read first so concurrent invalidation wins,
+        primary is used as new token may be not replicated yet
+        """
+        with primary():
+            user_id = Token.objects.filter(key=key).values_list('user_id', flat=True).first()
+            if user_id is None:
+                return None
+            version = get_user_version(user_id)
+            snapshot = get_user_model().objects.filter(id=user_id).values(*SNAPSHOT_FIELDS).first()
+        if snapshot is None:
+            return None
+
+        snapshot['version'] = version
+        cache.set(token_key(key), snapshot, timeout=settings.AUTH_TOKEN_SHARED_TTL)
+        local_cache.set(key, snapshot)
+        return snapshot
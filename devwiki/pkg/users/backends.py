@@ -0,0 +1,87 @@
+"""
+OAuth backends making provider requests through pooled keep-alive session
+
+social_core opens new connection for every request to provider and has no
+timeout by default. Backends here reuse connections of one process-wide
+requests.Session and always pass SOCIAL_AUTH_REQUESTS_TIMEOUT.
+"""
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from social_core.backends.github import GithubOAuth2 as BaseGithubOAuth2
+from social_core.backends.oauth import BaseOAuth2
+from social_core.exceptions import AuthFailed, AuthForbidden
+from social_core.utils import user_agent
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def http_session():
+    """Process-wide session with connection pool sized for concurrent OAuth exchanges"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.OAUTH_EXCHANGE_WORKERS)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+class PooledRequestsMixin:
+    """Backend mixin sending provider requests through pooled session with strict timeouts"""
+
+    def request(self, url, method='GET', *args, **kwargs):
+        kwargs.setdefault('headers', {})
+        if self.setting('PROXIES') is not None:
+            kwargs.setdefault('proxies', self.setting('PROXIES'))
+        if self.setting('VERIFY_SSL') is not None:
+            kwargs.setdefault('verify', self.setting('VERIFY_SSL'))
+        kwargs.setdefault('timeout', self.setting('REQUESTS_TIMEOUT'))
+        if self.SEND_USER_AGENT and 'User-Agent' not in kwargs['headers']:
+            kwargs['headers']['User-Agent'] = self.setting('USER_AGENT') or user_agent()
+
+        try:
+            response = http_session().request(method, url, *args, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as err:
+            raise AuthFailed(self, str(err))
+        response.raise_for_status()
+        return response
+
+
+class GithubOAuth2(PooledRequestsMixin, BaseGithubOAuth2):
+    """GitHub backend with pooled connections and timeouts"""
+
+
+class StubOAuth2(BaseOAuth2):
+    """
+    Offline provider for development and tests, enabled by SOCIAL_AUTH_STUB_ENABLED
+
+    Access token "login" or "login:email" is accepted as is, user goes
+    through the same social auth pipeline as GitHub user.
+    """
+    name = 'stub'
+    EXTRA_DATA = [
+        ('id', 'id'),
+        ('login', 'login'),
+    ]
+
+    def get_user_details(self, response):
+        return {'username': response.get('login'),
+                'email': response.get('email') or '',
+                'fullname': '',
+                'first_name': '',
+                'last_name': ''}
+
+    def user_data(self, access_token, *args, **kwargs):
+        if not settings.SOCIAL_AUTH_STUB_ENABLED:
+            raise AuthForbidden(self)
+        login, _, email = access_token.partition(':')
+        if not login:
+            raise AuthFailed(self, 'Empty stub access token')
+        return {'id': login, 'login': login, 'email': email or f'{login}@stub.devwiki.local'}
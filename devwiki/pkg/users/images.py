@@ -0,0 +1,117 @@
+"""
+User image variants
+
+Uploaded image is kept as original, square variants of USER_IMAGE_VARIANT_SIZES
+are rendered to WebP and JPEG after the upload is committed, on bounded thread
+pool off the request path. Variant names are stored in User.image_variants as
+{size: {format: name}}, so serializers build URLs without touching storage.
+When the pool is saturated the upload is left without variants and picked up
+by build_image_variants command.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+VARIANTS_DIR = 'user_images/variants'
+
+executor = ThreadPoolExecutor(max_workers=settings.USER_IMAGE_WORKERS, thread_name_prefix='image-variants')
+slots = threading.BoundedSemaphore(settings.USER_IMAGE_WORKERS + settings.USER_IMAGE_QUEUE)
+
+
+def variant_formats():
+    """Formats supported by installed Pillow, WebP needs libwebp"""
+    return [name for name in FORMATS if name != 'webp' or features.check('webp')]
+
+
+def variant_name(image_name, size, extension):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'{VARIANTS_DIR}/{stem}_{size}.{extension}'
+
+
+def render_variants(image_name, storage=default_storage):
+    """
+    Render and store variants of the image
+
+    @param image_name: stored original image name
+    @param storage: storage of original and variants
+    @return: variant names by size and format
+    """
+    with storage.open(image_name, 'rb') as file:
+        original = Image.open(file)
+        original.load()
+    original = ImageOps.exif_transpose(original).convert('RGB')
+
+    variants = {}
+    for size in settings.USER_IMAGE_VARIANT_SIZES:
+        image = ImageOps.fit(original, (size, size), Image.LANCZOS)
+        for extension in variant_formats():
+            buffer = io.BytesIO()
+            image.save(buffer, FORMATS[extension], quality=settings.USER_IMAGE_QUALITY, optimize=True)
+            name = variant_name(image_name, size, extension)
+            storage.delete(name)
+            variants.setdefault(str(size), {})[extension] = storage.save(name, ContentFile(buffer.getvalue()))
+    return variants
+
+
+def delete_variants(variants, storage=default_storage):
+    for formats in (variants or {}).values():
+        for name in formats.values():
+            storage.delete(name)
+
+
+def build_variants(user_id, image_name, previous=None):
+    """
+    Render variants of user image and store their names, skipped if the image
+    was replaced meanwhile
+
+    @param user_id: User id
+    @param image_name: image name variants are rendered for
+    @param previous: variants of replaced image to delete
+    @return: variant names or None if failed
+    """
+    try:
+        delete_variants(previous)
+        if not image_name:
+            get_user_model().objects.filter(id=user_id).update(image_variants={})
+            return {}
+        variants = render_variants(image_name)
+        updated = get_user_model().objects.filter(id=user_id, image=image_name).update(image_variants=variants)
+        if not updated:
+            delete_variants(variants)
+        return variants
+    except (OSError, Image.DecompressionBombError):
+        logger.exception('Variants of image %s of user %s failed', image_name, user_id)
+        return None
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(user, previous=None):
+    """
+    Build variants of user image on the pool after current transaction commits
+
+    @param user: User with new image saved
+    @param previous: variants of replaced image
+    """
+    image_name = user.image.name if user.image else None
+
+    def submit():
+        if not slots.acquire(blocking=False):
+            logger.warning('Image variants pool is busy, variants of user %s are left to backfill', user.id)
+            return
+        future = executor.submit(build_variants, user.id, image_name, previous)
+        future.add_done_callback(lambda _: slots.release())
+
+    transaction.on_commit(submit)
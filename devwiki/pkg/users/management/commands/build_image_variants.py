@@ -0,0 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from pkg.users.images import build_variants
+
+
+class Command(BaseCommand):
+    help = 'Render resized variants of user images which have none, in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.USER_IMAGE_WORKERS * 2)
+        parser.add_argument('--force', action='store_true', help='Render variants of all images again')
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.exclude(image__isnull=True).exclude(image='')
+        if not options['force']:
+            users = users.filter(image_variants={})
+        users = users.values_list('id', 'image').order_by('id')
+
+        built = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            # previous variants are replaced by name, not deleted
+            results = executor.map(lambda user: build_variants(user[0], user[1]), users.iterator())
+            for variants in results:
+                if variants is None:
+                    failed += 1
+                else:
+                    built += 1
+        self.stdout.write(self.style.SUCCESS(f'Built variants of {built} images, {failed} failed'))
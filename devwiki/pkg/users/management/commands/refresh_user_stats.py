@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from pkg.users.models import UserStats
+
+
+class Command(BaseCommand):
+    help = 'Recalculate activity stats (articles, comments, tags, visits, rating received) of all users'
+
+    def handle(self, *args, **options):
+        updated = UserStats.objects.refresh()
+        self.stdout.write(self.style.SUCCESS(f'Activity stats refreshed for {updated} users'))
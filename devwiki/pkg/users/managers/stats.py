@@ -0,0 +1,67 @@
+from django.apps import apps
+from django.db import models
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from pkg.articles.choices import Status
+
+
+class UserStatsManager(models.Manager):
+    """User stats manager which keeps activity aggregates up to date on write"""
+
+    def refresh(self, user_ids=None, fields=None):
+        """
+        Recalculate activity aggregates of users over POSTED articles and comments
+        in a single UPDATE statement, missing stats rows are created first
+
+        @param user_ids: list of users ids, all users if None
+        @param fields: list of aggregates to recalculate, all if None
+        @return: number of updated users
+        """
+        user_model = self.model._meta.get_field('user').related_model
+        users = user_model._base_manager.all()
+        if user_ids is not None:
+            user_ids = set(user_ids)
+            users = users.filter(id__in=user_ids)
+        self.bulk_create([self.model(user_id=user_id)
+                          for user_id in users.filter(stats__isnull=True).values_list('id', flat=True)],
+                         ignore_conflicts=True)
+
+        article_model = apps.get_model('articles', 'Article')
+        articles = article_model._base_manager.filter(
+            author=OuterRef('user'), status=Status.POSTED).order_by().values('author')
+        comments = apps.get_model('articles', 'Comment')._base_manager.filter(
+            author=OuterRef('user'), status=Status.POSTED).order_by().values('author')
+        tags = apps.get_model('articles', 'Tag')._base_manager.filter(
+            author=OuterRef('user')).order_by().values('author')
+
+        aggregates = {
+            'articles_count': articles.annotate(value=Count('id')),
+            'comments_count': comments.annotate(value=Count('id')),
+            'tags_count': tags.annotate(value=Count('id')),
+            'visits_received': articles.annotate(value=Sum('visits__number')),
+            'votes_received': articles.annotate(value=Sum('rate_votes')),
+            'stars_received': articles.annotate(value=Sum('rate_stars')),
+        }
+        stats = self.all()
+        if user_ids is not None:
+            stats = stats.filter(user_id__in=user_ids)
+        return stats.update(**{
+            field: Coalesce(Subquery(aggregate.values('value')), Value(0))
+            for field, aggregate in aggregates.items() if fields is None or field in fields
+        })
+
+    def add_visits(self, visits):
+        """
+        Add received visits to users with one UPDATE
+
+        @param visits: dict of visits number by user id
+        """
+        visits = {user_id: number for user_id, number in visits.items() if user_id and number}
+        if not visits:
+            return
+        self.filter(user_id__in=visits).update(visits_received=F('visits_received') + Case(
+            *[When(user_id=user_id, then=Value(number)) for user_id, number in visits.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
@@ -1,7 +1,29 @@
 from django.contrib.auth.base_user import BaseUserManager
+from django.db import models, transaction
 
+from pkg.users.authentication import SNAPSHOT_FIELDS, invalidate_user
 
-class UserManager(BaseUserManager):
+
+class UserQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        """
+        Update users, cached token snapshots of updated users are rejected as after save,
+        so bulk ban, mute or deactivation is visible on next request
+
+        @return: number of updated rows
+        """
+        if not any(field in kwargs for field in SNAPSHOT_FIELDS):
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            user_ids = list(self.values_list('id', flat=True))
+            rows = super().update(**kwargs)
+        for user_id in user_ids:
+            invalidate_user(user_id)
+        return rows
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
     """Custom user model manager where email is the unique"""
 
     def create_user(self, email, password=None, **extra_fields):
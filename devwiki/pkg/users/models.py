@@ -3,6 +3,7 @@ from django.contrib.auth.models import PermissionsMixin
 from django.utils.translation import ugettext_lazy as _
 from django.db import models
 
+from pkg.users.managers.stats import UserStatsManager
 from pkg.users.managers.users import UserManager
 
 
@@ -21,6 +22,10 @@ class User(AbstractBaseUser, PermissionsMixin):
                                 blank=True,
                                 null=True)
     image = models.ImageField(upload_to='user_images', blank=True, null=True)
+    image_variants = models.JSONField(verbose_name=_("Resized image variants names by size and format"),
+                                      default=dict,
+                                      blank=True,
+                                      editable=False)
 
     objects = UserManager()
 
@@ -33,3 +38,23 @@ class User(AbstractBaseUser, PermissionsMixin):
         """Function to naming model"""
         return self.email
 
+
+
+class UserStats(models.Model):
+    """User activity aggregates, kept up to date on write"""
+    user = models.OneToOneField(User, primary_key=True, related_name='stats', on_delete=models.CASCADE)
+    articles_count = models.PositiveIntegerField(verbose_name=_("Number of user's articles"), default=0)
+    comments_count = models.PositiveIntegerField(verbose_name=_("Number of user's comments"), default=0)
+    tags_count = models.PositiveIntegerField(verbose_name=_("Number of user's tags"), default=0)
+    visits_received = models.PositiveBigIntegerField(verbose_name=_("Visits of user's articles"), default=0)
+    votes_received = models.PositiveIntegerField(verbose_name=_("Votes for user's articles"), default=0)
+    stars_received = models.PositiveIntegerField(verbose_name=_("Stars of user's articles"), default=0)
+
+    objects = UserStatsManager()
+
+    @property
+    def rating_average(self):
+        return self.stars_received / self.votes_received if self.votes_received else 0
+
+    def __str__(self):
+        return f"{self.user} stats"
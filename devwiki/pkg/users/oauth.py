@@ -0,0 +1,59 @@
+"""
+OAuth token exchange on bounded executor
+
+Exchange calls the provider over network, so it runs on a small thread pool
+instead of request thread. Synchronous view waits for it with timeout, async
+view awaits it and keeps the event loop serving other requests. When all
+workers are busy and the queue is full, new exchanges are rejected at once
+instead of piling up behind slow provider.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from pkg.users.api.serializers import PrivateProfileSerializer, SocialAuthSerializer, UserDetailSerializer
+
+executor = ThreadPoolExecutor(max_workers=settings.OAUTH_EXCHANGE_WORKERS, thread_name_prefix='oauth-exchange')
+slots = threading.BoundedSemaphore(settings.OAUTH_EXCHANGE_WORKERS + settings.OAUTH_EXCHANGE_QUEUE)
+
+
+class ExchangeBusy(Exception):
+    """All exchange workers are busy and the queue is full"""
+
+
+def exchange_token(data, request):
+    """
+    Authenticate user by provider access token and get API token
+
+    @param data: provider and access_token
+    @param request: request to load social auth strategy
+    @return: API token, private profile and user data
+    @raise ValidationError: invalid provider or access token
+    """
+    try:
+        serializer = SocialAuthSerializer(data=data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return {
+            'token': serializer.data['auth_token'],
+            'profile': PrivateProfileSerializer(serializer.user).data,
+            'user': UserDetailSerializer(serializer.user).data,
+        }
+    finally:
+        close_old_connections()
+
+
+def submit_exchange(data, request):
+    """
+    Run exchange_token on executor
+
+    @return: concurrent.futures.Future of exchange_token result
+    @raise ExchangeBusy: no free worker or queue slot
+    """
+    if not slots.acquire(blocking=False):
+        raise ExchangeBusy()
+    future = executor.submit(exchange_token, data, request)
+    future.add_done_callback(lambda _: slots.release())
+    return future